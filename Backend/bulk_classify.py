@@ -0,0 +1,334 @@
+import argparse
+import fnmatch
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from feature_extraction import compute_features, model_classes, model_schema
+from inference import load_predictor
+from registry import ModelRegistry, active_version
+
+# Set in each worker by _init_worker
+_feature_names = None
+_feature_profile = 'exact'
+
+
+def _init_worker(root, names, profile):
+    global _feature_names, _feature_profile
+    sys.path.insert(0, root)
+    _feature_names = names
+    _feature_profile = profile
+
+
+def expand_inputs(inputs, pattern='*'):
+    """Files named by `inputs`, with directories walked recursively, in sorted order."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for directory, subdirectories, files in os.walk(item):
+                subdirectories.sort()
+                paths.extend(os.path.join(directory, name) for name in sorted(files) if fnmatch.fnmatch(name, pattern))
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            raise FileNotFoundError(f"No such file or directory: {item}")
+    return paths
+
+
+def plan_units(paths, mode, chunk_bytes):
+    """Split the inputs into work units of roughly `chunk_bytes`.
+
+    A unit is a list of (file index, start, end) byte ranges. In 'lines'
+    mode each unit is one newline-aligned range of a file; in 'blob' mode
+    it is a run of whole files. The plan depends only on the inputs and
+    `chunk_bytes`, so a resumed run sees the same units.
+    """
+    units, group, group_bytes = [], [], 0
+    for file_index, path in enumerate(paths):
+        size = os.path.getsize(path)
+        if size == 0:
+            continue
+        if mode == 'blob':
+            group.append((file_index, 0, size))
+            group_bytes += size
+            if group_bytes >= chunk_bytes:
+                units.append(group)
+                group, group_bytes = [], 0
+            continue
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < size:
+                newline = data.find(b'\n', min(start + chunk_bytes, size) - 1)
+                end = size if newline < 0 else newline + 1
+                units.append([(file_index, start, end)])
+                start = end
+    if group:
+        units.append(group)
+    return units
+
+
+def _records(data, start, end, mode):
+    # (offset, array) of each ciphertext in data[start:end]
+    if mode == 'blob':
+        yield start, data[start:end]
+        return
+    chunk = data[start:end]
+    line_ends = np.flatnonzero(chunk == ord('\n'))
+    line_starts = np.concatenate(([0], line_ends + 1))
+    line_ends = np.concatenate((line_ends, [len(chunk)]))
+    for line_start, line_end in zip(line_starts.tolist(), line_ends.tolist()):
+        # Tolerate CRLF files and trailing spaces; skip blank lines
+        while line_end > line_start and chunk[line_end - 1] in (13, 32, 9):
+            line_end -= 1
+        if line_end > line_start:
+            yield start + line_start, chunk[line_start:line_end]
+
+
+def extract_unit(unit, paths, mode):
+    """Feature rows for every ciphertext in `unit`, read through mmap without copies.
+
+    Returns (file_indices, offsets, features, errors) where errors is a
+    list of (file index, offset, message) for records that could not be
+    featurized.
+    """
+    file_indices, offsets, rows, errors = [], [], [], []
+    for file_index, start, end in unit:
+        with open(paths[file_index], 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            for offset, record in _records(data, start, end, mode):
+                try:
+                    rows.append(compute_features(record, _feature_names, profile=_feature_profile))
+                    file_indices.append(file_index)
+                    offsets.append(offset)
+                except ValueError as e:
+                    errors.append((file_index, offset, str(e)))
+                del record
+            # The array views must be gone before the mapping can close
+            del data
+    features = np.array(rows, dtype=np.float32).reshape(len(rows), len(_feature_names))
+    return np.array(file_indices, dtype=np.int32), np.array(offsets, dtype=np.int64), features, errors
+
+
+class JsonlWriter:
+    """Appends one JSON object per record; resumes by truncating to the last checkpoint."""
+
+    def __init__(self, path, resume_bytes, classes):
+        self.classes = classes
+        self.f = open(path, 'r+b' if resume_bytes else 'wb')
+        self.f.truncate(resume_bytes)
+        self.f.seek(resume_bytes)
+
+    def write(self, paths, file_indices, offsets, probabilities, errors):
+        lines = []
+        labels = probabilities.argmax(axis=1)
+        for file_index, offset, label, row in zip(file_indices.tolist(), offsets.tolist(), labels.tolist(), probabilities.tolist()):
+            lines.append(json.dumps({
+                'file': paths[file_index],
+                'offset': offset,
+                'algorithm': self.classes[label],
+                'probabilities': dict(zip(self.classes, row)),
+            }))
+        for file_index, offset, message in errors:
+            lines.append(json.dumps({'file': paths[file_index], 'offset': offset, 'error': message}))
+        if lines:
+            self.f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        self.f.flush()
+
+    def checkpoint(self):
+        os.fsync(self.f.fileno())
+        return {'output_bytes': self.f.tell()}
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter:
+    """Writes each flush as its own part file in the output directory."""
+
+    def __init__(self, path, resume_parts, classes):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.classes = classes
+        self.parts = resume_parts
+        # Parts past the checkpoint are from an unfinished or earlier run
+        for name in os.listdir(path):
+            if fnmatch.fnmatch(name, 'part-*.parquet*') and int(name[5:10]) >= resume_parts:
+                os.remove(os.path.join(path, name))
+
+    def write(self, paths, file_indices, offsets, probabilities, errors):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        n = len(offsets)
+        columns = {
+            'file': [paths[i] for i in file_indices.tolist()] + [paths[i] for i, _, _ in errors],
+            'offset': np.concatenate((offsets, np.array([o for _, o, _ in errors], dtype=np.int64))),
+            'algorithm': [self.classes[label] for label in probabilities.argmax(axis=1).tolist()] + [None] * len(errors),
+            'error': [None] * n + [message for _, _, message in errors],
+        }
+        for i, algorithm in enumerate(self.classes):
+            columns[f'p_{algorithm}'] = np.concatenate((probabilities[:, i], np.full(len(errors), np.nan, dtype=np.float32)))
+        table = pa.table({name: pa.array(values) for name, values in columns.items()})
+        part = os.path.join(self.path, f'part-{self.parts:05d}.parquet')
+        # Written under a temporary name so a crash never leaves a partial part
+        pq.write_table(table, part + '.tmp')
+        os.replace(part + '.tmp', part)
+        self.parts += 1
+
+    def checkpoint(self):
+        return {'parts': self.parts}
+
+    def close(self):
+        pass
+
+
+def progress_path(output):
+    return output.rstrip(os.sep) + '.progress.json'
+
+
+def load_progress(output, run_config):
+    path = progress_path(output)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        progress = json.load(f)
+    if progress['config'] != run_config:
+        raise SystemExit(f"{path} was written for different inputs or options; use --restart to start over")
+    return progress
+
+
+def save_progress(output, progress):
+    path = progress_path(output)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(progress, f)
+    os.replace(path + '.tmp', path)
+
+
+def classify(paths, units, mode, output, fmt, predict_fn, classes, names, workers, batch_size, progress=None,
+             run_config=None, profile='exact'):
+    """Extract features for `units` across a process pool and classify them in large batches.
+
+    Units are consumed in order. Once at least `batch_size` rows are
+    buffered they go through one predict call, are written out, and the
+    number of finished units is checkpointed so an interrupted run can
+    resume from there.
+    """
+    done = progress['units_done'] if progress else 0
+    records = progress['records'] if progress else 0
+    if fmt == 'parquet':
+        writer = ParquetWriter(output, progress['parts'] if progress else 0, classes)
+    else:
+        writer = JsonlWriter(output, progress['output_bytes'] if progress else 0, classes)
+    if done:
+        print(f"Resuming after {done}/{len(units)} units ({records} records)")
+
+    buffered = []
+    buffered_rows = 0
+    start = time.perf_counter()
+    processed = 0
+
+    def flush(units_done):
+        nonlocal buffered, buffered_rows, records, processed
+        file_indices = np.concatenate([b[0] for b in buffered])
+        offsets = np.concatenate([b[1] for b in buffered])
+        features = np.concatenate([b[2] for b in buffered])
+        errors = [error for b in buffered for error in b[3]]
+        probabilities = predict_fn(features) if len(features) else np.empty((0, len(classes)), dtype=np.float32)
+        writer.write(paths, file_indices, offsets, np.asarray(probabilities, dtype=np.float32), errors)
+        records += len(offsets) + len(errors)
+        processed += len(offsets) + len(errors)
+        save_progress(output, {'config': run_config, 'units_done': units_done, 'records': records, **writer.checkpoint()})
+        buffered, buffered_rows = [], 0
+        elapsed = time.perf_counter() - start
+        print(f"{units_done}/{len(units)} units, {records} records ({processed / elapsed:.0f} records/s)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ROOT, names, profile)) as pool:
+            pending = []
+            next_unit = done
+            max_in_flight = max(1, workers) * 2
+            while next_unit < len(units) or pending:
+                while next_unit < len(units) and len(pending) < max_in_flight:
+                    pending.append(pool.submit(extract_unit, units[next_unit], paths, mode))
+                    next_unit += 1
+                result = pending.pop(0).result()
+                done += 1
+                buffered.append(result)
+                buffered_rows += len(result[1]) + len(result[3])
+                if buffered_rows >= batch_size:
+                    flush(done)
+            if buffered:
+                flush(done)
+    finally:
+        writer.close()
+    return records
+
+
+def default_model_dir():
+    """The model host.py serves by default: MODEL_DIR, or the CURRENT version of MODEL_REGISTRY."""
+    registry = ModelRegistry.from_env()
+    if registry.fixed:
+        return registry.root
+    version = active_version(registry.root) if os.path.isdir(registry.root) else None
+    if version is None:
+        raise SystemExit(f"No model versions in {registry.root}; pass --model-dir")
+    return os.path.join(registry.root, version)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Classify files of captured ciphertexts offline.')
+    parser.add_argument('inputs', nargs='+', help='files or directories (walked recursively)')
+    parser.add_argument('--output', required=True, help='JSONL file, or a directory of Parquet parts with --format parquet')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default=None,
+                        help='output format (default: parquet if --output ends in .parquet, else jsonl)')
+    parser.add_argument('--mode', choices=['lines', 'blob'], default='lines',
+                        help='lines: one ciphertext per line; blob: each file is one ciphertext')
+    parser.add_argument('--pattern', default='*', help='file name pattern applied when walking directories')
+    parser.add_argument('--model-dir', default=None,
+                        help='model directory (default: MODEL_DIR, or the CURRENT version of MODEL_REGISTRY as served by host.py)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='feature extraction processes')
+    parser.add_argument('--chunk-bytes', type=int, default=8 * 1024 * 1024, help='input bytes per work unit')
+    parser.add_argument('--batch-size', type=int, default=65536, help='rows per model call and checkpoint')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and start over')
+    args = parser.parse_args()
+    if args.model_dir is None:
+        args.model_dir = default_model_dir()
+    if args.format is None:
+        args.format = 'parquet' if args.output.endswith('.parquet') else 'jsonl'
+    return args
+
+
+def main():
+    args = parse_args()
+    predict_fn, n_features, n_classes = load_predictor(args.model_dir)
+    schema = model_schema(args.model_dir, n_features)
+    classes = model_classes(args.model_dir, n_classes)
+    names = schema.names
+    paths = [os.path.abspath(path) for path in expand_inputs(args.inputs, args.pattern)]
+    units = plan_units(paths, args.mode, args.chunk_bytes)
+    print(f"{len(paths)} files, {len(units)} work units")
+
+    run_config = {
+        'model_dir': os.path.abspath(args.model_dir),
+        'paths': paths,
+        'mode': args.mode,
+        'chunk_bytes': args.chunk_bytes,
+        'format': args.format,
+        'features': names,
+        'profile': schema.profile,
+        'classes': classes,
+    }
+    progress = None if args.restart else load_progress(args.output, run_config)
+    start = time.perf_counter()
+    records = classify(paths, units, args.mode, args.output, args.format, predict_fn, classes, names,
+                       args.workers, args.batch_size, progress, run_config, schema.profile)
+    print(f"Classified {records} records in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
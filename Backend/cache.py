@@ -0,0 +1,134 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """LRU + TTL cache of (feature vector, prediction, tier) keyed by ciphertext hash.
+
+    Entries live in an in-process OrderedDict bounded to `max_size`. When
+    `db_path` is given, entries are also written through to a SQLite file so
+    that several worker processes on the same host can share results; a
+    local miss falls back to the shared store before counting as a miss.
+    Expired rows are deleted from the store at most every `prune_seconds`,
+    through an index on their creation time; until then reads skip them.
+    SQLite reads and writes run under their own lock, so local hits never
+    wait on disk I/O.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600, db_path=None, prune_seconds=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.prune_seconds = prune_seconds
+        self._last_prune = time.time()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            # A cache can lose its last writes on power failure; no fsync per commit
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS predictions '
+                '(key TEXT PRIMARY KEY, features BLOB, prediction BLOB, created REAL, tier TEXT)')
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(predictions)')]
+            if 'tier' not in columns:
+                # Stores written before tiers were recorded only held full-model predictions
+                self._db.execute("ALTER TABLE predictions ADD COLUMN tier TEXT DEFAULT 'full'")
+            self._db.execute('CREATE INDEX IF NOT EXISTS predictions_created ON predictions(created)')
+            self._db.commit()
+
+    @staticmethod
+    def key(cipher_text):
+        """Hash of the ciphertext; a str and its UTF-8 bytes share a key."""
+        if isinstance(cipher_text, str):
+            cipher_text = cipher_text.encode('utf-8')
+        return hashlib.sha256(cipher_text).hexdigest()
+
+    def get(self, key):
+        """Return (features, prediction, tier) for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                features, prediction, tier, created = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return features, prediction, tier
+                del self._entries[key]
+                self.expirations += 1
+
+        entry = self._get_shared(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._insert(key, *entry)
+            return entry[:3]
+
+    def put(self, key, features, prediction, tier='full'):
+        """Store the features and prediction for `key`, with the tier that produced them."""
+        features = np.asarray(features, dtype=np.float64)
+        prediction = np.asarray(prediction, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            self._insert(key, features, prediction, tier, created)
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO predictions (key, features, prediction, created, tier) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, features.tobytes(), prediction.tobytes(), created, tier))
+            if created - self._last_prune >= self.prune_seconds:
+                self._db.execute('DELETE FROM predictions WHERE created < ?', (created - self.ttl,))
+                self._last_prune = created
+            self._db.commit()
+
+    def _insert(self, key, features, prediction, tier, created):
+        self._entries[key] = (features, prediction, tier, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_shared(self, key, now):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT features, prediction, tier, created FROM predictions WHERE key = ? AND created >= ?',
+                (key, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        features = np.frombuffer(row[0], dtype=np.float64)
+        prediction = np.frombuffer(row[1], dtype=np.float32)
+        return features, prediction, row[2] or 'full', row[3]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
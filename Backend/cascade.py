@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+import numpy as np
+from feature_extraction import FeatureSchema
+from inference import NumpyModel
+
+# Written by model_creation/model.py --cascade beside the full model
+CASCADE_CONFIG = 'cascade.json'
+CASCADE_MODEL = 'cascade_model.npz'
+
+
+class Cascade:
+    """Cheap first tier that answers confident inputs before the full model runs.
+
+    The tier is a small network over the features of `schema` (all linear
+    time or cheaper). predict() returns its probabilities when the top
+    class reaches `threshold`, otherwise None so the caller falls through
+    to the full feature set and model.
+    """
+
+    def __init__(self, model, schema, threshold):
+        self.model = model
+        self.schema = schema
+        self.threshold = threshold
+        self.exits = 0
+        self.fallthroughs = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, model_dir, threshold=None):
+        """Load the cascade saved in `model_dir`; `threshold` overrides the trained one."""
+        with open(os.path.join(model_dir, CASCADE_CONFIG)) as f:
+            config = json.load(f)
+        schema = FeatureSchema.from_dict(config['schema']).check()
+        model = NumpyModel.load(os.path.join(model_dir, CASCADE_MODEL))
+        if model.n_features != len(schema):
+            raise ValueError(f"{CASCADE_MODEL} takes {model.n_features} features but its schema lists {len(schema)}")
+        if threshold is None:
+            threshold = config['threshold']
+        # A null threshold means no threshold met the accuracy target; never exit early
+        return cls(model, schema, np.inf if threshold is None else threshold)
+
+    def predict_rows(self, rows):
+        """Probabilities for a batch of cheap feature rows and a mask of those confident enough to exit."""
+        probabilities = self.model.predict(rows)
+        confident = probabilities.max(axis=1) >= self.threshold
+        exits = int(confident.sum())
+        with self._lock:
+            self.exits += exits
+            self.fallthroughs += len(confident) - exits
+        return probabilities, confident
+
+    def predict(self, text, context=None, timings=None):
+        """Cheap-tier probabilities for `text`, or None if the full model is needed.
+
+        Passing a dict as `context` lets the full feature pass reuse the
+        intermediates computed here.
+        """
+        row = self.schema.extract(text, timings, context)
+        probabilities, confident = self.predict_rows(row)
+        return probabilities[0] if confident[0] else None
+
+    def stats(self):
+        with self._lock:
+            exits, fallthroughs = self.exits, self.fallthroughs
+        total = exits + fallthroughs
+        return {
+            'threshold': float(self.threshold) if np.isfinite(self.threshold) else None,
+            'exits': exits,
+            'fallthroughs': fallthroughs,
+            'exit_rate': exits / total if total else 0.0,
+        }
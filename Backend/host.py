@@ -1,163 +1,179 @@
-from flask import Flask, request, jsonify, render_template
+import base64
+import os
+import sys
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from flask import Flask, request, jsonify, render_template, g, Response
 import numpy as np
-import zlib
-from scipy.fft import fft
-import pywt
-from collections import Counter, defaultdict
-import math
-import joblib
-from itertools import groupby
-from tensorflow.keras.models import load_model
 from flask_cors import CORS
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from feature_extraction.streaming import DEFAULT_CHUNK_SIZE, base64_chunks, extract_features_from_chunks
+from feature_extraction.windows import SlidingWindowFeatures
+from feature_extraction import SchemaMismatchError
+from feature_extraction.bytevector import as_bytes
+from cache import PredictionCache
+from registry import ModelBundle, ModelRegistry, UnknownVersionError
+from segmentation import segment
+from metrics import RequestMetrics, server_timing_header
+
 app = Flask(__name__)
 CORS(app)
 
-# Load pre-trained model and scaler
-model = load_model(r'D:\Shelton\Machine Learning\projects\Breaking Ciphers\model_creation\best_model.h5')
-scaler = joblib.load(r'D:\Shelton\Machine Learning\projects\Breaking Ciphers\model_creation\scaler.joblib')
-
-def shannon_entropy(text):
-    prob = [float(text.count(c)) / len(text) for c in set(text)]
-    return -sum(p * np.log2(p) for p in prob)
-
-def length_mod_block_size(text, block_size=16):
-    return len(text) % block_size
-
-def compression_ratio(text):
-    compressed = zlib.compress(text.encode('utf-8'))
-    return len(compressed) / len(text.encode('utf-8'))
-
-def runs_index(text):
-    return len([sum(1 for _ in group) for _, group in groupby(text)])
-
-def serial_index(text):
-    bigrams = [text[i:i+2] for i in range(len(text)-1)]
-    return len(set(bigrams))
-
-def bit_transition_frequency(text):
-    bits = ''.join(format(byte, '08b') for byte in text.encode('utf-8'))
-    return sum(bits[i] != bits[i-1] for i in range(1, len(bits)))
-
-def fourier_transform_mean(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.mean(np.abs(fft_vals))
-
-def fourier_transform_std(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.std(np.abs(fft_vals))
-
-def fourier_transform_peak(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.max(np.abs(fft_vals))
-
-def fourier_transform_energy(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.sum(np.square(np.abs(fft_vals)))
-
-def wavelet_transform_mean(text):
-    byte_values = np.array([ord(c) for c in text])
-    coeffs = pywt.dwt(byte_values, 'haar')
-    return np.mean(coeffs[0])
-
-def wavelet_transform_std(text):
-    byte_values = np.array([ord(c) for c in text])
-    coeffs = pywt.dwt(byte_values, 'haar')
-    return np.std(coeffs[0])
-
-def wavelet_transform_peak(text):
-    byte_values = np.array([ord(c) for c in text])
-    coeffs = pywt.dwt(byte_values, 'haar')
-    return np.max(coeffs[0])
-
-def wavelet_transform_energy(text):
-    byte_values = np.array([ord(c) for c in text])
-    coeffs = pywt.dwt(byte_values, 'haar')
-    return np.sum(np.square(coeffs[0]))
-
-def perplexity(text):
-    bigrams = [text[i:i+2] for i in range(len(text)-1)]
-    bigram_counts = Counter(bigrams)
-    total_bigrams = sum(bigram_counts.values())
-    probs = [bigram_counts[bg] / total_bigrams for bg in bigrams]
-    return math.exp(-sum(p * math.log(p, 2) for p in probs if p > 0) / len(probs))
-
-def markov_chain_mean(text):
-    transitions = defaultdict(lambda: defaultdict(int))
-    for i in range(len(text) - 1):
-        transitions[text[i]][text[i+1]] += 1
-    for current_char, next_chars in transitions.items():
-        total = sum(next_chars.values())
-        for char in next_chars:
-            transitions[current_char][char] /= total
-    return np.mean([transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)])
-
-def markov_chain_std(text):
-    transitions = defaultdict(lambda: defaultdict(int))
-    for i in range(len(text) - 1):
-        transitions[text[i]][text[i+1]] += 1
-    for current_char, next_chars in transitions.items():
-        total = sum(next_chars.values())
-        for char in next_chars:
-            transitions[current_char][char] /= total
-    return np.std([transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)])
-
-def markov_chain_peak(text):
-    transitions = defaultdict(lambda: defaultdict(int))
-    for i in range(len(text) - 1):
-        transitions[text[i]][text[i+1]] += 1
-    for current_char, next_chars in transitions.items():
-        total = sum(next_chars.values())
-        for char in next_chars:
-            transitions[current_char][char] /= total
-    return np.max([transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)])
-
-def character_pair_frequency_mean(text):
-    pairs = [text[i:i+2] for i in range(len(text)-1)]
-    return np.mean([pairs.count(pair) for pair in set(pairs)])
-
-def character_pair_frequency_std(text):
-    pairs = [text[i:i+2] for i in range(len(text)-1)]
-    return np.std([pairs.count(pair) for pair in set(pairs)])
-
-def character_pair_frequency_peak(text):
-    pairs = [text[i:i+2] for i in range(len(text)-1)]
-    return np.max([pairs.count(pair) for pair in set(pairs)])
-
-def vowel_to_consonant_ratio(text):
-    vowels = 'aeiou'
-    vowel_count = sum(1 for c in text.lower() if c in vowels)
-    consonant_count = sum(1 for c in text.lower() if c.isalpha() and c not in vowels)
-    return vowel_count / consonant_count if consonant_count else 0
-
-def uppercase_to_lowercase_ratio(text):
-    uppercase_count = sum(1 for c in text if c.isupper())
-    lowercase_count = sum(1 for c in text if c.islower())
-    return uppercase_count / lowercase_count if lowercase_count else 0
-
-def longest_run_of_identical_bytes(text):
-    longest_run = 0
-    current_run = 1
-    for i in range(1, len(text)):
-        if text[i] == text[i-1]:
-            current_run += 1
-        else:
-            longest_run = max(longest_run, current_run)
-            current_run = 1
-    return max(longest_run, current_run)
-
-def entropy_of_fft_components(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    
-    fft_magnitude = np.abs(fft_vals)
-    probabilities = fft_magnitude / np.sum(fft_magnitude)
-    entropy = -np.sum(probabilities * np.log2(probabilities + np.finfo(float).eps))  # Adding epsilon to avoid log2(0)
-    return entropy
+# Opt-in timing histograms at /metrics and a Server-Timing header per response
+METRICS_ENABLED = os.environ.get('PREDICT_METRICS', '0') == '1'
+metrics = RequestMetrics() if METRICS_ENABLED else None
+
+# Concurrent /predict requests are coalesced into one model.predict call
+MAX_BATCH_SIZE = int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 64))
+MAX_WAIT_MS = float(os.environ.get('PREDICT_MAX_WAIT_MS', 5))
+
+def observe_scale(seconds):
+    # Runs once per batch, outside any request context
+    metrics.stages.observe(('scale', 'batch'), seconds)
+
+# Opt-in cheap-features-first cascade trained by model_creation/model.py --cascade
+CASCADE_ENABLED = os.environ.get('PREDICT_CASCADE', '0') == '1'
+CASCADE_THRESHOLD = os.environ.get('PREDICT_CASCADE_THRESHOLD')
+
+load_bundle = partial(
+    ModelBundle.load,
+    observe_scale=observe_scale if metrics else None,
+    cascade=CASCADE_ENABLED,
+    cascade_threshold=float(CASCADE_THRESHOLD) if CASCADE_THRESHOLD else None,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+)
+
+# Versioned model bundles (MODEL_REGISTRY, see registry.py), or a single
+# model directory (MODEL_DIR). Startup fails here if the active model needs
+# features this code computes differently; later versions that do are
+# reported at /models and skipped
+registry = ModelRegistry.from_env(load_bundle).start()
+
+# Per-request model input: the hand-crafted features, or the feature-free
+# byte-level model for versions trained with model.py --input bytes
+PIPELINES = ('features', 'bytes')
+
+# Default sliding window for /predict/segments, in ciphertext characters
+SEGMENT_WINDOW = int(os.environ.get('SEGMENT_WINDOW', 256))
+
+# Optional cache of features and predictions for resubmitted ciphertexts
+CACHE_SIZE = int(os.environ.get('PREDICT_CACHE_SIZE', 0))
+CACHE_TTL = float(os.environ.get('PREDICT_CACHE_TTL', 3600))
+CACHE_DB = os.environ.get('PREDICT_CACHE_DB')
+cache = PredictionCache(CACHE_SIZE, CACHE_TTL, CACHE_DB) if CACHE_SIZE > 0 else None
+
+def format_probabilities(prediction, classes):
+    return {algorithm: float(p) for algorithm, p in zip(classes, prediction)}
+
+def with_tier(result, tier, bundle):
+    # Only reported when the cascade is on, so plain responses are unchanged
+    if bundle.cascade:
+        result['tier'] = tier
+    return result
+
+def requested_version(data=None):
+    # ?model_version=... or a "model_version" field picks a version for A/B comparison
+    version = request.args.get('model_version') or (data or {}).get('model_version')
+    return str(version) if version is not None else None
+
+class PipelineError(ValueError):
+    """The requested pipeline is unknown, or not available for this version or endpoint."""
+
+def requested_pipeline(bundle, data=None, supported=PIPELINES):
+    # ?pipeline=bytes or a "pipeline" field selects the byte-level model
+    pipeline = request.args.get('pipeline') or (data or {}).get('pipeline') or 'features'
+    if pipeline not in supported:
+        raise PipelineError(f"Pipeline {pipeline!r} is not supported here; choose from {', '.join(supported)}")
+    if pipeline == 'bytes' and bundle.byte_model is None:
+        raise PipelineError(f"Model version {bundle.version!r} has no byte-level model")
+    return pipeline
+
+def with_pipeline(result, pipeline):
+    # Only reported for the byte-level model, so default responses are unchanged
+    if pipeline != 'features':
+        result['pipeline'] = pipeline
+    return result
+
+def use_bundle(version=None):
+    """The model bundle for this request, held until the request ends so it cannot be unloaded mid-way."""
+    if 'held_bundles' not in g:
+        g.held_bundles = ExitStack()
+    return g.held_bundles.enter_context(registry.acquire(version))
+
+def raw_chunks(chunks):
+    # ?encoding=raw marks undecoded ciphertext bytes, base64-encoded as they arrive as in /predict
+    return base64_chunks(chunks) if request.args.get('encoding') == 'raw' else chunks
+
+def cache_key(cipher_text, bundle):
+    # Each version caches its own features and predictions
+    return f'{bundle.version}:{PredictionCache.key(cipher_text)}'
+
+def classify_windows(chunks, window, stride, bundle):
+    """Classify the sliding windows over a sequence of byte chunks.
+
+    Windows are classified as each chunk completes them, so only their
+    probabilities are kept. Returns (starts, probabilities, length).
+    """
+    windows = SlidingWindowFeatures(bundle.schema.names, window, stride, bundle.schema.profile)
+    starts, probabilities, length = [], [], 0
+    
+    def classify(results):
+        if results:
+            starts.extend(start for start, _ in results)
+            probabilities.append(bundle.predict(np.vstack([row for _, row in results])))
+    
+    for chunk in chunks:
+        length += len(chunk)
+        classify(windows.feed(chunk))
+    classify(windows.finish())
+    return np.array(starts), np.concatenate(probabilities), length
+
+def stage(name):
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(g.stage_timings, name)
+
+def feature_timings():
+    return g.feature_timings if metrics is not None else None
+
+def record_input_size(size):
+    if metrics is not None:
+        g.input_size += size
+
+@app.before_request
+def start_timings():
+    if metrics is not None:
+        g.stage_timings = {}
+        g.feature_timings = {}
+        g.input_size = 0
+
+@app.teardown_request
+def release_bundles(_):
+    held = g.pop('held_bundles', None)
+    if held is not None:
+        held.close()
+
+@app.errorhandler(UnknownVersionError)
+def unknown_version(e):
+    return jsonify({'error': str(e)}), 404
+
+@app.errorhandler(SchemaMismatchError)
+def unloadable_version(e):
+    # A requested version whose features or classes this code cannot serve
+    return jsonify({'error': str(e)}), 500
+
+@app.errorhandler(PipelineError)
+def unsupported_pipeline(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.after_request
+def record_timings(response):
+    if metrics is not None and g.get('stage_timings'):
+        metrics.record(g.stage_timings, g.feature_timings, g.input_size)
+        response.headers['Server-Timing'] = server_timing_header(g.stage_timings)
+    return response
 
 @app.route('/')
 def index():
@@ -165,52 +181,294 @@ def index():
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    # Get data from POST request
-    data = request.json
-    if not data or 'cipher_text' not in data:
+    # Get data from POST request; binary bodies skip JSON parsing and escaping
+    with stage('parse'):
+        binary = request.mimetype == 'application/octet-stream'
+        data = None if binary else request.json
+    if binary:
+        cipher_text = request.get_data()
+        if request.args.get('encoding') == 'raw':
+            # Undecoded ciphertext bytes, put into the base64 form the model was trained on
+            cipher_text = base64.b64encode(cipher_text)
+    elif not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    elif 'cipher_text' not in data:
         return jsonify({'error': 'No cipher text provided'}), 400
+    elif not isinstance(data['cipher_text'], str):
+        return jsonify({'error': 'Cipher text must be a string'}), 400
+    else:
+        cipher_text = data['cipher_text']
+    record_input_size(len(cipher_text))
+    bundle = use_bundle(requested_version(data))
+    pipeline = requested_pipeline(bundle, data)
+    classes = bundle.byte_classes if pipeline == 'bytes' else bundle.classes
     
-    cipher_text = data['cipher_text']
+    try:
+        # Cached predictions come from the feature model, at the tier that answered
+        cached = cache.get(cache_key(cipher_text, bundle)) if cache and pipeline == 'features' else None
+        prediction, tier = None, 'full'
+        context = {}
+        if cached:
+            _, prediction, tier = cached
+        elif pipeline == 'bytes':
+            with stage('features'):
+                row = bundle.byte_layout.extract(cipher_text)
+            with stage('inference'):
+                prediction = bundle.byte_batcher.predict(row)
+        elif bundle.cascade:
+            # Confident cheap-tier answers skip the full feature set
+            with stage('cascade'):
+                cheap_row = bundle.cascade.schema.extract(cipher_text, feature_timings(), context)
+                probabilities, confident = bundle.cascade.predict_rows(cheap_row)
+            if confident[0]:
+                prediction, tier = probabilities[0], 'cheap'
+                if cache:
+                    cache.put(cache_key(cipher_text, bundle), cheap_row, prediction, tier)
+        if prediction is None:
+            # Calculate features, reusing any intermediates from the cheap tier
+            with stage('features'):
+                feature_values = bundle.schema.extract(cipher_text, feature_timings(), context)
+            with stage('inference'):
+                prediction = bundle.batcher.predict(feature_values)
+            if cache:
+                cache.put(cache_key(cipher_text, bundle), feature_values, prediction)
+        
+        with stage('serialize'):
+            if binary:
+                return jsonify(with_pipeline(with_tier({
+                    'text_length': len(cipher_text),
+                    'probabilities': format_probabilities(prediction, classes),
+                    'model_version': bundle.version
+                }, tier, bundle), pipeline))
+            return jsonify(with_pipeline(with_tier({
+                'cipher_text': cipher_text,
+                'probabilities': format_probabilities(prediction, classes),
+                'model_version': bundle.version
+            }, tier, bundle), pipeline))
+    
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Cipher text is not valid UTF-8'}), 400
+    except ValueError as e:
+        # Input too short to featurize
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    with stage('parse'):
+        data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    if not isinstance(data.get('cipher_texts'), list):
+        return jsonify({'error': 'No list of cipher texts provided'}), 400
+    
+    cipher_texts = data['cipher_texts']
+    results = [{'cipher_text': cipher_text} for cipher_text in cipher_texts]
+    bundle = use_bundle(requested_version(data))
+    if requested_pipeline(bundle, data) == 'bytes':
+        return predict_batch_bytes(cipher_texts, results, bundle)
+    cascade = bundle.cascade
+    
+    # Items whose features fail get their own error; the rest share one model call
+    pending, contexts = [], {}
+    for i, cipher_text in enumerate(cipher_texts):
+        if not isinstance(cipher_text, str):
+            results[i]['error'] = 'Cipher text must be a string'
+            continue
+        try:
+            cached = cache.get(cache_key(cipher_text, bundle)) if cache else None
+            if cached:
+                _, prediction, tier = cached
+                results[i]['probabilities'] = format_probabilities(prediction, bundle.classes)
+                with_tier(results[i], tier, bundle)
+                continue
+            record_input_size(len(cipher_text))
+            if cascade:
+                contexts[i] = {}
+                with stage('cascade'):
+                    cheap_row = cascade.schema.extract(cipher_text, feature_timings(), contexts[i])
+                pending.append((i, cheap_row))
+            else:
+                pending.append((i, None))
+        except Exception as e:
+            results[i]['error'] = str(e)
+    
+    if cascade and pending:
+        # One cheap-tier call for the whole batch; confident items are done
+        with stage('cascade'):
+            probabilities, confident = cascade.predict_rows(np.vstack([row for _, row in pending]))
+        for (i, cheap_row), prediction, done in zip(pending, probabilities, confident):
+            if done:
+                results[i]['probabilities'] = format_probabilities(prediction, bundle.classes)
+                with_tier(results[i], 'cheap', bundle)
+                if cache:
+                    cache.put(cache_key(cipher_texts[i], bundle), cheap_row, prediction, 'cheap')
+        pending = [item for item, done in zip(pending, confident) if not done]
+    
+    rows, valid = [], []
+    for i, _ in pending:
+        try:
+            with stage('features'):
+                rows.append(bundle.schema.extract(cipher_texts[i], feature_timings(), contexts.get(i)))
+            valid.append(i)
+        except Exception as e:
+            results[i]['error'] = str(e)
     
     try:
-        # Calculate features
-        features = {
-            'text_length': len(cipher_text),
-            'compression_ratio': compression_ratio(cipher_text),
-            'runs_index': runs_index(cipher_text),
-            'serial_index': serial_index(cipher_text),
-            'bit_transition_frequency': bit_transition_frequency(cipher_text),
-            'fourier_transform_mean': fourier_transform_mean(cipher_text),
-            'fourier_transform_std': fourier_transform_std(cipher_text),
-            'fourier_transform_peak': fourier_transform_peak(cipher_text),
-            'fourier_transform_energy': fourier_transform_energy(cipher_text),
-            'wavelet_transform_energy': wavelet_transform_energy(cipher_text),
-            'perplexity': perplexity(cipher_text),
-            'markov_chain_mean': markov_chain_mean(cipher_text),
-            'markov_chain_std': markov_chain_std(cipher_text),
-            'character_pair_frequency_mean': character_pair_frequency_mean(cipher_text),
-            'character_pair_frequency_std': character_pair_frequency_std(cipher_text),
-            'vowel_to_consonant_ratio': vowel_to_consonant_ratio(cipher_text),
-            'uppercase_to_lowercase_ratio': uppercase_to_lowercase_ratio(cipher_text),
-            'longest_run_of_identical_bytes': longest_run_of_identical_bytes(cipher_text),
-            'entropy_of_fft_components': entropy_of_fft_components(cipher_text)
-        }
+        if rows:
+            with stage('inference'):
+                predictions = bundle.predict(np.vstack(rows))
+            for i, row, prediction in zip(valid, rows, predictions):
+                results[i]['probabilities'] = format_probabilities(prediction, bundle.classes)
+                with_tier(results[i], 'full', bundle)
+                if cache:
+                    cache.put(cache_key(cipher_texts[i], bundle), row, prediction)
         
-        feature_values = np.array([list(features.values())])
-        features_scaled = scaler.transform(feature_values)
+        with stage('serialize'):
+            return jsonify({'results': results, 'model_version': bundle.version})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def predict_batch_bytes(cipher_texts, results, bundle):
+    """/predict/batch through the byte-level model: one vectorized pass and one model call for the batch."""
+    raws, valid = [], []
+    for i, cipher_text in enumerate(cipher_texts):
+        if not isinstance(cipher_text, str):
+            results[i]['error'] = 'Cipher text must be a string'
+            continue
+        try:
+            raws.append(as_bytes(cipher_text))
+            valid.append(i)
+            record_input_size(len(cipher_text))
+        except Exception as e:
+            results[i]['error'] = str(e)
+    
+    try:
+        if raws:
+            with stage('features'):
+                rows = bundle.byte_layout.vectors(raws)
+            with stage('inference'):
+                predictions = bundle.byte_model.predict(rows)
+            for i, prediction in zip(valid, predictions):
+                results[i]['probabilities'] = format_probabilities(prediction, bundle.byte_classes)
         
-        prediction = model.predict(features_scaled)[0]
+        with stage('serialize'):
+            return jsonify({'results': results, 'model_version': bundle.version, 'pipeline': 'bytes'})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/upload', methods=['POST'])
+def predict_upload():
+    # Large captures are read in chunks from the upload stream, never as one string
+    if 'file' in request.files:
+        stream = request.files['file'].stream
+    else:
+        stream = request.stream
+    chunks = raw_chunks(iter(lambda: stream.read(DEFAULT_CHUNK_SIZE), b''))
+    bundle = use_bundle(requested_version())
+    requested_pipeline(bundle, supported=('features',))
+    
+    try:
+        with stage('features'):
+            stream_values = extract_features_from_chunks(
+                chunks, with_repeats=bundle.stream_with_repeats, profile=bundle.schema.profile)
+        text_length = int(stream_values[0])
+        feature_values = stream_values[bundle.stream_columns]
+        record_input_size(text_length)
+        with stage('inference'):
+            prediction = bundle.batcher.predict(feature_values)
         
-        algorithm_mapping = {0: 'AES', 1: 'DES', 2: 'Blowfish'}
-        probabilities = {'AES': 0.89,'DES':0.06,'Blowfish':0.05}
+        with stage('serialize'):
+            return jsonify({
+                'text_length': text_length,
+                'probabilities': format_probabilities(prediction, bundle.classes),
+                'model_version': bundle.version
+            })
+    
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Upload is not valid UTF-8 text'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/segments', methods=['POST'])
+def predict_segments():
+    # Long captures can be posted as application/octet-stream and are read in chunks
+    binary = request.mimetype == 'application/octet-stream'
+    options = request.args if binary else request.json
+    if not binary and not isinstance(options, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    if not binary and not isinstance(options.get('cipher_text'), str):
+        return jsonify({'error': 'No cipher text provided'}), 400
+    try:
+        window = int(options.get('window', SEGMENT_WINDOW))
+        stride = int(options.get('stride', max(1, window // 2)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'window and stride must be integers'}), 400
+    bundle = use_bundle(requested_version(None if binary else options))
+    requested_pipeline(bundle, None if binary else options, supported=('features',))
+    
+    if binary:
+        chunks = raw_chunks(iter(lambda: request.stream.read(DEFAULT_CHUNK_SIZE), b''))
+    else:
+        chunks = [options['cipher_text'].encode('utf-8')]
+    
+    try:
+        with stage('segments'):
+            starts, probabilities, length = classify_windows(chunks, window, stride, bundle)
+            segments, change_points = segment(starts, probabilities, window, length, bundle.classes)
+        record_input_size(length)
         
-        return jsonify({
-            'cipher_text': cipher_text,
-            'probabilities': probabilities
-        })
+        with stage('serialize'):
+            return jsonify({
+                'text_length': length,
+                'window': window,
+                'stride': stride,
+                'segments': segments,
+                'change_points': change_points,
+                'model_version': bundle.version
+            })
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if not cache:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
+@app.route('/cascade/stats', methods=['GET'])
+def cascade_stats():
+    bundle = use_bundle(requested_version())
+    if not bundle.cascade:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'model_version': bundle.version, **bundle.cascade.stats()})
+
+@app.route('/models', methods=['GET'])
+def models():
+    return jsonify(registry.stats())
+
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    # Same as the watcher's poll, for deploy scripts that do not want to wait for it
+    try:
+        registry.refresh()
+    except Exception as e:
+        return jsonify({'error': str(e), **registry.stats()}), 500
+    return jsonify(registry.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if metrics is None:
+        return Response('# metrics disabled; set PREDICT_METRICS=1\n', status=404, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,87 @@
+import os
+import time
+import numpy as np
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+def _linear(x):
+    return x
+
+
+ACTIVATIONS = {'relu': _relu, 'softmax': _softmax, 'linear': _linear}
+
+
+class NumpyModel:
+    """Batched float32 forward pass over a network exported by model_creation/export.py.
+
+    The StandardScaler and BatchNormalization layers are already folded into
+    the dense kernels, so inputs are raw (unscaled) feature rows.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(a) for a in data['activations']]
+            layers = [(data[f'kernel_{i}'], data[f'bias_{i}'], ACTIVATIONS[a])
+                      for i, a in enumerate(activations)]
+        return cls(layers)
+
+    @property
+    def n_features(self):
+        return self.layers[0][0].shape[0]
+
+    @property
+    def n_classes(self):
+        return self.layers[-1][0].shape[1]
+
+    def predict(self, features):
+        x = np.asarray(features, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[None, :]
+        for kernel, bias, activation in self.layers:
+            x = x @ kernel
+            x += bias
+            x = activation(x)
+        return x
+
+
+def load_predictor(model_dir, observe_scale=None):
+    """Load the model in `model_dir` and return (predict_fn, n_features, n_classes).
+
+    predict_fn maps raw feature rows to class probabilities. model.npz from
+    model_creation/export.py is preferred; otherwise TensorFlow is imported
+    and best_model.h5 is used with scaler.joblib. `observe_scale`, if given,
+    is called with the seconds spent scaling each batch on the Keras path.
+    """
+    npz_path = os.path.join(model_dir, 'model.npz')
+    if os.path.exists(npz_path):
+        # Exported weights with the scaler folded in; no TensorFlow needed
+        model = NumpyModel.load(npz_path)
+        return model.predict, model.n_features, model.n_classes
+
+    import joblib
+    from tensorflow.keras.models import load_model
+    model = load_model(os.path.join(model_dir, 'best_model.h5'))
+    scaler = joblib.load(os.path.join(model_dir, 'scaler.joblib'))
+
+    def predict_probabilities(feature_values):
+        start = time.perf_counter()
+        features_scaled = scaler.transform(feature_values)
+        if observe_scale:
+            observe_scale(time.perf_counter() - start)
+        return model.predict(features_scaled, batch_size=len(features_scaled), verbose=0)
+
+    return predict_probabilities, model.input_shape[-1], model.output_shape[-1]
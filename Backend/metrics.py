@@ -0,0 +1,93 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from feature_extraction.features import StageTimer
+
+# Upper bounds in seconds, as in the Prometheus client defaults plus finer low-end buckets
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds in bytes for the input-size label
+SIZE_BUCKETS = ((1024, '1KiB'), (16384, '16KiB'), (262144, '256KiB'), (1048576, '1MiB'), (16777216, '16MiB'))
+
+
+def size_bucket(size):
+    for limit, label in SIZE_BUCKETS:
+        if size <= limit:
+            return label
+    return 'larger'
+
+
+class Histogram:
+    """A labelled latency histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines)
+
+
+class RequestMetrics:
+    """Per-stage and per-feature timing histograms for the prediction service.
+
+    A request collects its timings in a plain dict via stage(); record() then
+    adds them to the histograms in one go, labelled with the input-size bucket.
+    """
+
+    def __init__(self):
+        self.stages = Histogram(
+            'decryptiq_stage_seconds', 'Time spent per request stage.', ('stage', 'size'))
+        self.features = Histogram(
+            'decryptiq_feature_seconds', 'Time spent per feature-extraction stage.', ('feature', 'size'))
+
+    @contextmanager
+    def stage(self, timings, name):
+        # The extractor's timer, so request stages and feature stages are timed alike
+        timer = StageTimer(timings)
+        try:
+            yield
+        finally:
+            timer.lap(name)
+
+    def record(self, stage_timings, feature_timings, input_size):
+        size = size_bucket(input_size)
+        for name, seconds in stage_timings.items():
+            self.stages.observe((name, size), seconds)
+        for name, seconds in feature_timings.items():
+            self.features.observe((name, size), seconds)
+
+    def render(self):
+        return self.stages.render() + '\n' + self.features.render() + '\n'
+
+
+def server_timing_header(stage_timings):
+    """Format stage timings (seconds) as a Server-Timing header value in milliseconds."""
+    return ', '.join(f'{name};dur={seconds * 1e3:.3f}' for name, seconds in stage_timings.items())
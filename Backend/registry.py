@@ -0,0 +1,332 @@
+import base64
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from feature_extraction import REPEAT_FEATURE_NAMES, feature_names, model_classes, model_schema
+from feature_extraction.bytevector import BYTE_CLASSES_FILENAME, BYTE_LAYOUT_FILENAME, ByteVectorLayout
+from batching import MicroBatcher
+from cascade import CASCADE_CONFIG, Cascade
+from inference import NumpyModel, load_predictor
+
+# Written by model_creation/model.py --input bytes beside the feature model
+BYTE_MODEL = 'byte_model.npz'
+
+# Names the active version of a registry; written by model_creation/model.py --registry
+CURRENT = 'CURRENT'
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Default MODEL_REGISTRY; without one, the model model.py writes to model_creation/ is served as is
+DEFAULT_REGISTRY = os.path.join(ROOT, 'models')
+DEFAULT_MODEL_DIR = os.path.join(ROOT, 'model_creation')
+
+# Version of a registry that is a single plain model directory
+FIXED_VERSION = 'default'
+
+# Featurized and classified by every new version before it takes traffic
+WARMUP_TEXT = base64.b64encode(bytes(range(96))).decode()
+
+
+class UnknownVersionError(KeyError):
+    """A request named a model version that is not in the registry."""
+
+    def __str__(self):
+        # KeyError would print only the quoted version
+        return f"Unknown model version {self.args[0]!r}"
+
+
+def _version_key(name):
+    # Natural order, so v10 sorts after v9
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part) for part in re.split(r'(\d+)', name) if part]
+
+
+def list_versions(root):
+    """Version directories under `root` that hold a model, oldest first.
+
+    Directories starting with '.' are ignored, so a bundle can be written
+    under a temporary name and renamed into place.
+    """
+    versions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        if os.path.exists(os.path.join(path, 'model.npz')) or os.path.exists(os.path.join(path, 'best_model.h5')):
+            versions.append(name)
+    return sorted(versions, key=_version_key)
+
+
+def active_version(root):
+    """The version named in root/CURRENT, or the newest version if there is no CURRENT file."""
+    path = os.path.join(root, CURRENT)
+    if os.path.exists(path):
+        with open(path) as f:
+            return f.read().strip()
+    versions = list_versions(root)
+    return versions[-1] if versions else None
+
+
+class ModelBundle:
+    """One loaded model version: predictor, class labels, feature schema, optional cascade and micro-batcher.
+
+    Versions that also ship a byte-level model (model.py --input bytes)
+    carry it as `byte_model` with its `byte_layout`, `byte_classes` and
+    own batcher, for requests that select the feature-free pipeline.
+    """
+
+    def __init__(self, version, path, predict, classes, schema, cascade, batcher, byte_model=None, byte_layout=None,
+                 byte_classes=None, byte_batcher=None):
+        self.version = version
+        self.path = path
+        self.predict = predict
+        self.classes = classes
+        self.schema = schema
+        self.cascade = cascade
+        self.batcher = batcher
+        self.byte_model = byte_model
+        self.byte_layout = byte_layout
+        self.byte_classes = byte_classes
+        self.byte_batcher = byte_batcher
+        # Uploads go through the streaming extractor, which computes a fixed layout
+        self.stream_with_repeats = any(name in REPEAT_FEATURE_NAMES for name in schema.names)
+        self.stream_columns = schema.positions(feature_names(self.stream_with_repeats))
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+    @classmethod
+    def load(cls, version, path, observe_scale=None, cascade=False, cascade_threshold=None,
+             max_batch_size=64, max_wait_ms=5):
+        predict, n_features, n_classes = load_predictor(path, observe_scale)
+        # Refuses a model whose features this code computes differently, or whose outputs are unlabelled
+        schema = model_schema(path, n_features)
+        classes = model_classes(path, n_classes)
+        # With the cascade on, versions trained without one serve the full model only
+        has_cascade = cascade and os.path.exists(os.path.join(path, CASCADE_CONFIG))
+        tier = Cascade.load(path, cascade_threshold) if has_cascade else None
+        if tier and tier.model.n_classes != len(classes):
+            raise ValueError(f"The cascade has {tier.model.n_classes} outputs but the model has {len(classes)} classes")
+        batcher = MicroBatcher(predict, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        byte_model = byte_layout = byte_classes = byte_batcher = None
+        if os.path.exists(os.path.join(path, BYTE_MODEL)):
+            byte_model = NumpyModel.load(os.path.join(path, BYTE_MODEL))
+            byte_layout = ByteVectorLayout.load(os.path.join(path, BYTE_LAYOUT_FILENAME))
+            if byte_model.n_features != len(byte_layout):
+                raise ValueError(f"{BYTE_MODEL} takes {byte_model.n_features} inputs but its layout has {len(byte_layout)}")
+            byte_classes = model_classes(path, byte_model.n_classes, BYTE_CLASSES_FILENAME)
+            byte_batcher = MicroBatcher(byte_model.predict, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return cls(version, path, predict, classes, schema, tier, batcher, byte_model, byte_layout, byte_classes,
+                   byte_batcher)
+
+    def warm_up(self):
+        """Run a dummy batch through every path a request can take, so the first real one is not cold."""
+        row = self.schema.extract(WARMUP_TEXT)
+        self.predict(np.repeat(row[None, :], self.batcher.max_batch_size, axis=0))
+        self.batcher.predict(row)
+        if self.cascade:
+            # Through the model directly, so the warm-up is not counted in the cascade stats
+            self.cascade.model.predict(self.cascade.schema.extract(WARMUP_TEXT))
+        if self.byte_model:
+            row = self.byte_layout.extract(WARMUP_TEXT)
+            self.byte_model.predict(np.repeat(row[None, :], self.batcher.max_batch_size, axis=0))
+            self.byte_batcher.predict(row)
+
+    def close(self):
+        self.batcher.close()
+        if self.byte_batcher:
+            self.byte_batcher.close()
+
+
+class ModelRegistry:
+    """Versioned model bundles under `root`, swapped without a restart.
+
+    Each version is a directory as written by model_creation/model.py
+    (model.npz or best_model.h5 with scaler.joblib, feature_schema.json
+    and optionally the cascade files), and root/CURRENT names the one
+    served by default. A watcher thread polls every `poll_seconds`: when
+    CURRENT changes, the new version is loaded and warmed up in the
+    background and then swapped in atomically, while requests keep using
+    the old one. Requests may also name any version for A/B comparison;
+    it is loaded on first use. Versions other than the active one are
+    unloaded after `idle_seconds` without requests, and at most
+    `max_loaded` stay loaded while idle.
+
+    With `fixed=True`, `root` is a single model directory served as
+    version FIXED_VERSION and never reloaded.
+    """
+
+    def __init__(self, root, load_bundle=ModelBundle.load, idle_seconds=600, max_loaded=4, poll_seconds=5,
+                 fixed=False):
+        self.root = root
+        self.load_bundle = load_bundle
+        self.idle_seconds = idle_seconds
+        self.max_loaded = max_loaded
+        self.poll_seconds = poll_seconds
+        self.fixed = fixed
+        self.swaps = 0
+        self.last_error = None
+        self._active = None
+        self._bundles = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._failed_version = None
+        self._stop = threading.Event()
+        self._watcher = None
+
+    @classmethod
+    def from_env(cls, load_bundle=ModelBundle.load):
+        """Registry configured by the environment, shared by host.py and serve.py.
+
+        MODEL_DIR serves that single directory. Otherwise versions are read
+        from MODEL_REGISTRY (default <repo>/models); if it was not set and
+        does not exist, model_creation/ is served as a single directory.
+        MODEL_POLL_SECONDS, MODEL_IDLE_SECONDS and MODEL_MAX_LOADED set the
+        watcher interval and the eviction policy.
+        """
+        model_dir = os.environ.get('MODEL_DIR')
+        root = os.environ.get('MODEL_REGISTRY')
+        if model_dir is None and root is None and not os.path.isdir(DEFAULT_REGISTRY):
+            model_dir = DEFAULT_MODEL_DIR
+        return cls(
+            model_dir or root or DEFAULT_REGISTRY,
+            load_bundle,
+            idle_seconds=float(os.environ.get('MODEL_IDLE_SECONDS', 600)),
+            max_loaded=int(os.environ.get('MODEL_MAX_LOADED', 4)),
+            poll_seconds=float(os.environ.get('MODEL_POLL_SECONDS', 5)),
+            fixed=model_dir is not None,
+        )
+
+    def versions(self):
+        return [FIXED_VERSION] if self.fixed else list_versions(self.root)
+
+    def _path(self, version):
+        return self.root if self.fixed else os.path.join(self.root, version)
+
+    def start(self):
+        """Load the active version in the foreground, then start watching for new ones."""
+        version = FIXED_VERSION if self.fixed else active_version(self.root)
+        if version is None:
+            raise FileNotFoundError(f"No model versions in {self.root}")
+        self._active = self._load(version, hold=False)
+        if not self.fixed and self.poll_seconds > 0:
+            self._watcher = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception:
+                # Recorded in last_error by refresh(); keep serving the current version
+                pass
+            self.evict_idle()
+
+    def _load(self, version, hold):
+        # One load per version at a time; later callers wait and reuse it.
+        # With `hold` the bundle is marked in use before the lock is released,
+        # so a concurrent eviction cannot close it under the caller.
+        if version not in self.versions():
+            raise UnknownVersionError(version)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(version, threading.Lock())
+        with load_lock:
+            with self._lock:
+                bundle = self._bundles.get(version)
+                if bundle is not None:
+                    bundle.in_use += hold
+                    return bundle
+            bundle = self.load_bundle(version, self._path(version))
+            bundle.warm_up()
+            with self._lock:
+                bundle.in_use += hold
+                self._bundles[version] = bundle
+                evicted = self._evict_over_capacity()
+            for old in evicted:
+                old.close()
+            return bundle
+
+    def refresh(self):
+        """Swap in the version named by CURRENT if it changed; returns the active version."""
+        if self.fixed:
+            return self._active.version
+        version = active_version(self.root)
+        if version is None or version == self._active.version or version == self._failed_version:
+            return self._active.version
+        try:
+            bundle = self._load(version, hold=True)
+        except Exception as e:
+            # Not retried until CURRENT names another version
+            self._failed_version = version
+            self.last_error = f"{version}: {e}"
+            raise
+        with self._lock:
+            self._active = bundle
+            bundle.in_use -= 1
+            bundle.last_used = time.monotonic()
+            self.swaps += 1
+        self._failed_version = None
+        return version
+
+    @contextmanager
+    def acquire(self, version=None):
+        """The bundle for `version` (default: the active one), kept loaded until the block exits."""
+        with self._lock:
+            bundle = self._active if version is None else self._bundles.get(version)
+            if bundle is not None:
+                bundle.in_use += 1
+        if bundle is None:
+            bundle = self._load(version, hold=True)
+        try:
+            yield bundle
+        finally:
+            with self._lock:
+                bundle.in_use -= 1
+                bundle.last_used = time.monotonic()
+
+    def _evictable(self):
+        # Idle bundles other than the active one, least recently used first
+        idle = [b for b in self._bundles.values() if b is not self._active and b.in_use == 0]
+        return sorted(idle, key=lambda b: b.last_used)
+
+    def _evict_over_capacity(self):
+        evicted = []
+        for bundle in self._evictable():
+            if len(self._bundles) <= self.max_loaded:
+                break
+            del self._bundles[bundle.version]
+            evicted.append(bundle)
+        return evicted
+
+    def evict_idle(self):
+        """Unload versions unused for `idle_seconds`; returns their names."""
+        now = time.monotonic()
+        with self._lock:
+            evicted = [b for b in self._evictable() if now - b.last_used >= self.idle_seconds]
+            for bundle in evicted:
+                del self._bundles[bundle.version]
+        for bundle in evicted:
+            bundle.close()
+        return [bundle.version for bundle in evicted]
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            loaded = [{
+                'version': bundle.version,
+                'in_use': bundle.in_use,
+                'idle_seconds': now - bundle.last_used,
+            } for bundle in self._bundles.values()]
+            active = self._active.version if self._active else None
+        return {
+            'active': active,
+            'available': self.versions(),
+            'loaded': loaded,
+            'swaps': self.swaps,
+            'last_error': self.last_error,
+        }
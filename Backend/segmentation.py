@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def segment(starts, probabilities, window, length, labels):
+    """Merge per-window predictions into labelled segments and change points.
+
+    Each window speaks for the span around its centre: a boundary between
+    two consecutive windows with different labels is placed halfway
+    between their centres. Returns (segments, change_points) where each
+    segment has start/end offsets, its label, the mean probability of that
+    label over its windows and the number of windows.
+    """
+    predictions = probabilities.argmax(axis=1)
+    centres = starts + np.minimum(window, length) / 2
+    changes = np.flatnonzero(predictions[1:] != predictions[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [len(predictions)]))
+
+    segments = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        start = 0 if first == 0 else int(round((centres[first - 1] + centres[first]) / 2))
+        end = length if last == len(predictions) else int(round((centres[last - 1] + centres[last]) / 2))
+        label = predictions[first]
+        segments.append({
+            'start': start,
+            'end': end,
+            'algorithm': labels[label],
+            'confidence': float(probabilities[first:last, label].mean()),
+            'windows': int(last - first),
+        })
+    return segments, [segment['start'] for segment in segments[1:]]
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import parse_qs
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from feature_extraction import compute_features
+from batching import AsyncBatcher
+from registry import ModelRegistry, UnknownVersionError
+
+
+def _init_worker(root):
+    sys.path.insert(0, root)
+
+
+class _Ticket:
+    """Counts how many of a request's admitted slots were handed to the pool."""
+
+    def __init__(self):
+        self.submitted = 0
+
+
+class PredictionServer:
+    """ASGI front end that keeps CPU-bound work off the event loop.
+
+    Feature extraction runs in a process pool so it is not serialized by
+    the GIL; inference runs in one AsyncBatcher that coalesces rows from
+    all requests. At most `max_pending` ciphertexts may be waiting for or
+    running feature extraction; beyond that requests are rejected with 503
+    and a Retry-After header. A batch larger than `max_pending` could never
+    be admitted and is rejected with 413 instead. Each request is bounded
+    by `timeout` seconds.
+
+    Models come from a ModelRegistry configured as in host.py, so both
+    servers serve the same versions, hot-swap on CURRENT and accept a
+    `model_version` query parameter or field.
+    """
+
+    def __init__(self, registry, workers=None, max_pending=None, timeout=10.0,
+                 retry_after=1, max_batch_size=64, max_wait_ms=5, max_body_bytes=64 * 1024 * 1024):
+        self.registry = registry
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending or self.workers * 32
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_body_bytes = max_body_bytes
+        self.pending = 0
+        self._pool = None
+        self._batchers = {}
+        self._started = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ModelRegistry.from_env(),
+            workers=int(os.environ.get('SERVE_WORKERS', 0)) or None,
+            max_pending=int(os.environ.get('SERVE_MAX_PENDING', 0)) or None,
+            timeout=float(os.environ.get('SERVE_TIMEOUT', 10)),
+            retry_after=int(os.environ.get('SERVE_RETRY_AFTER', 1)),
+            max_batch_size=int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 64)),
+            max_wait_ms=float(os.environ.get('PREDICT_MAX_WAIT_MS', 5)),
+        )
+
+    async def startup(self):
+        # Spawned, not forked: a fork would copy the loaded models and could inherit
+        # locks held by the registry's watcher and batcher threads
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker, initargs=(ROOT,))
+        # Refuses to start on a model whose features this code computes differently
+        await asyncio.get_running_loop().run_in_executor(None, self.registry.start)
+
+    async def shutdown(self):
+        self.registry.stop()
+        for _, batcher in self._batchers.values():
+            await batcher.stop()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _ensure_started(self):
+        # Servers without lifespan support start the pool on the first request
+        if self._started is None:
+            self._started = asyncio.ensure_future(self.startup())
+        await self._started
+
+    def _release(self, count):
+        self.pending -= count
+
+    async def _batcher(self, bundle):
+        # One AsyncBatcher per loaded bundle. A new one is started when a version
+        # is (re)loaded; those of versions the registry unloaded are stopped then.
+        # Unloaded bundles are not held by any request, so nothing is queued on them.
+        entry = self._batchers.get(bundle.version)
+        if entry is None or entry[0] is not bundle:
+            loaded = {item['version'] for item in self.registry.stats()['loaded']}
+            for version, (_, batcher) in list(self._batchers.items()):
+                if version == bundle.version or version not in loaded:
+                    del self._batchers[version]
+                    await batcher.stop()
+            batcher = AsyncBatcher(bundle.predict, self.max_batch_size, self.max_wait_ms)
+            batcher.start()
+            entry = self._batchers[bundle.version] = (bundle, batcher)
+        return entry[1]
+
+    def _submit_features(self, cipher_text, bundle, ticket):
+        loop = asyncio.get_running_loop()
+        future = self._pool.submit(compute_features, cipher_text, bundle.schema.names, profile=bundle.schema.profile)
+        # The slot is released when the worker finishes, even if the request timed out
+        ticket.submitted += 1
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, 1))
+        return asyncio.wrap_future(future)
+
+    async def _classify(self, cipher_text, bundle, ticket):
+        features = await self._submit_features(cipher_text, bundle, ticket)
+        prediction = await (await self._batcher(bundle)).predict(features)
+        return {algorithm: float(p) for algorithm, p in zip(bundle.classes, prediction)}
+
+    async def _classify_item(self, cipher_text, bundle, ticket):
+        if not isinstance(cipher_text, str):
+            return {'cipher_text': cipher_text, 'error': 'Cipher text must be a string'}
+        try:
+            return {'cipher_text': cipher_text, 'probabilities': await self._classify(cipher_text, bundle, ticket)}
+        except ValueError as e:
+            return {'cipher_text': cipher_text, 'error': str(e)}
+
+    async def predict(self, data, bundle, ticket):
+        if not isinstance(data.get('cipher_text'), str):
+            return 400, {'error': 'No cipher text provided'}
+        cipher_text = data['cipher_text']
+        try:
+            probabilities = await self._classify(cipher_text, bundle, ticket)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 200, {'cipher_text': cipher_text, 'probabilities': probabilities, 'model_version': bundle.version}
+
+    async def predict_batch(self, data, bundle, ticket):
+        if not isinstance(data.get('cipher_texts'), list):
+            return 400, {'error': 'No list of cipher texts provided'}
+        results = await asyncio.gather(*(self._classify_item(text, bundle, ticket) for text in data['cipher_texts']))
+        return 200, {'results': list(results), 'model_version': bundle.version}
+
+    def _admit(self, count):
+        if self.pending + count > self.max_pending:
+            return False
+        self.pending += count
+        return True
+
+    async def _models(self, method):
+        loop = asyncio.get_running_loop()
+        if method == 'POST':
+            # Same as the watcher's poll, for deploy scripts that do not want to wait for it
+            try:
+                await loop.run_in_executor(None, self.registry.refresh)
+            except Exception as e:
+                return 500, {'error': str(e), **self.registry.stats()}, {}
+        return 200, self.registry.stats(), {}
+
+    async def handle(self, method, path, body, query=b''):
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'pending': self.pending, 'max_pending': self.max_pending}, {}
+        if (method, path) in (('GET', '/models'), ('POST', '/models/reload')):
+            await self._ensure_started()
+            return await self._models(method)
+        routes = {'/predict': self.predict, '/predict/batch': self.predict_batch}
+        if path not in routes:
+            return 404, {'error': 'Not found'}, {}
+        if method != 'POST':
+            return 405, {'error': 'Method not allowed'}, {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {'error': 'Request body is not valid JSON'}, {}
+        if not isinstance(data, dict):
+            return 400, {'error': 'Request body must be a JSON object'}, {}
+
+        await self._ensure_started()
+        items = data.get('cipher_texts') if path == '/predict/batch' else None
+        count = len(items) if isinstance(items, list) else 1
+        if count > self.max_pending:
+            return 413, {'error': f'Batch of {count} cipher texts exceeds the limit of {self.max_pending}'}, {}
+        if not self._admit(count):
+            return 503, {'error': 'Server is saturated, retry later'}, {'retry-after': str(self.retry_after)}
+        # ?model_version=... or a "model_version" field picks a version for A/B comparison
+        version = parse_qs(query.decode('latin-1')).get('model_version', [data.get('model_version')])[0]
+        ticket = _Ticket()
+        # The bundle is held until the response is ready, so it cannot be unloaded mid-request
+        with ExitStack() as held:
+            try:
+                acquire = self.registry.acquire(None if version is None else str(version))
+                # Loading a version that is not in memory yet is blocking work
+                bundle = await asyncio.get_running_loop().run_in_executor(None, held.enter_context, acquire)
+                status, payload = await asyncio.wait_for(routes[path](data, bundle, ticket), self.timeout)
+            except UnknownVersionError as e:
+                return 404, {'error': str(e)}, {}
+            except asyncio.TimeoutError:
+                return 504, {'error': f'Request timed out after {self.timeout:g}s'}, {}
+            except Exception as e:
+                return 500, {'error': str(e)}, {}
+            finally:
+                # Submitted items release their own slot when their worker finishes
+                self._release(count - ticket.submitted)
+        return status, payload, {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > self.max_body_bytes:
+                await self._respond(send, 413, {'error': 'Request body too large'})
+                return
+            if not message.get('more_body'):
+                break
+        status, payload, headers = await self.handle(scope['method'], scope['path'], bytes(body),
+                                                     scope.get('query_string', b''))
+        await self._respond(send, status, payload, headers)
+
+    async def _respond(self, send, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        raw_headers += [(k.encode(), v.encode()) for k, v in (headers or {}).items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self._ensure_started()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = PredictionServer.from_env()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=os.environ.get('SERVE_HOST', '127.0.0.1'), port=int(os.environ.get('SERVE_PORT', 5000)))
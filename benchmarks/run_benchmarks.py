@@ -0,0 +1,358 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pywt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from feature_extraction import FEATURE_NAMES, PROFILES, char_codes, compute_features, extract_features
+from feature_extraction.bytevector import DEFAULT_BIGRAM_BINS, ByteVectorLayout
+from feature_extraction.bigrams import bigram_counts, markov_stats, pair_frequency_stats, perplexity
+from feature_extraction.features import (as_buffers, bit_transitions, character_classes, compression_estimate,
+                                         fast_spectrum_statistics, spectrum_statistics)
+from feature_extraction.repeats import suffix_array
+from feature_extraction.streaming import extract_features_from_buffer
+
+DEFAULT_SIZES = [64, 1024, 16384, 262144, 1048576, 10485760]
+DEFAULT_CONCURRENCY = [1, 4, 16]
+
+
+def make_ciphertext(size, seed=0):
+    """Base64 text of exactly `size` characters from seeded random bytes."""
+    rng = np.random.default_rng(seed)
+    raw = rng.integers(0, 256, size=size * 3 // 4 + 3, dtype=np.uint8).tobytes()
+    return base64.b64encode(raw).decode()[:size]
+
+
+def time_call(fn, min_time=0.2, max_repeats=50):
+    """Run `fn` repeatedly and return timing statistics in seconds."""
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < max_repeats and (len(timings) < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return {
+        'repeats': len(timings),
+        'min': min(timings),
+        'median': float(np.median(timings)),
+        'mean': float(np.mean(timings)),
+    }
+
+
+def feature_stages(text):
+    """Named callables for every stage of feature extraction on `text`."""
+    codes, _, decoded = as_buffers(text)
+    raw = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    values = codes.astype(np.float64)
+    counts = bigram_counts(codes)
+    return {
+        'char_codes': lambda: char_codes(text),
+        'compression_ratio': lambda: len(zlib.compress(raw.tobytes())) / len(raw),
+        'runs': lambda: np.flatnonzero(codes[1:] != codes[:-1]),
+        'bit_transition_frequency': lambda: bit_transitions(raw),
+        # The FFT stage of each profile, as the extractor computes it
+        'fourier_transform': lambda: spectrum_statistics(codes),
+        'fourier_transform_fast': lambda: fast_spectrum_statistics(codes),
+        'compression_estimate': lambda: compression_estimate(raw.tobytes()),
+        'wavelet_transform': lambda: pywt.dwt(values, 'haar'),
+        'bigram_counts': lambda: bigram_counts(codes),
+        'character_pair_frequency': lambda: pair_frequency_stats(counts),
+        'markov_chain': lambda: markov_stats(counts),
+        'perplexity': lambda: perplexity(counts),
+        'character_classes': lambda: character_classes(codes, decoded),
+        'suffix_array': lambda: suffix_array(codes),
+        'extract_features': lambda: extract_features(text),
+        'extract_features_with_repeats': lambda: extract_features(text, with_repeats=True),
+        'extract_features_fast': lambda: compute_features(text, FEATURE_NAMES, profile='fast'),
+        'streaming_features': lambda: extract_features_from_buffer(raw),
+    }
+
+
+def bench_features(sizes, min_time):
+    results = {}
+    for size in sizes:
+        text = make_ciphertext(size)
+        for name, fn in feature_stages(text).items():
+            stats = time_call(fn, min_time)
+            stats['bytes_per_second'] = size / stats['median']
+            results[f'{name}[{size}]'] = stats
+            print(f"features  {name:32s} {size:>9d} B  {stats['median'] * 1e3:10.3f} ms")
+    return results
+
+
+def bench_dataset(rows, min_time):
+    sys.path.insert(0, os.path.join(ROOT, 'dataset_creation'))
+    from create_data import generate_shard
+
+    stats = time_call(lambda: generate_shard(0, rows, 0), min_time, max_repeats=5)
+    stats['rows_per_second'] = rows / stats['median']
+    print(f"dataset   generate_shard {rows} rows  {stats['rows_per_second']:.0f} rows/s")
+    return {f'generate_shard[{rows}]': stats}
+
+
+def bench_profiles(sizes, rows, min_time):
+    """Speed and error of each feature profile against 'exact', then accuracy of a model trained on each.
+
+    The model is a small scikit-learn MLP standing in for model.py's
+    network (TensorFlow is not needed here); every profile trains on the
+    same ciphertexts, long enough for the fast paths to apply. Sizes are
+    measured one byte past the requested size, since power-of-two lengths
+    are already fast FFT lengths and would show no error.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    sys.path.insert(0, os.path.join(ROOT, 'dataset_creation'))
+    from create_data import DEFAULT_OPTIONS, generate_shard
+
+    results = {}
+    for size in sizes:
+        size += 1
+        text = make_ciphertext(size)
+        exact = compute_features(text, FEATURE_NAMES)
+        for profile in PROFILES:
+            stats = time_call(lambda: compute_features(text, FEATURE_NAMES, profile=profile), min_time)
+            values = compute_features(text, FEATURE_NAMES, profile=profile)
+            errors = np.abs(values - exact) / np.maximum(np.abs(exact), 1e-12)
+            stats['max_relative_error'] = float(errors.max())
+            stats['relative_errors'] = {name: float(error) for name, error in zip(FEATURE_NAMES, errors) if error > 0}
+            results[f'profile_{profile}[{size}]'] = stats
+            worst = FEATURE_NAMES[int(errors.argmax())] if errors.max() > 0 else '-'
+            print(f"profiles  {profile:8s} {size:>9d} B  {stats['median'] * 1e3:10.3f} ms  "
+                  f"max rel. error {stats['max_relative_error']:.2e} ({worst})")
+
+    for profile in PROFILES:
+        options = dict(DEFAULT_OPTIONS, min_length=1024, max_length=8192, features=FEATURE_NAMES, profile=profile)
+        start = time.perf_counter()
+        data = generate_shard(0, rows, 0, options)
+        elapsed = time.perf_counter() - start
+        x_train, x_test, y_train, y_test = train_test_split(
+            data[FEATURE_NAMES].to_numpy(), data['algorithm'].to_numpy(), test_size=0.25, random_state=0,
+            stratify=data['algorithm'])
+        model = make_pipeline(StandardScaler(), MLPClassifier((64, 32), max_iter=1000, early_stopping=True, random_state=0))
+        model.fit(x_train, y_train)
+        stats = {
+            'rows_per_second': rows / elapsed,
+            'accuracy': float(model.score(x_test, y_test)),
+            'chance': 1 / data['algorithm'].nunique(),
+        }
+        results[f'profile_accuracy_{profile}[{rows}]'] = stats
+        print(f"profiles  {profile:8s} {rows} rows  {stats['rows_per_second']:8.1f} rows/s  "
+              f"accuracy {stats['accuracy'] * 100:.2f}% (chance {stats['chance'] * 100:.2f}%)")
+    return results
+
+
+def folded_mlp(model):
+    """A fitted StandardScaler + MLPClassifier pipeline as the serving runtime's NumpyModel."""
+    sys.path.insert(0, os.path.join(ROOT, 'Backend'))
+    from inference import ACTIVATIONS, NumpyModel
+
+    scaler, mlp = model.named_steps['standardscaler'], model.named_steps['mlpclassifier']
+    kernels, biases = list(mlp.coefs_), list(mlp.intercepts_)
+    biases[0] = biases[0] - (scaler.mean_ / scaler.scale_) @ kernels[0]
+    kernels[0] = kernels[0] / scaler.scale_[:, None]
+    activations = ['relu'] * (len(kernels) - 1) + ['softmax']
+    return NumpyModel([(kernel.astype(np.float32), bias.astype(np.float32), ACTIVATIONS[activation])
+                       for kernel, bias, activation in zip(kernels, biases, activations)])
+
+
+def bench_bytes(rows, batch_sizes, size, min_time):
+    """End-to-end latency and accuracy of the byte-level pipeline against the feature pipeline.
+
+    Both train the same scikit-learn MLP stand-in on the same ciphertexts
+    (one generate_shard seed, featurized either way), and latency covers
+    turning a batch of ciphertexts into probabilities through the folded
+    NumpyModel, as host.py serves them.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    sys.path.insert(0, os.path.join(ROOT, 'dataset_creation'))
+    from create_data import DEFAULT_OPTIONS, generate_shard
+
+    layout = ByteVectorLayout(DEFAULT_BIGRAM_BINS)
+    pipelines = {
+        'features': (dict(DEFAULT_OPTIONS, features=FEATURE_NAMES), FEATURE_NAMES,
+                     lambda texts: np.vstack([compute_features(text, FEATURE_NAMES) for text in texts])),
+        'bytes': (dict(DEFAULT_OPTIONS, bigram_bins=layout.bigram_bins), layout.columns, layout.extract_batch),
+    }
+    texts = [make_ciphertext(size, seed) for seed in range(max(batch_sizes))]
+
+    results = {}
+    for pipeline, (options, columns, featurize) in pipelines.items():
+        start = time.perf_counter()
+        data = generate_shard(0, rows, 0, options)
+        elapsed = time.perf_counter() - start
+        x_train, x_test, y_train, y_test = train_test_split(
+            data[columns].to_numpy(), data['algorithm'].to_numpy(), test_size=0.25, random_state=0,
+            stratify=data['algorithm'])
+        model = make_pipeline(StandardScaler(), MLPClassifier((64, 32), max_iter=1000, early_stopping=True, random_state=0))
+        model.fit(x_train, y_train)
+        stats = {
+            'rows_per_second': rows / elapsed,
+            'accuracy': float(model.score(x_test, y_test)),
+            'chance': 1 / data['algorithm'].nunique(),
+        }
+        results[f'pipeline_accuracy_{pipeline}[{rows}]'] = stats
+        print(f"bytes     {pipeline:8s} {rows} rows  {stats['rows_per_second']:8.1f} rows/s  "
+              f"accuracy {stats['accuracy'] * 100:.2f}% (chance {stats['chance'] * 100:.2f}%)")
+
+        predictor = folded_mlp(model)
+        for batch_size in batch_sizes:
+            batch = texts[:batch_size]
+            stats = time_call(lambda: predictor.predict(featurize(batch)), min_time)
+            stats['rows_per_second'] = batch_size / stats['median']
+            results[f'pipeline_{pipeline}[{size},b={batch_size}]'] = stats
+            print(f"bytes     {pipeline:8s} {size:>9d} B  b={batch_size:<3d} {stats['median'] * 1e3:10.3f} ms  "
+                  f"{stats['rows_per_second']:10.1f} rows/s")
+    return results
+
+
+def bench_predict(sizes, concurrency_levels, requests_per_level):
+    sys.path.insert(0, os.path.join(ROOT, 'Backend'))
+    import host
+
+    results = {}
+    for size in sizes:
+        payload = {'cipher_text': make_ciphertext(size)}
+        for concurrency in concurrency_levels:
+            def one_request(_):
+                client = host.app.test_client()
+                t0 = time.perf_counter()
+                response = client.post('/predict', json=payload)
+                elapsed = time.perf_counter() - t0
+                if response.status_code != 200:
+                    raise RuntimeError(response.get_json())
+                return elapsed
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = np.array(list(pool.map(one_request, range(requests_per_level))))
+            wall = time.perf_counter() - start
+            stats = {
+                'requests': requests_per_level,
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'requests_per_second': requests_per_level / wall,
+            }
+            results[f'predict[{size},c={concurrency}]'] = stats
+            print(f"predict   {size:>9d} B  c={concurrency:<3d} p50 {stats['p50'] * 1e3:8.2f} ms  "
+                  f"p99 {stats['p99'] * 1e3:8.2f} ms  {stats['requests_per_second']:8.1f} req/s")
+    return results
+
+
+def run(args):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.time(),
+        },
+        'benchmarks': {},
+    }
+    suites = set(args.suites.split(','))
+    sizes = [s for s in args.sizes if s <= args.max_size]
+    if 'features' in suites:
+        results['benchmarks'].update(bench_features(sizes, args.min_time))
+    if 'dataset' in suites:
+        results['benchmarks'].update(bench_dataset(args.dataset_rows, args.min_time))
+    if 'profiles' in suites:
+        results['benchmarks'].update(bench_profiles(sizes, args.profile_rows, args.min_time))
+    if 'bytes' in suites:
+        results['benchmarks'].update(bench_bytes(args.pipeline_rows, args.pipeline_batch_sizes, args.pipeline_size,
+                                                 args.min_time))
+    if 'predict' in suites:
+        predict_sizes = [s for s in sizes if s <= args.max_predict_size]
+        results['benchmarks'].update(bench_predict(predict_sizes, args.concurrency, args.requests))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+# For each metric: True if larger is better
+METRICS = {
+    'median': False,
+    'p50': False,
+    'p95': False,
+    'p99': False,
+    'rows_per_second': True,
+    'requests_per_second': True,
+}
+
+
+def compare(args):
+    """Print per-benchmark changes and exit non-zero if any regress beyond the threshold."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)['benchmarks']
+    with open(args.current) as f:
+        current = json.load(f)['benchmarks']
+
+    regressions = 0
+    for name in sorted(set(baseline) & set(current)):
+        for metric, higher_is_better in METRICS.items():
+            if metric not in baseline[name] or metric not in current[name]:
+                continue
+            old, new = baseline[name][metric], current[name][metric]
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > args.threshold else ''
+            regressions += bool(flag)
+            print(f"{name:48s} {metric:20s} {old:12.6g} -> {new:12.6g} ({change:+7.1%}) {flag}")
+    for name in sorted(set(baseline) - set(current)):
+        print(f"{name:48s} missing from current run")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark feature extraction, dataset generation and /predict.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run benchmarks and write results as JSON')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--suites', default='features,dataset,predict',
+                            help='comma-separated subset of features,dataset,profiles,bytes,predict')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='ciphertext sizes in bytes')
+    run_parser.add_argument('--max-size', type=int, default=max(DEFAULT_SIZES))
+    run_parser.add_argument('--max-predict-size', type=int, default=1048576,
+                            help='largest ciphertext sent through /predict')
+    run_parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds spent per case')
+    run_parser.add_argument('--dataset-rows', type=int, default=300)
+    run_parser.add_argument('--profile-rows', type=int, default=1200,
+                            help='rows generated per feature profile for the accuracy comparison')
+    run_parser.add_argument('--pipeline-rows', type=int, default=6000,
+                            help='rows generated per pipeline (features, bytes) for the accuracy comparison')
+    run_parser.add_argument('--pipeline-batch-sizes', type=int, nargs='+', default=[1, 64])
+    run_parser.add_argument('--pipeline-size', type=int, default=1024,
+                            help='ciphertext size in bytes for the pipeline latency comparison')
+    run_parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY)
+    run_parser.add_argument('--requests', type=int, default=200, help='requests per concurrency level')
+
+    compare_parser = commands.add_parser('compare', help='compare a run against a stored baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='relative slowdown that counts as a regression')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
@@ -1,22 +1,30 @@
+import os
+import sys
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import random
 import string
-import math
-import zlib
-from scipy.stats import entropy, kurtosis, skew
-from collections import Counter, defaultdict
+from scipy.stats import kurtosis, skew
+from collections import Counter
 from itertools import groupby
-from scipy.fftpack import fft
 import pywt
-from Crypto.Cipher import Blowfish, AES, DES
-from Crypto.Util.Padding import pad
-from Crypto.Random import get_random_bytes
-import base64
+from encryption import ALGORITHMS, BLOCK_MODES, encrypt_batch, label
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from feature_extraction import (CASCADE_FEATURE_NAMES, PROFILES, FeatureSchema, char_codes, compute_features_dict,
+                                dataset_schema_path, feature_names)
+from feature_extraction.bytevector import DEFAULT_BIGRAM_BINS, ByteVectorLayout
+from feature_extraction.store import FeatureStoreWriter
+from feature_extraction.bigrams import bigram_counts, markov_stats, pair_frequency_stats, repeated_pair_count
 
 # Helper functions
-def generate_random_text(length=100):
-    return ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=length))
+# The model features live in feature_extraction; the functions below are
+# candidate features that are not part of the trained model.
+def generate_random_text(length=100, rng=random):
+    return ''.join(rng.choices(string.ascii_letters + string.digits + string.punctuation, k=length))
 
 def shannon_entropy(text):
     prob = [float(text.count(c)) / len(text) for c in set(text)]
@@ -25,45 +33,9 @@ def shannon_entropy(text):
 def length_mod_block_size(text, block_size=16):
     return len(text) % block_size
 
-def compression_ratio(text):
-    compressed = zlib.compress(text.encode('utf-8'))
-    return len(compressed) / len(text.encode('utf-8'))
-
-def runs_index(text):
-    return len([sum(1 for _ in group) for _, group in groupby(text)])
-
-def serial_index(text):
-    bigrams = [text[i:i+2] for i in range(len(text)-1)]
-    return len(set(bigrams))
-
-
-def bit_transition_frequency(text):
-    bits = ''.join(format(byte, '08b') for byte in text.encode('utf-8'))
-    return sum(bits[i] != bits[i-1] for i in range(1, len(bits)))
-
 def run_length_encoding(text):
     return sum(1 for _ in groupby(text))
 
-def fourier_transform_mean(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.mean(np.abs(fft_vals))
-
-def fourier_transform_std(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.std(np.abs(fft_vals))
-
-def fourier_transform_peak(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.max(np.abs(fft_vals))
-
-def fourier_transform_energy(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return np.sum(np.square(np.abs(fft_vals)))
-
 def wavelet_transform_mean(text):
     byte_values = np.array([ord(c) for c in text])
     coeffs = pywt.dwt(byte_values, 'haar')
@@ -79,21 +51,9 @@ def wavelet_transform_peak(text):
     coeffs = pywt.dwt(byte_values, 'haar')
     return np.max(coeffs[0])
 
-def wavelet_transform_energy(text):
-    byte_values = np.array([ord(c) for c in text])
-    coeffs = pywt.dwt(byte_values, 'haar')
-    return np.sum(np.square(coeffs[0]))
-
 def xor_with_constant(text, constant=0xFF):
     return ''.join(chr(ord(c) ^ constant) for c in text)
 
-def perplexity(text):
-    bigrams = [text[i:i+2] for i in range(len(text)-1)]
-    bigram_counts = Counter(bigrams)
-    total_bigrams = sum(bigram_counts.values())
-    probs = [bigram_counts[bg] / total_bigrams for bg in bigrams]
-    return math.exp(-sum(p * math.log(p, 2) for p in probs if p > 0) / len(probs))
-
 def burstiness(text):
     counts = Counter(text)
     inter_arrival_times = [1 / counts[c] for c in text]
@@ -101,86 +61,17 @@ def burstiness(text):
     std_inter_arrival = np.std(inter_arrival_times)
     return std_inter_arrival / mean_inter_arrival if mean_inter_arrival else 0
 
-def markov_chain_mean(text):
-    transitions = defaultdict(lambda: defaultdict(int))
-    for i in range(len(text) - 1):
-        transitions[text[i]][text[i+1]] += 1
-    for current_char, next_chars in transitions.items():
-        total = sum(next_chars.values())
-        for char in next_chars:
-            transitions[current_char][char] /= total
-    return np.mean([transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)])
-
-def markov_chain_std(text):
-    transitions = defaultdict(lambda: defaultdict(int))
-    for i in range(len(text) - 1):
-        transitions[text[i]][text[i+1]] += 1
-    for current_char, next_chars in transitions.items():
-        total = sum(next_chars.values())
-        for char in next_chars:
-            transitions[current_char][char] /= total
-    return np.std([transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)])
-
 def markov_chain_peak(text):
-    transitions = defaultdict(lambda: defaultdict(int))
-    for i in range(len(text) - 1):
-        transitions[text[i]][text[i+1]] += 1
-    for current_char, next_chars in transitions.items():
-        total = sum(next_chars.values())
-        for char in next_chars:
-            transitions[current_char][char] /= total
-    return np.max([transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)])
-
-def character_pair_frequency_mean(text):
-    pairs = [text[i:i+2] for i in range(len(text)-1)]
-    return np.mean([pairs.count(pair) for pair in set(pairs)])
-
-def character_pair_frequency_std(text):
-    pairs = [text[i:i+2] for i in range(len(text)-1)]
-    return np.std([pairs.count(pair) for pair in set(pairs)])
+    return markov_stats(bigram_counts(char_codes(text)))[2]
 
 def character_pair_frequency_peak(text):
-    pairs = [text[i:i+2] for i in range(len(text)-1)]
-    return np.max([pairs.count(pair) for pair in set(pairs)])
-
-def vowel_to_consonant_ratio(text):
-    vowels = 'aeiou'
-    vowel_count = sum(1 for c in text.lower() if c in vowels)
-    consonant_count = sum(1 for c in text.lower() if c.isalpha() and c not in vowels)
-    return vowel_count / consonant_count if consonant_count else 0
-
-def uppercase_to_lowercase_ratio(text):
-    uppercase_count = sum(1 for c in text if c.isupper())
-    lowercase_count = sum(1 for c in text if c.islower())
-    return uppercase_count / lowercase_count if lowercase_count else 0
+    return pair_frequency_stats(bigram_counts(char_codes(text)))[2]
 
 def unique_character_count(text):
     return len(set(text))
 
-def longest_repeated_sequence(text):
-    longest_seq = ''
-    for i in range(len(text)):
-        for j in range(i + 1, len(text) + 1):
-            seq = text[i:j]
-            if seq in text[j:]:
-                if len(seq) > len(longest_seq):
-                    longest_seq = seq
-    return len(longest_seq)
-
-def longest_run_of_identical_bytes(text):
-    longest_run = 0
-    current_run = 1
-    for i in range(1, len(text)):
-        if text[i] == text[i-1]:
-            current_run += 1
-        else:
-            longest_run = max(longest_run, current_run)
-            current_run = 1
-    return max(longest_run, current_run)
-
 def repeated_pattern_count(text):
-    patterns = [text[i:i+2] for i in range(len(text)-1)]
-    return len([pattern for pattern in set(patterns) if patterns.count(pattern) > 1])
+    return repeated_pair_count(bigram_counts(char_codes(text)))
 
 def variance_of_byte_values(text):
     byte_values = [ord(c) for c in text]
@@ -190,82 +81,195 @@ def skewness_and_kurtosis(text):
     byte_values = [ord(c) for c in text]
     return skew(byte_values), kurtosis(byte_values)
 
-def entropy_of_fft_components(text):
-    byte_values = [ord(c) for c in text]
-    fft_vals = fft(byte_values)
-    return entropy(np.abs(fft_vals))
-
-
-def encrypt_aes(text):
-    key = get_random_bytes(16) 
-    cipher = AES.new(key, AES.MODE_ECB)
-    padded_text = pad(text.encode(), AES.block_size)
-    encrypted = cipher.encrypt(padded_text)
-    return base64.b64encode(encrypted).decode()
-
-def encrypt_des(text):
-    key = get_random_bytes(8) 
-    cipher = DES.new(key, DES.MODE_ECB)
-    padded_text = pad(text.encode(), DES.block_size)
-    encrypted = cipher.encrypt(padded_text)
-    return base64.b64encode(encrypted).decode()
-
-def encrypt_blowfish(text):
-    key = get_random_bytes(16)  
-    cipher = Blowfish.new(key, Blowfish.MODE_ECB)
-    padded_text = pad(text.encode(), Blowfish.block_size)
-    encrypted = cipher.encrypt(padded_text)
-    return base64.b64encode(encrypted).decode()
-
-
-texts = [generate_random_text() for _ in range(500)]  # Generate 100 random texts
-data = []
-
-for text in texts:
-    byte_values = [ord(c) for c in text]
-    for encrypt_func, algo_name in [(encrypt_aes, 'AES'), (encrypt_des, 'DES'), (encrypt_blowfish, 'Blowfish')]:
-        Etext = encrypt_func(text)
-
-        features = {
-            'text_length': len(Etext),
-            # 'shannon_entropy': shannon_entropy(Etext),
-            'compression_ratio': compression_ratio(Etext),
-            'runs_index': runs_index(Etext),
-            'serial_index': serial_index(Etext),
-            'bit_transition_frequency': bit_transition_frequency(Etext),
-            'fourier_transform_mean': fourier_transform_mean(Etext),
-            'fourier_transform_std': fourier_transform_std(Etext),
-            'fourier_transform_peak': fourier_transform_peak(Etext),
-            'fourier_transform_energy': fourier_transform_energy(Etext),
-            # 'wavelet_transform_mean': wavelet_transform_mean(Etext),
-            # 'wavelet_transform_std': wavelet_transform_std(Etext),
-            # 'wavelet_transform_peak': wavelet_transform_peak(Etext),
-            'wavelet_transform_energy': wavelet_transform_energy(Etext),
-            'perplexity': perplexity(Etext),
-            # 'burstiness': burstiness(Etext),
-            'markov_chain_mean': markov_chain_mean(Etext),
-            'markov_chain_std': markov_chain_std(Etext),
-            # 'markov_chain_peak': markov_chain_peak(Etext),
-            'character_pair_frequency_mean': character_pair_frequency_mean(Etext),
-            'character_pair_frequency_std': character_pair_frequency_std(Etext),
-            # 'character_pair_frequency_peak': character_pair_frequency_peak(Etext),
-            'vowel_to_consonant_ratio': vowel_to_consonant_ratio(Etext),
-            'uppercase_to_lowercase_ratio': uppercase_to_lowercase_ratio(Etext),
-            # 'unique_character_count': unique_character_count(Etext),
-            # 'longest_repeated_sequence': longest_repeated_sequence(Etext),
-            'longest_run_of_identical_bytes': longest_run_of_identical_bytes(Etext),
-            # 'repeated_pattern_count': repeated_pattern_count(Etext),
-            # 'variance_of_byte_values': variance_of_byte_values(Etext),
-            # 'skewness': skewness_and_kurtosis(Etext)[0],
-            # 'kurtosis': skewness_and_kurtosis(Etext)[1],
-            'entropy_of_fft_components': entropy_of_fft_components(Etext),
-            'algorithm': algo_name
-        }
-        data.append(features)
-        
-
-df = pd.DataFrame(data)
-cols = [col for col in df.columns if col != 'algorithm'] + ['algorithm']
-data_df = df[cols]
-
-df.to_csv('dataset.csv', index=False)
\ No newline at end of file
+DEFAULT_OPTIONS = {
+    'min_length': 100,
+    'max_length': 100,
+    'ciphers': [('AES', 'ECB'), ('DES', 'ECB'), ('Blowfish', 'ECB')],
+    'key_reuse': 1,
+    'encoding': 'base64',
+    'features': feature_names(with_repeats=True),
+    'profile': 'exact',
+    # Set to a bucket count for byte-vector rows (model.py --input bytes) instead of features
+    'bigram_bins': None,
+}
+
+def generate_shard(shard_index, n_rows, seed, options=DEFAULT_OPTIONS):
+    """Generate `n_rows` labelled feature rows for one shard.
+
+    The shard's RNG is derived from (seed, shard_index), so a shard produces
+    the same rows no matter which worker runs it or in what order. Each
+    cipher configuration encrypts all of the shard's plaintexts in one
+    encrypt_batch call.
+    """
+    shard_seed = np.random.SeedSequence([seed, shard_index]).generate_state(1)[0]
+    rng = random.Random(int(shard_seed))
+    ciphers = options['ciphers']
+    n_texts = -(-n_rows // len(ciphers))
+    plaintexts = [generate_random_text(rng.randint(options['min_length'], options['max_length']), rng).encode()
+                  for _ in range(n_texts)]
+    encrypted = [encrypt_batch(plaintexts, algorithm, mode, rng, options['key_reuse'], options['encoding'])
+                 for algorithm, mode in ciphers]
+
+    if options.get('bigram_bins'):
+        # Same row order as below: each plaintext under every cipher in turn
+        layout = ByteVectorLayout(options['bigram_bins'])
+        vectors = np.stack([layout.extract_batch(ciphertexts) for ciphertexts in encrypted], axis=1)
+        frame = pd.DataFrame(vectors.reshape(-1, len(layout))[:n_rows], columns=layout.columns)
+        frame['algorithm'] = [label(algorithm, mode) for _ in range(n_texts) for algorithm, mode in ciphers][:n_rows]
+        return frame
+
+    data = []
+    for i in range(n_texts):
+        for (algorithm, mode), ciphertexts in zip(ciphers, encrypted):
+            if len(data) == n_rows:
+                break
+            features = compute_features_dict(ciphertexts[i], options['features'], options['profile'])
+            features['algorithm'] = label(algorithm, mode)
+            data.append(features)
+    return pd.DataFrame(data)
+
+class CsvChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+class ParquetChunkWriter:
+    def __init__(self, path):
+        import pyarrow.parquet as pq
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        # Each chunk becomes one row group
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class NpyChunkWriter:
+    """Feature store directory: float32 .npy shards that model.py memory-maps."""
+
+    def __init__(self, path):
+        self.store = FeatureStoreWriter(path)
+
+    def write(self, chunk):
+        features = chunk.drop(columns=['algorithm'])
+        self.store.write(features.columns, features.to_numpy(dtype=np.float32), chunk['algorithm'].to_numpy())
+
+    def close(self):
+        self.store.close()
+
+WRITERS = {'csv': CsvChunkWriter, 'parquet': ParquetChunkWriter, 'npy': NpyChunkWriter}
+DEFAULT_OUTPUTS = {'csv': 'dataset.csv', 'parquet': 'dataset.parquet', 'npy': 'dataset_npy'}
+
+def shard_sizes(rows, chunk_size):
+    return [min(chunk_size, rows - start) for start in range(0, rows, chunk_size)]
+
+def generate_dataset(output, rows, seed, workers, chunk_size, fmt, options=DEFAULT_OPTIONS):
+    """Generate `rows` rows across a process pool and stream them to `output`.
+
+    Finished shards are written in shard order as soon as they are ready.
+    At most two shards per worker are in flight, so memory stays bounded by
+    the chunk size rather than the total row count.
+    """
+    sizes = shard_sizes(rows, chunk_size)
+    # Records which feature versions (or byte-vector layout) produced the columns, for model.py to check
+    if options.get('bigram_bins'):
+        ByteVectorLayout(options['bigram_bins']).save(dataset_schema_path(output))
+    else:
+        FeatureSchema.current(options['features'], options['profile']).save(dataset_schema_path(output))
+    writer = WRITERS[fmt](output)
+    max_in_flight = max(1, workers) * 2
+    written = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            next_shard = 0
+            while next_shard < len(sizes) or pending:
+                while next_shard < len(sizes) and len(pending) < max_in_flight:
+                    pending.append(pool.submit(generate_shard, next_shard, sizes[next_shard], seed, options))
+                    next_shard += 1
+                chunk = pending.pop(0).result()
+                writer.write(chunk)
+                written += len(chunk)
+                elapsed = time.perf_counter() - start
+                print(f"{written}/{rows} rows written ({written / elapsed:.0f} rows/s)")
+    finally:
+        writer.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate a labelled ciphertext feature dataset.')
+    parser.add_argument('--rows', type=int, default=1500, help='number of rows to generate')
+    parser.add_argument('--min-length', type=int, default=100, help='minimum plaintext length')
+    parser.add_argument('--max-length', type=int, default=100, help='maximum plaintext length (lengths are uniform in [min, max])')
+    parser.add_argument('--seed', type=int, default=None, help='base seed; each shard derives its own seed from it')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per shard / output chunk')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help='output format; npy writes a directory of float32 shards for memory-mapped training')
+    parser.add_argument('--output', default=None, help='output path (default: dataset.csv, dataset.parquet or dataset_npy/)')
+    parser.add_argument('--no-repeat-features', dest='with_repeats', action='store_false',
+                        help='omit the suffix-array repeat features (gives the original 19 columns)')
+    parser.add_argument('--cascade-features', action='store_true',
+                        help='add the block-alignment columns used by the cascade\'s cheap tier (model.py --cascade)')
+    parser.add_argument('--profile', choices=PROFILES, default='exact',
+                        help='feature profile; fast approximates compression_ratio and the FFT features')
+    parser.add_argument('--byte-vectors', action='store_true',
+                        help='write byte histogram + bigram-hash rows for model.py --input bytes instead of features '
+                             '(use --format npy; rows are over a thousand columns wide)')
+    parser.add_argument('--bigram-bins', type=int, default=DEFAULT_BIGRAM_BINS,
+                        help='hash buckets for byte pairs with --byte-vectors (a power of two)')
+    parser.add_argument('--algorithms', nargs='+', choices=sorted(ALGORITHMS), default=['AES', 'DES', 'Blowfish'])
+    parser.add_argument('--modes', nargs='+', choices=sorted(BLOCK_MODES), default=['ECB'],
+                        help='block cipher modes; non-ECB rows are labelled e.g. AES-CBC')
+    parser.add_argument('--key-reuse', type=int, default=1,
+                        help='plaintexts encrypted under each random key (larger is faster)')
+    parser.add_argument('--encoding', choices=['base64', 'hex'], default='base64', help='ciphertext text encoding')
+    args = parser.parse_args()
+    if args.min_length < 1 or args.max_length < args.min_length:
+        parser.error('--max-length must be >= --min-length >= 1')
+    if args.key_reuse < 1:
+        parser.error('--key-reuse must be >= 1')
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy % 2**32
+    print(f"Using seed {seed}")
+    # ChaCha20 is a stream cipher and appears once whatever the modes
+    ciphers = list(dict.fromkeys(
+        (algorithm, 'CTR' if algorithm == 'ChaCha20' else mode)
+        for algorithm in args.algorithms for mode in args.modes))
+    options = {
+        'min_length': args.min_length,
+        'max_length': args.max_length,
+        'ciphers': ciphers,
+        'key_reuse': args.key_reuse,
+        'encoding': args.encoding,
+        'features': feature_names(args.with_repeats) + (CASCADE_FEATURE_NAMES if args.cascade_features else []),
+        'profile': args.profile,
+        'bigram_bins': args.bigram_bins if args.byte_vectors else None,
+    }
+    generate_dataset(
+        args.output or DEFAULT_OUTPUTS[args.format],
+        args.rows,
+        seed,
+        args.workers,
+        args.chunk_size,
+        args.format,
+        options,
+    )
@@ -0,0 +1,5 @@
+from .features import (CASCADE_FEATURE_NAMES, FEATURES, FEATURE_NAMES, PROFILES, char_codes, cheap_feature_names, compute_features,
+                       compute_features_dict, extract_features, extract_features_dict, feature_names, full_feature_names)
+from .repeats import REPEAT_FEATURE_NAMES
+from .schema import (CLASSES_FILENAME, FeatureSchema, SchemaMismatchError, dataset_schema_path, model_classes, model_schema,
+                     save_classes)
@@ -0,0 +1,63 @@
+import numpy as np
+
+BYTE_ALPHABET = 256
+
+
+def bigram_counts(codes):
+    """Count adjacent pairs of `codes` into a dense transition matrix.
+
+    Byte-valued input is counted into a fixed 256x256 matrix indexed by the
+    byte values themselves. Wider code points are first mapped onto their
+    sorted alphabet so the matrix stays alphabet-sized. Either way the
+    matrix is filled by a single bincount over the flattened pair indices,
+    and counts[i, j] is the number of times symbol i is followed by j.
+    """
+    if codes.dtype == np.uint8:
+        k = BYTE_ALPHABET
+        idx = codes
+    else:
+        _, idx = np.unique(codes, return_inverse=True)
+        k = int(idx.max()) + 1 if len(idx) else 0
+    pair_idx = idx[:-1].astype(np.int64) * k + idx[1:]
+    return np.bincount(pair_idx, minlength=k * k).reshape(k, k)
+
+
+def pair_frequency_stats(counts):
+    """Mean, std and peak of the occurrence counts of the distinct pairs."""
+    observed = counts[counts > 0].astype(np.float64)
+    return np.mean(observed), np.std(observed), np.max(observed)
+
+
+def serial_index(counts):
+    """Number of distinct adjacent pairs."""
+    return int(np.count_nonzero(counts))
+
+
+def repeated_pair_count(counts):
+    """Number of distinct adjacent pairs that occur more than once."""
+    return int(np.count_nonzero(counts > 1))
+
+
+def perplexity(counts):
+    """Perplexity of the pair distribution, weighted by pair occurrences."""
+    observed = counts[counts > 0].astype(np.float64)
+    total = observed.sum()
+    probs = observed / total
+    return np.exp(-np.sum(observed * probs * np.log2(probs)) / total)
+
+
+def markov_transitions(counts):
+    """Row-normalized transition probabilities between symbols that start a pair.
+
+    Rows and columns are restricted to symbols with at least one outgoing
+    transition, so a symbol that only appears last does not add a column.
+    """
+    row_totals = counts.sum(axis=1)
+    sources = np.flatnonzero(row_totals)
+    return counts[np.ix_(sources, sources)] / row_totals[sources, None]
+
+
+def markov_stats(counts):
+    """Mean, std and peak of the Markov transition probabilities."""
+    transitions = markov_transitions(counts)
+    return np.mean(transitions), np.std(transitions), np.max(transitions)
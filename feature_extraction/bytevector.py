@@ -0,0 +1,100 @@
+import json
+import numpy as np
+from .features import as_buffers
+
+# Saved beside byte_model.npz, and as the schema sidecar of byte-vector datasets
+BYTE_LAYOUT_FILENAME = 'byte_vector.json'
+BYTE_CLASSES_FILENAME = 'byte_classes.json'
+BYTE_LAYOUT_FORMAT = 1
+
+DEFAULT_BIGRAM_BINS = 1024
+
+# 2^32 / golden ratio: multiplicative (Fibonacci) hashing of the 16-bit pair index
+_HASH_MULTIPLIER = np.uint32(2654435761)
+
+
+def as_bytes(text):
+    """UTF-8 bytes of a str or bytes-like ciphertext as a uint8 array, refusing inputs too short to have a pair."""
+    raw = as_buffers(text)[1]
+    if len(raw) < 2:
+        raise ValueError('At least two characters are needed to extract features')
+    return raw
+
+
+class ByteVectorLayout:
+    """Fixed-length input of the feature-free byte-level model.
+
+    A row is the byte histogram (256 frequencies), the frequencies of
+    adjacent byte pairs hashed into `bigram_bins` buckets, and log2 of the
+    length, which carries the block-size signal the histograms normalize
+    away. Rows for a whole batch come from one pass of bincounts over the
+    concatenated bytes, with no FFT, wavelet or compression stage.
+    """
+
+    def __init__(self, bigram_bins=DEFAULT_BIGRAM_BINS):
+        bigram_bins = int(bigram_bins)
+        if bigram_bins < 1 or bigram_bins & (bigram_bins - 1) or bigram_bins > 1 << 16:
+            raise ValueError('bigram_bins must be a power of two no larger than 65536')
+        self.bigram_bins = bigram_bins
+        self._shift = np.uint32(32 - bigram_bins.bit_length() + 1)
+
+    @property
+    def columns(self):
+        return ([f'byte_{b:03d}' for b in range(256)] + [f'bigram_{h:05d}' for h in range(self.bigram_bins)]
+                + ['log2_length'])
+
+    def __len__(self):
+        return 256 + self.bigram_bins + 1
+
+    def __eq__(self, other):
+        return isinstance(other, ByteVectorLayout) and self.bigram_bins == other.bigram_bins
+
+    def vectors(self, raws):
+        """float32 rows for a list of uint8 arrays (see as_bytes), in one vectorized pass."""
+        lengths = np.array([len(raw) for raw in raws], dtype=np.int64)
+        n = len(raws)
+        data = np.concatenate(raws) if n else np.empty(0, dtype=np.uint8)
+        row = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        histogram = np.bincount(row * 256 + data, minlength=n * 256).reshape(n, 256)
+
+        # Adjacent pairs that do not straddle two inputs
+        same = row[:-1] == row[1:]
+        pairs = (data[:-1].astype(np.uint32) << np.uint32(8) | data[1:])[same]
+        if self.bigram_bins > 1:
+            hashed = (pairs * _HASH_MULTIPLIER) >> self._shift
+        else:
+            hashed = np.zeros(len(pairs), dtype=np.uint32)
+        bigrams = np.bincount(row[:-1][same] * self.bigram_bins + hashed,
+                              minlength=n * self.bigram_bins).reshape(n, self.bigram_bins)
+
+        out = np.empty((n, len(self)), dtype=np.float32)
+        out[:, :256] = histogram / lengths[:, None]
+        out[:, 256:-1] = bigrams / (lengths - 1)[:, None]
+        out[:, -1] = np.log2(lengths)
+        return out
+
+    def extract(self, text):
+        """Row for one ciphertext."""
+        return self.vectors([as_bytes(text)])[0]
+
+    def extract_batch(self, texts):
+        return self.vectors([as_bytes(text) for text in texts])
+
+    def to_dict(self):
+        return {'format': BYTE_LAYOUT_FORMAT, 'kind': 'byte_vector', 'bigram_bins': self.bigram_bins}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format') != BYTE_LAYOUT_FORMAT or data.get('kind') != 'byte_vector':
+            raise ValueError(f"Not a byte vector layout (format {data.get('format')!r}, kind {data.get('kind')!r})")
+        return cls(data['bigram_bins'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,365 @@
+import time
+import zlib
+from collections import namedtuple
+import numpy as np
+import pywt
+from scipy.fft import next_fast_len, rfft
+from scipy.special import entr
+from .bigrams import bigram_counts, markov_stats, pair_frequency_stats, perplexity, serial_index
+from .repeats import REPEAT_FEATURE_NAMES, ciphertext_bytes, repeat_features
+
+# Number of 0/1 changes inside each byte, read MSB first
+_INTRA_BYTE_TRANSITIONS = np.array(
+    [bin((b ^ (b >> 1)) & 0x7F).count('1') for b in range(256)], dtype=np.int64)
+
+
+# ASCII character classes, one column each: vowel, letter, uppercase, lowercase
+_ASCII_CLASSES = np.zeros((256, 4), dtype=np.int64)
+for _c in range(128):
+    _ch = chr(_c)
+    _ASCII_CLASSES[_c] = [_ch.lower() in 'aeiou', _ch.isalpha(), _ch.isupper(), _ch.islower()]
+
+
+def char_codes(text):
+    """Return the characters of `text` as an integer array, without a Python loop.
+
+    ASCII text comes back as uint8; anything else as uint32 code points.
+    """
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+def as_buffers(data):
+    """Return (codes, raw, text) for a str or a bytes-like/uint8 array input.
+
+    `raw` holds the bytes and `codes` the character code points, both as
+    NumPy arrays. For ASCII input both are the same zero-copy view and
+    `text` is None. Only non-ASCII UTF-8 input is decoded to a str, since
+    its character classes need Unicode rules. Bytes that are not valid
+    UTF-8, such as undecoded binary ciphertext, are taken as one character
+    per byte, again as the same view; bytes above ASCII are in no
+    character class.
+    """
+    if isinstance(data, str):
+        if data.isascii():
+            codes = np.frombuffer(data.encode('ascii'), dtype=np.uint8)
+            return codes, codes, None
+        return char_codes(data), np.frombuffer(data.encode('utf-8'), dtype=np.uint8), data
+    raw = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8).ravel()
+    if not len(raw) or raw.max() < 128:
+        return raw, raw, None
+    try:
+        text = raw.tobytes().decode('utf-8')
+    except UnicodeDecodeError:
+        return raw, raw, None
+    return char_codes(text), raw, text
+
+
+def character_classes(codes, text=None):
+    """Counts of (vowels, letters, uppercase, lowercase) characters.
+
+    ASCII input is counted with a 256-entry class table applied to its byte
+    histogram; other text falls back to str methods.
+    """
+    if text is None:
+        histogram = np.bincount(codes, minlength=256)
+        return tuple(int(count) for count in histogram @ _ASCII_CLASSES)
+    lowered = text.lower()
+    return (sum(lowered.count(v) for v in 'aeiou'),
+            sum(1 for c in lowered if c.isalpha()),
+            sum(1 for c in text if c.isupper()),
+            sum(1 for c in text if c.islower()))
+
+
+# Feature profiles: 'exact' is what the original models were trained on;
+# 'fast' trades bounded error in the compression and FFT features for
+# speed on large inputs. The profile is part of a model's FeatureSchema.
+PROFILES = ('exact', 'fast')
+
+# Fast profile: inputs longer than this have their compression ratio
+# estimated from FAST_COMPRESSION_BLOCKS evenly spaced blocks
+FAST_COMPRESSION_THRESHOLD = 1 << 20
+FAST_COMPRESSION_BLOCK = 1 << 15
+FAST_COMPRESSION_BLOCKS = 32
+# Fast profile: inputs longer than this are zero-padded to a fast FFT length
+FAST_FFT_THRESHOLD = 1 << 10
+
+
+def spectrum_statistics(samples, fft_length=None):
+    """(mean, std, peak, energy, entropy) of the FFT magnitudes of the real signal `samples`.
+
+    Only the half spectrum is computed (rfft); the statistics are taken
+    over all bins by weighting the bins that stand for a mirrored pair
+    twice, which gives the same values as a full complex FFT. Passing an
+    `fft_length` longer than the signal zero-pads it to that length.
+    Entropy is in nats, with the same arithmetic as scipy.stats.entropy
+    but without its per-call argument handling.
+    """
+    n_bins = fft_length or len(samples)
+    half = np.abs(rfft(samples.astype(np.float64), n_bins))
+    weights = np.full(len(half), 2.0)
+    weights[0] = 1.0
+    if n_bins % 2 == 0:
+        weights[-1] = 1.0
+    total = weights @ half
+    mean = total / n_bins
+    std = np.sqrt(weights @ np.square(half - mean) / n_bins)
+    energy = weights @ np.square(half)
+    return mean, std, np.max(half), energy, weights @ entr(half / total)
+
+
+def fast_spectrum_statistics(samples):
+    """spectrum_statistics over a zero-padded length that scipy transforms quickly.
+
+    Inputs up to FAST_FFT_THRESHOLD samples, or already of a fast length,
+    are exact. Otherwise the energy is rescaled and the peak is the DC bin
+    (every sample is non-negative), so both stay exact, while mean, std and
+    entropy are taken over a denser sampling of the same spectrum; their
+    relative errors are reported by `run_benchmarks.py run --suites profiles`.
+    """
+    n = len(samples)
+    fft_length = next_fast_len(n, real=True) if n > FAST_FFT_THRESHOLD else n
+    mean, std, peak, energy, spectral_entropy = spectrum_statistics(samples, fft_length)
+    # Zero padding multiplies the energy by fft_length / n (Parseval)
+    return mean, std, peak, energy * n / fft_length, spectral_entropy
+
+
+def compression_estimate(raw, threshold=FAST_COMPRESSION_THRESHOLD, block=FAST_COMPRESSION_BLOCK,
+                         blocks=FAST_COMPRESSION_BLOCKS):
+    """Compression ratio of `raw` and the half-width of its 95% confidence interval.
+
+    Inputs up to `threshold` bytes are compressed whole, so the ratio is
+    exact and the bound 0. Longer inputs compress `blocks` evenly spaced
+    blocks of `block` bytes instead, costing a fixed blocks * block bytes
+    of zlib work. The bound is the sampling error of the block ratios
+    (with a finite-population correction); it does not cover matches that
+    span blocks, which whole-input compression finds and the blocks miss.
+    """
+    n = len(raw)
+    if n <= threshold:
+        return len(zlib.compress(raw)) / n, 0.0
+    n_blocks = n // block
+    starts = np.linspace(0, n_blocks - 1, min(blocks, n_blocks)).astype(np.int64) * block
+    ratios = np.array([len(zlib.compress(raw[start:start + block])) / block for start in starts])
+    correction = np.sqrt(max(0.0, 1 - len(starts) / n_blocks))
+    bound = 1.96 * np.std(ratios, ddof=1) / np.sqrt(len(starts)) * correction if len(starts) > 1 else 0.0
+    return float(np.mean(ratios)), float(bound)
+
+
+def bit_transitions(data):
+    """Count bit flips across the MSB-first bit string of `data` (a uint8 array)."""
+    within = _INTRA_BYTE_TRANSITIONS[data].sum()
+    across = np.count_nonzero((data[:-1] & 1) != (data[1:] >> 7))
+    return int(within + across)
+
+
+class StageTimer:
+    """Accumulates wall time per named stage into `timings` (seconds).
+
+    Each lap() charges the time since the previous lap to the given stage.
+    """
+
+    def __init__(self, timings):
+        self.timings = timings
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+class _NoTimer:
+    def lap(self, stage):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0
+
+
+def _trailing_padding(raw):
+    # Number of '=' characters closing a base64 text (at most two)
+    count = 0
+    while count < min(2, len(raw)) and raw[len(raw) - 1 - count] == ord('='):
+        count += 1
+    return count
+
+
+def _run_lengths(ctx):
+    codes = ctx['codes']
+    boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    return np.diff(np.concatenate(([0], boundaries, [len(codes)])))
+
+
+# Shared intermediates, computed at most once per text and only when a
+# requested feature depends on them. `stage` names the timing bucket.
+Intermediate = namedtuple('Intermediate', ['stage', 'requires', 'compute'])
+
+INTERMEDIATES = {
+    'compression': Intermediate('compression_ratio', (), lambda ctx: len(zlib.compress(ctx['raw'])) / len(ctx['raw'])),
+    'bit_transitions': Intermediate('bit_transition_frequency', (), lambda ctx: bit_transitions(ctx['raw'])),
+    'runs': Intermediate('runs', (), _run_lengths),
+    'fft': Intermediate('fourier_transform', (), lambda ctx: spectrum_statistics(ctx['codes'])),
+    'dwt': Intermediate('wavelet_transform', (), lambda ctx: pywt.dwt(ctx['codes'].astype(np.float64), 'haar')[0]),
+    'bigrams': Intermediate('bigrams', (), lambda ctx: bigram_counts(ctx['codes'])),
+    'pair_stats': Intermediate('bigrams', ('bigrams',), lambda ctx: pair_frequency_stats(ctx['bigrams'])),
+    'markov': Intermediate('bigrams', ('bigrams',), lambda ctx: markov_stats(ctx['bigrams'])),
+    'character_classes': Intermediate('character_classes', (), lambda ctx: character_classes(ctx['codes'], ctx['decoded'])),
+    'ciphertext': Intermediate('ciphertext_bytes', (), lambda ctx: ciphertext_bytes(ctx['raw'])),
+    'repeats': Intermediate('repeats', ('ciphertext',), lambda ctx: repeat_features(ctx['codes'], ctx['ciphertext'])),
+}
+
+# Intermediates that a profile computes differently; everything else is shared
+PROFILE_INTERMEDIATES = {
+    'exact': {},
+    'fast': {
+        'compression': Intermediate('compression_ratio', (), lambda ctx: compression_estimate(ctx['raw'])[0]),
+        'fft': Intermediate('fourier_transform', (), lambda ctx: fast_spectrum_statistics(ctx['codes'])),
+    },
+}
+
+# Relative cost of a feature, by its most expensive dependency
+COST_TRIVIAL = 0    # the length, or a fixed-size table
+COST_LINEAR = 1     # one vectorized pass over the text
+COST_TRANSFORM = 2  # FFT, DWT, compression or the bigram matrix
+COST_SUFFIX = 3     # suffix array
+
+# Bump a feature's version whenever its definition changes, so models
+# trained on the old definition are refused rather than silently fed
+# different numbers (see schema.py).
+Feature = namedtuple('Feature', ['name', 'version', 'requires', 'cost', 'integer', 'compute'])
+
+_BASE_FEATURES = [
+    Feature('text_length', 1, (), COST_TRIVIAL, True, lambda ctx: len(ctx['codes'])),
+    Feature('compression_ratio', 1, ('compression',), COST_TRANSFORM, False, lambda ctx: ctx['compression']),
+    Feature('runs_index', 1, ('runs',), COST_LINEAR, True, lambda ctx: len(ctx['runs'])),
+    Feature('serial_index', 1, ('bigrams',), COST_TRANSFORM, True, lambda ctx: serial_index(ctx['bigrams'])),
+    Feature('bit_transition_frequency', 1, ('bit_transitions',), COST_LINEAR, True, lambda ctx: ctx['bit_transitions']),
+    Feature('fourier_transform_mean', 1, ('fft',), COST_TRANSFORM, False, lambda ctx: ctx['fft'][0]),
+    Feature('fourier_transform_std', 1, ('fft',), COST_TRANSFORM, False, lambda ctx: ctx['fft'][1]),
+    Feature('fourier_transform_peak', 1, ('fft',), COST_TRANSFORM, False, lambda ctx: ctx['fft'][2]),
+    Feature('fourier_transform_energy', 1, ('fft',), COST_TRANSFORM, False, lambda ctx: ctx['fft'][3]),
+    Feature('wavelet_transform_energy', 1, ('dwt',), COST_TRANSFORM, False, lambda ctx: np.sum(np.square(ctx['dwt']))),
+    Feature('perplexity', 1, ('bigrams',), COST_TRANSFORM, False, lambda ctx: perplexity(ctx['bigrams'])),
+    Feature('markov_chain_mean', 1, ('markov',), COST_TRANSFORM, False, lambda ctx: ctx['markov'][0]),
+    Feature('markov_chain_std', 1, ('markov',), COST_TRANSFORM, False, lambda ctx: ctx['markov'][1]),
+    Feature('character_pair_frequency_mean', 1, ('pair_stats',), COST_TRANSFORM, False, lambda ctx: ctx['pair_stats'][0]),
+    Feature('character_pair_frequency_std', 1, ('pair_stats',), COST_TRANSFORM, False, lambda ctx: ctx['pair_stats'][1]),
+    Feature('vowel_to_consonant_ratio', 1, ('character_classes',), COST_LINEAR, False,
+            lambda ctx: _ratio(ctx['character_classes'][0], ctx['character_classes'][1] - ctx['character_classes'][0])),
+    Feature('uppercase_to_lowercase_ratio', 1, ('character_classes',), COST_LINEAR, False,
+            lambda ctx: _ratio(ctx['character_classes'][2], ctx['character_classes'][3])),
+    Feature('longest_run_of_identical_bytes', 1, ('runs',), COST_LINEAR, True, lambda ctx: np.max(ctx['runs'])),
+    # Version 1 is scipy's natural-log entropy of the normalized magnitudes
+    Feature('entropy_of_fft_components', 1, ('fft',), COST_TRANSFORM, False, lambda ctx: ctx['fft'][4]),
+]
+
+# Block-alignment signals for the cascade's cheap tier; not in FEATURE_NAMES
+_CASCADE_FEATURES = [
+    # Version 2 decodes hex ciphertext as hex; version 1 read block-aligned hex as base64
+    Feature('decoded_length_mod_16', 2, ('ciphertext',), COST_LINEAR, True, lambda ctx: len(ctx['ciphertext']) % 16),
+    Feature('base64_padding', 1, (), COST_TRIVIAL, True, lambda ctx: _trailing_padding(ctx['raw'])),
+]
+
+# Version 2 of the block counts decodes hex ciphertext as hex, like decoded_length_mod_16
+_REPEAT_FEATURES = [
+    Feature(name, version, ('repeats',), COST_SUFFIX, True, lambda ctx, i=i: ctx['repeats'][i])
+    for i, (name, version) in enumerate(zip(REPEAT_FEATURE_NAMES, (1, 2, 2, 1)))
+]
+
+# Every feature this package can compute, by name
+FEATURES = {feature.name: feature for feature in _BASE_FEATURES + _REPEAT_FEATURES + _CASCADE_FEATURES}
+
+# Column order the scaler and model were trained on
+FEATURE_NAMES = [feature.name for feature in _BASE_FEATURES]
+
+# Extra dataset columns for training the cascade's cheap tier
+CASCADE_FEATURE_NAMES = [feature.name for feature in _CASCADE_FEATURES]
+
+# Features that are counts and are written to the dataset as integers
+INTEGER_FEATURES = {feature.name for feature in FEATURES.values() if feature.integer}
+
+
+def feature_names(with_repeats=False):
+    """Column names produced by extract_features for the given options."""
+    return FEATURE_NAMES + REPEAT_FEATURE_NAMES if with_repeats else list(FEATURE_NAMES)
+
+
+def full_feature_names(names):
+    """The features of `names` the full model is trained on: all but the cascade-only columns."""
+    return [name for name in names if name not in CASCADE_FEATURE_NAMES]
+
+
+def cheap_feature_names(names, max_cost=COST_LINEAR):
+    """The features of `names` costing at most `max_cost`, in the same order."""
+    return [name for name in names if FEATURES[name].cost <= max_cost]
+
+
+def _resolve(name, ctx, timer, overrides):
+    if name not in ctx:
+        intermediate = overrides.get(name) or INTERMEDIATES[name]
+        for dependency in intermediate.requires:
+            _resolve(dependency, ctx, timer, overrides)
+        ctx[name] = intermediate.compute(ctx)
+        timer.lap(intermediate.stage)
+
+
+def compute_features(text, names, timings=None, context=None, profile='exact'):
+    """Compute the features `names` for `text`, in that order.
+
+    `text` may be a str or its UTF-8 encoding as bytes, bytearray, memoryview
+    or a uint8 array; bytes-like input is used in place without copying.
+    Bytes that are not UTF-8 are one character per byte (see as_buffers).
+
+    The text is converted to an array once, and each shared intermediate
+    (FFT, Haar DWT, bigram matrix, ...) is computed a single time and only
+    if one of `names` needs it. Passing a dict as `timings` records the
+    seconds spent in each stage. Passing the same dict as `context` to
+    several calls on one text (with the same `profile`) shares the
+    intermediates between them. `profile` is one of PROFILES.
+    """
+    if profile not in PROFILE_INTERMEDIATES:
+        raise ValueError(f"Unknown feature profile {profile!r}")
+    overrides = PROFILE_INTERMEDIATES[profile]
+    timer = StageTimer(timings) if timings is not None else _NO_TIMER
+    ctx = context if context is not None else {}
+    if 'codes' not in ctx:
+        codes, raw, decoded = as_buffers(text)
+        if len(codes) < 2:
+            raise ValueError('At least two characters are needed to extract features')
+        ctx.update(codes=codes, raw=raw, decoded=decoded)
+        timer.lap('char_codes')
+
+    values = np.empty(len(names), dtype=np.float64)
+    for i, name in enumerate(names):
+        feature = FEATURES[name]
+        for dependency in feature.requires:
+            _resolve(dependency, ctx, timer, overrides)
+        values[i] = feature.compute(ctx)
+    return values
+
+
+def extract_features(text, with_repeats=False, timings=None):
+    """Compute every model feature for `text` in FEATURE_NAMES order.
+
+    With `with_repeats`, the suffix-array repeat features
+    (REPEAT_FEATURE_NAMES) are appended. See compute_features.
+    """
+    return compute_features(text, feature_names(with_repeats), timings)
+
+
+def compute_features_dict(text, names, profile='exact'):
+    """Same as compute_features, keyed by feature name, with counts as ints."""
+    values = compute_features(text, names, profile=profile).tolist()
+    return {name: int(value) if name in INTEGER_FEATURES else value
+            for name, value in zip(names, values)}
+
+
+def extract_features_dict(text, with_repeats=False):
+    """Same as extract_features, keyed by feature name."""
+    return compute_features_dict(text, feature_names(with_repeats))
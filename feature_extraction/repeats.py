@@ -0,0 +1,160 @@
+import base64
+import binascii
+import numpy as np
+
+REPEAT_FEATURE_NAMES = [
+    'longest_repeated_sequence',
+    'repeated_block_count_8',
+    'repeated_block_count_16',
+    'distinct_substring_count',
+]
+
+
+# Primes below 2^31, so a product of two residues fits in int64
+_HASH_MODULI = (2147483629, 2147483587)
+_HASH_BASE = 1000003
+
+# Bytes that are hex digits, either case
+_HEX_DIGITS = np.zeros(256, dtype=bool)
+_HEX_DIGITS[np.frombuffer(b'0123456789abcdefABCDEF', dtype=np.uint8)] = True
+
+
+def _powers(base, count, modulus):
+    # base ** arange(count) % modulus, doubling the computed prefix each pass
+    powers = np.ones(1, dtype=np.int64)
+    while len(powers) < count:
+        powers = np.concatenate((powers, powers * pow(base, len(powers), modulus) % modulus))
+    return powers[:count]
+
+
+def _prefix_doubling(codes):
+    # (sa, k): suffixes sorted by their first k codes, k the first power of two at which all differ
+    n = len(codes)
+    _, rank = np.unique(codes, return_inverse=True)
+    rank = rank.astype(np.int64).ravel()
+    sa = np.argsort(rank, kind='stable')
+    k = 1
+    while k < n and rank[sa[-1]] < n - 1:
+        # One sort key per suffix: (rank, rank of the suffix k on, -1 past the end).
+        # In the previous order the keys are already sorted by rank, so the
+        # stable (merge) sort only has to order runs of equal rank.
+        key = rank * (n + 1)
+        key[:n - k] += rank[k:] + 1
+        sorted_key = key[sa]
+        within = np.argsort(sorted_key, kind='stable')
+        sa = sa[within]
+        sorted_key = sorted_key[within]
+        rank[sa] = np.concatenate(([0], np.cumsum(sorted_key[1:] != sorted_key[:-1])))
+        k *= 2
+    return sa, k
+
+
+def suffix_array(codes):
+    """Suffix array and LCP array of `codes` by vectorized prefix doubling.
+
+    Returns (sa, lcp) where lcp[i] is the longest common prefix of the
+    suffixes at sa[i] and sa[i + 1]. Each doubling round sorts the suffixes
+    by (rank, rank k places on) and keeps only the current ranks, so the
+    construction takes O(n log^2 n) time (up to log n sorts) in O(n)
+    memory. The LCPs of all adjacent pairs are then found together by
+    descending from the longest power of two, comparing substrings through
+    polynomial prefix hashes under two ~2^31 moduli: O(n log n) more time,
+    still O(n) memory. A hash collision could only overstate an LCP, with
+    probability around 2^-62 per comparison.
+    """
+    n = len(codes)
+    sa, k = _prefix_doubling(codes)
+
+    values = np.asarray(codes, dtype=np.int64)
+    hashes = []
+    for modulus in _HASH_MODULI:
+        # prefix[i] = sum(codes[j] * base**j for j < i); the cumsum of residues fits in int64
+        prefix = np.concatenate(([0], np.cumsum(values * _powers(_HASH_BASE, n, modulus) % modulus) % modulus))
+        hashes.append((modulus, prefix, _powers(pow(_HASH_BASE, modulus - 2, modulus), n, modulus)))
+    del values
+
+    # Ranks are distinct at length k, so every LCP is below k
+    left, right = sa[:-1], sa[1:]
+    lcp = np.zeros(max(n - 1, 0), dtype=np.int64)
+    step = k
+    while step > 1:
+        step //= 2
+        # Both hashes of codes[i:i + step], shifted to offset 0, packed into one int64
+        window = np.zeros(n - step + 1, dtype=np.int64)
+        for modulus, prefix, inverse_powers in hashes:
+            window *= modulus
+            window += (prefix[step:] - prefix[:-step]) % modulus * inverse_powers[:n - step + 1] % modulus
+        a, b = left + lcp, right + lcp
+        candidates = np.flatnonzero(np.maximum(a, b) <= n - step)
+        candidates = candidates[window[a[candidates]] == window[b[candidates]]]
+        lcp[candidates] += step
+    return sa, lcp
+
+
+def longest_repeated_sequence(sa, lcp):
+    """Length of the longest substring that occurs again without overlapping itself.
+
+    A length L is achievable when some run of adjacent suffixes with LCP >= L
+    contains two starts at least L apart; that property is monotone in L, so
+    the answer is found by binary search over lcp.max().
+    """
+    def achievable(length):
+        breaks = np.flatnonzero(lcp < length) + 1
+        starts = np.concatenate(([0], breaks))
+        lowest = np.minimum.reduceat(sa, starts)
+        highest = np.maximum.reduceat(sa, starts)
+        return np.any(highest - lowest >= length)
+
+    low, high = 0, int(lcp.max(initial=0))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if achievable(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def distinct_substring_count(sa, lcp):
+    n = len(sa)
+    return n * (n + 1) // 2 - int(lcp.sum())
+
+
+def ciphertext_bytes(raw):
+    """Decode hex or base64 ciphertext (a uint8 array) to its bytes; anything else is returned unchanged.
+
+    Hex is tried first: every hex digit is also a base64 character, and
+    block-aligned hex has a length divisible by 4, so base64 would accept
+    it and decode the wrong bytes. Real base64 of more than a few bytes
+    is all hex digits with negligible probability.
+    """
+    if len(raw) % 2 == 0 and _HEX_DIGITS[raw].all():
+        return np.frombuffer(binascii.unhexlify(raw), dtype=np.uint8)
+    try:
+        return np.frombuffer(base64.b64decode(raw, validate=True), dtype=np.uint8)
+    except (binascii.Error, ValueError):
+        return raw
+
+
+def repeated_block_count(data, block_size):
+    """Number of aligned blocks that repeat an earlier block, as ECB mode produces."""
+    n_blocks = len(data) // block_size
+    if n_blocks < 2:
+        return 0
+    blocks = data[:n_blocks * block_size].reshape(n_blocks, block_size)
+    return n_blocks - len(np.unique(blocks, axis=0))
+
+
+def repeat_features(codes, data):
+    """Repeat-structure features in REPEAT_FEATURE_NAMES order.
+
+    `codes` are the characters of the text and `data` its decoded bytes
+    (see ciphertext_bytes), which the block counts are taken over.
+    """
+    sa, lcp = suffix_array(codes)
+    return [
+        longest_repeated_sequence(sa, lcp),
+        repeated_block_count(data, 8),
+        repeated_block_count(data, 16),
+        distinct_substring_count(sa, lcp),
+    ]
@@ -0,0 +1,153 @@
+import json
+import os
+from .features import FEATURES, PROFILES, compute_features, feature_names
+
+# Saved next to best_model.h5 / scaler.joblib / model.npz
+SCHEMA_FILENAME = 'feature_schema.json'
+SCHEMA_FORMAT = 1
+
+# The label of each model output, in order, saved beside the schema
+CLASSES_FILENAME = 'classes.json'
+
+# Output order of models trained before their classes were saved
+LEGACY_CLASSES = ['AES', 'Blowfish', 'DES']
+
+
+class SchemaMismatchError(ValueError):
+    """The feature schema of a model or dataset does not match this code."""
+
+
+class FeatureSchema:
+    """Ordered, versioned list of the features a model was trained on.
+
+    A schema is written when a dataset is generated and again beside the
+    trained model. At serving time it decides which features are computed
+    and in what order, and check() refuses a model whose features are
+    unknown here or were trained under a different feature version. The
+    feature `profile` (see features.PROFILES) is recorded too, so a model
+    trained on fast-profile features is served with them.
+    """
+
+    def __init__(self, features, profile='exact'):
+        self.features = [(name, int(version)) for name, version in features]
+        self.profile = profile
+
+    @classmethod
+    def current(cls, names, profile='exact'):
+        """Schema of `names` at the versions implemented in this package."""
+        unknown = [name for name in names if name not in FEATURES]
+        if unknown:
+            raise SchemaMismatchError(f"Unknown features: {', '.join(unknown)}")
+        return cls([(name, FEATURES[name].version) for name in names], profile)
+
+    @classmethod
+    def default(cls, with_repeats=False):
+        return cls.current(feature_names(with_repeats))
+
+    @property
+    def names(self):
+        return [name for name, _ in self.features]
+
+    def __len__(self):
+        return len(self.features)
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureSchema) and self.features == other.features and self.profile == other.profile
+
+    def check(self):
+        """Raise SchemaMismatchError unless every feature is computed here at its version."""
+        problems = []
+        if self.profile not in PROFILES:
+            problems.append(f"profile {self.profile!r} is unknown")
+        for name, version in self.features:
+            if name not in FEATURES:
+                problems.append(f"{name} is unknown")
+            elif FEATURES[name].version != version:
+                problems.append(f"{name} is version {version}, this code computes version {FEATURES[name].version}")
+        if problems:
+            raise SchemaMismatchError('Feature schema mismatch: ' + '; '.join(problems))
+        return self
+
+    def extract(self, text, timings=None, context=None):
+        """Feature row for `text` in schema order; only the needed intermediates are computed."""
+        return compute_features(text, self.names, timings, context, self.profile)
+
+    def positions(self, names):
+        """Indices of this schema's features within a row laid out as `names`."""
+        index = {name: i for i, name in enumerate(names)}
+        missing = [name for name in self.names if name not in index]
+        if missing:
+            raise SchemaMismatchError(f"Row does not contain: {', '.join(missing)}")
+        return [index[name] for name in self.names]
+
+    def to_dict(self):
+        return {
+            'format': SCHEMA_FORMAT,
+            'profile': self.profile,
+            'features': [{'name': name, 'version': version} for name, version in self.features],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format') != SCHEMA_FORMAT:
+            raise SchemaMismatchError(f"Unsupported feature schema format {data.get('format')!r}")
+        # Schemas written before profiles existed were all exact
+        return cls(((feature['name'], feature['version']) for feature in data['features']), data.get('profile', 'exact'))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def dataset_schema_path(path):
+    """Where the schema of a generated dataset file is written, e.g. dataset.schema.json."""
+    return os.path.splitext(path.rstrip('/\\'))[0] + '.schema.json'
+
+
+def model_schema(model_dir, n_features):
+    """Load and check the schema saved in `model_dir` for a model taking `n_features` inputs.
+
+    Models trained before schemas were saved are matched by their input
+    width to the default 19- or 23-column layout.
+    """
+    path = os.path.join(model_dir, SCHEMA_FILENAME)
+    if os.path.exists(path):
+        schema = FeatureSchema.load(path).check()
+    else:
+        layouts = {len(feature_names(with_repeats)): with_repeats for with_repeats in (False, True)}
+        if n_features not in layouts:
+            raise SchemaMismatchError(f"No {SCHEMA_FILENAME} in {model_dir} and no default layout has {n_features} features")
+        schema = FeatureSchema.default(layouts[n_features])
+    if len(schema) != n_features:
+        raise SchemaMismatchError(f"Model takes {n_features} features but its schema lists {len(schema)}")
+    return schema
+
+
+def save_classes(classes, path):
+    with open(path, 'w') as f:
+        json.dump({'format': SCHEMA_FORMAT, 'classes': [str(name) for name in classes]}, f, indent=2)
+
+
+def model_classes(model_dir, n_classes, filename=CLASSES_FILENAME):
+    """Class labels of the model in `model_dir` with `n_classes` outputs, in output order.
+
+    Models trained before the labels were saved are assumed to have the
+    original three algorithms; any other output width is refused.
+    """
+    path = os.path.join(model_dir, filename)
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format') != SCHEMA_FORMAT:
+            raise SchemaMismatchError(f"Unsupported {filename} format {data.get('format')!r}")
+        classes, source = data['classes'], path
+    else:
+        classes, source = LEGACY_CLASSES, f"the default classes (no {filename} in {model_dir})"
+    if len(classes) != n_classes:
+        raise SchemaMismatchError(f"Model has {n_classes} outputs but {source} has {len(classes)} classes")
+    return list(classes)
@@ -0,0 +1,109 @@
+import json
+import os
+import numpy as np
+
+MANIFEST = 'manifest.json'
+STORE_FORMAT = 1
+
+
+def is_feature_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+class FeatureStoreWriter:
+    """Writes a dataset as float32 .npy feature shards with int8 label codes.
+
+    Each write() adds one shard, `shard-NNNNN.features.npy` (rows x
+    columns, float32) and `shard-NNNNN.labels.npy` (int8 codes into the
+    manifest's class list), then rewrites manifest.json, so the store is
+    readable after every shard. Codes are assigned in first-seen order;
+    FeatureStore readers map them to whatever class order they need.
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = None
+        self.classes = []
+        self.shards = []
+
+    def write(self, columns, features, labels):
+        if self.columns is None:
+            self.columns = list(columns)
+        elif list(columns) != self.columns:
+            raise ValueError('Every shard must have the same feature columns')
+        names, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        for name in names.tolist():
+            if name not in self.classes:
+                self.classes.append(name)
+        codes = np.array([self.classes.index(name) for name in names.tolist()], dtype=np.int8)[inverse]
+
+        name = f'shard-{len(self.shards):05d}'
+        np.save(os.path.join(self.path, name + '.features.npy'), np.asarray(features, dtype=np.float32))
+        np.save(os.path.join(self.path, name + '.labels.npy'), codes)
+        self.shards.append({'name': name, 'rows': len(codes)})
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {
+            'format': STORE_FORMAT,
+            'columns': self.columns,
+            'classes': self.classes,
+            'rows': sum(shard['rows'] for shard in self.shards),
+            'shards': self.shards,
+        }
+        path = os.path.join(self.path, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        pass
+
+
+class FeatureStore:
+    """Read side of a FeatureStoreWriter directory.
+
+    Feature shards are memory-mapped, so opening a store costs only the
+    label codes (one byte per row). Rows are addressed by their global
+    index across shards.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported feature store format {manifest.get('format')!r}")
+        self.path = path
+        self.columns = manifest['columns']
+        self.classes = manifest['classes']
+        self.features = [np.load(os.path.join(path, shard['name'] + '.features.npy'), mmap_mode='r')
+                         for shard in manifest['shards']]
+        self.labels = np.concatenate([np.load(os.path.join(path, shard['name'] + '.labels.npy'))
+                                      for shard in manifest['shards']])
+        self.offsets = np.cumsum([0] + [len(features) for features in self.features])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def rows(self, indices, columns=None):
+        """Feature rows at the ascending global `indices`, optionally only the column positions `columns`."""
+        shard_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        bounds = np.searchsorted(shard_ids, np.arange(len(self.features) + 1))
+        parts = []
+        for shard, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            if hi > lo:
+                part = self.features[shard][indices[lo:hi] - self.offsets[shard]]
+                parts.append(part if columns is None else part[:, columns])
+        if not parts:
+            return np.empty((0, len(self.columns) if columns is None else len(columns)), dtype=np.float32)
+        return np.concatenate(parts)
+
+    def iter_chunks(self, chunk_rows):
+        """Yield (features, label names) in row order, as views into the mapped shards."""
+        classes = np.asarray(self.classes, dtype=object)
+        for shard, features in enumerate(self.features):
+            for start in range(0, len(features), chunk_rows):
+                stop = min(start + chunk_rows, len(features))
+                codes = self.labels[self.offsets[shard] + start:self.offsets[shard] + stop]
+                yield features[start:stop], classes[codes]
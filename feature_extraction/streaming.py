@@ -0,0 +1,302 @@
+import base64
+import codecs
+import zlib
+import numpy as np
+
+from .bigrams import BYTE_ALPHABET, markov_stats, pair_frequency_stats, perplexity, serial_index
+from .features import (PROFILES, char_codes, bit_transitions, character_classes,
+                       fast_spectrum_statistics, spectrum_statistics)
+from .repeats import ciphertext_bytes, repeat_features
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Longest input whose FFT statistics are computed exactly (samples kept in memory)
+DEFAULT_MAX_FFT_LENGTH = 1 << 24
+
+# Leading window the repeat features are computed over. The suffix array costs
+# O(n log^2 n) and several arrays of n int64, far more than the FFT, so this is
+# much lower. A multiple of 4 keeps a base64 or hex prefix decodable.
+DEFAULT_MAX_REPEAT_LENGTH = 1 << 20
+
+
+class StreamingFeatures:
+    """Incremental version of extract_features for inputs too large to hold as one str.
+
+    Feed UTF-8 encoded chunks with update() and call finalize() for the
+    feature vector in FEATURE_NAMES order. Input that turns out not to be
+    UTF-8 is taken as one character per byte, as compute_features does;
+    that is only exact while everything before it was ASCII, so a stream
+    of UTF-8 text followed by binary data is refused. Running state is kept for the
+    bigram matrix, runs, bit transitions, character classes, the Haar
+    approximation energy and a zlib compressor, so memory does not grow with
+    the input. The FFT mean/std/peak/entropy need the whole signal; they are
+    exact up to `max_fft_length` characters and are computed over the first
+    `max_fft_length` characters beyond that (see `spectral_truncated`). The
+    FFT energy is always exact, via Parseval's theorem. The optional repeat
+    features need a suffix array and are computed over the first
+    `max_repeat_length` characters and raw bytes only (see
+    `repeats_truncated`).
+
+    With profile='fast' the FFT is zero-padded to a fast length, as in
+    compute_features. The compression ratio stays exact: the stream is
+    compressed incrementally anyway, so block sampling would save nothing.
+    """
+
+    def __init__(self, max_fft_length=DEFAULT_MAX_FFT_LENGTH, profile='exact',
+                 max_repeat_length=DEFAULT_MAX_REPEAT_LENGTH):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown feature profile {profile!r}")
+        self.max_fft_length = max_fft_length
+        self.max_repeat_length = max_repeat_length
+        self.profile = profile
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._binary = False
+        self._non_ascii = False
+        self._compressor = zlib.compressobj()
+        self._compressed_size = 0
+        self._raw_size = 0
+        self._last_byte = None
+        self._bit_flips = 0
+
+        self.length = 0
+        self._last_code = None
+        self._runs = 0
+        self._current_run = 0
+        self._longest_run = 0
+
+        self._counts = np.zeros((BYTE_ALPHABET, BYTE_ALPHABET), dtype=np.int64)
+        self._wide_pairs = None
+
+        self._square_sum = 0.0
+        self._haar_energy = 0.0
+        self._haar_pending = None
+        self._spectrum_samples = []
+        self._spectrum_length = 0
+        self._raw_samples = []
+        self._raw_sample_length = 0
+
+        self._vowels = 0
+        self._letters = 0
+        self._uppercase = 0
+        self._lowercase = 0
+
+    @property
+    def spectral_truncated(self):
+        return self.length > self.max_fft_length
+
+    @property
+    def repeats_truncated(self):
+        return self.length > self.max_repeat_length
+
+    def update(self, chunk):
+        """Consume the next chunk of input (bytes-like)."""
+        raw = np.frombuffer(chunk, dtype=np.uint8)
+        if not len(raw):
+            return
+        self._update_bytes(raw)
+        if self._binary:
+            self._update_codes(raw, None)
+            return
+        try:
+            text = self._decoder.decode(raw.tobytes() if isinstance(chunk, memoryview) else chunk)
+        except UnicodeDecodeError:
+            self._switch_to_bytes(raw)
+            return
+        if text:
+            self._update_text(text)
+
+    def _switch_to_bytes(self, raw):
+        if self._non_ascii:
+            raise ValueError('Input mixes UTF-8 text with bytes that are not UTF-8')
+        # Bytes the decoder held back as the start of a character come first
+        pending = np.frombuffer(self._decoder.getstate()[0], dtype=np.uint8)
+        self._binary = True
+        self._update_codes(np.concatenate((pending, raw)), None)
+
+    def _update_bytes(self, raw):
+        self._compressed_size += len(self._compressor.compress(raw))
+        self._raw_size += len(raw)
+        self._bit_flips += bit_transitions(raw)
+        if self._last_byte is not None:
+            self._bit_flips += int((self._last_byte & 1) != (raw[0] >> 7))
+        self._last_byte = int(raw[-1])
+
+        room = self.max_repeat_length - self._raw_sample_length
+        if room > 0:
+            kept = raw[:room].copy()
+            self._raw_samples.append(kept)
+            self._raw_sample_length += len(kept)
+
+    def _update_text(self, text):
+        codes = char_codes(text)
+        self._update_codes(codes, None if codes.dtype == np.uint8 else text)
+
+    def _update_codes(self, codes, text):
+        # `text` is the decoded str for non-ASCII text, whose character classes need Unicode rules
+        self._non_ascii = self._non_ascii or text is not None
+        carried = self._last_code is not None
+        if carried:
+            # Prepend the previous chunk's last character so pairs and runs span the boundary
+            joined = np.concatenate((np.array([self._last_code], dtype=np.int64), codes))
+        else:
+            joined = codes
+
+        self._update_runs(joined, carried)
+        self._update_pairs(joined)
+        self._update_spectrum(codes)
+
+        vowels, letters, uppercase, lowercase = character_classes(codes, text)
+        self._vowels += vowels
+        self._letters += letters
+        self._uppercase += uppercase
+        self._lowercase += lowercase
+
+        self.length += len(codes)
+        self._last_code = int(codes[-1])
+
+    def _update_runs(self, joined, carried):
+        boundaries = np.flatnonzero(joined[1:] != joined[:-1]) + 1
+        lengths = np.diff(np.concatenate(([0], boundaries, [len(joined)])))
+        if carried:
+            # The first segment continues the run left open by the last chunk
+            lengths[0] += self._current_run - 1
+            self._runs += len(lengths) - 1
+        else:
+            self._runs += len(lengths)
+        self._longest_run = max(self._longest_run, int(lengths[:-1].max(initial=0)))
+        self._current_run = int(lengths[-1])
+
+    def _update_pairs(self, joined):
+        if len(joined) < 2:
+            return
+        if self._wide_pairs is None and joined.max() < BYTE_ALPHABET:
+            pair_idx = joined[:-1].astype(np.int64) * BYTE_ALPHABET + joined[1:]
+            self._counts += np.bincount(pair_idx, minlength=BYTE_ALPHABET * BYTE_ALPHABET).reshape(BYTE_ALPHABET, BYTE_ALPHABET)
+            return
+        if self._wide_pairs is None:
+            # Code points beyond one byte: switch to a sparse pair count
+            first, second = np.nonzero(self._counts)
+            self._wide_pairs = dict(zip(zip(first.tolist(), second.tolist()), self._counts[first, second].tolist()))
+        keys, counts = np.unique(np.stack((joined[:-1], joined[1:]), axis=1).astype(np.int64), axis=0, return_counts=True)
+        for (a, b), count in zip(keys.tolist(), counts.tolist()):
+            self._wide_pairs[(a, b)] = self._wide_pairs.get((a, b), 0) + count
+
+    def _update_spectrum(self, codes):
+        values = codes.astype(np.float64)
+        self._square_sum += float(np.dot(values, values))
+
+        if self._haar_pending is not None:
+            values = np.concatenate(([self._haar_pending], values))
+        usable = len(values) - len(values) % 2
+        pair_sums = values[:usable:2] + values[1:usable:2]
+        self._haar_energy += float(np.dot(pair_sums, pair_sums)) / 2
+        self._haar_pending = values[-1] if usable < len(values) else None
+
+        room = self.max_fft_length - self._spectrum_length
+        if room > 0:
+            kept = codes[:room]
+            self._spectrum_samples.append(kept)
+            self._spectrum_length += len(kept)
+
+    def _pair_matrix(self):
+        if self._wide_pairs is None:
+            return self._counts
+        alphabet = sorted({code for pair in self._wide_pairs for code in pair})
+        index = {code: i for i, code in enumerate(alphabet)}
+        counts = np.zeros((len(alphabet), len(alphabet)), dtype=np.int64)
+        for (a, b), count in self._wide_pairs.items():
+            counts[index[a], index[b]] = count
+        return counts
+
+    def finalize(self, with_repeats=False):
+        """Return the feature vector for everything consumed so far."""
+        if not self._binary:
+            try:
+                tail = self._decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                # Ends part-way through a character
+                self._switch_to_bytes(np.zeros(0, dtype=np.uint8))
+            else:
+                if tail:
+                    self._update_text(tail)
+        if self.length < 2:
+            raise ValueError('At least two characters are needed to extract features')
+
+        compressed_size = self._compressed_size + len(self._compressor.copy().flush())
+        haar_energy = self._haar_energy
+        if self._haar_pending is not None:
+            # pywt's symmetric extension pairs the last odd sample with itself
+            haar_energy += 2 * self._haar_pending ** 2
+
+        samples = np.concatenate(self._spectrum_samples)
+        statistics = fast_spectrum_statistics if self.profile == 'fast' else spectrum_statistics
+        fft_mean, fft_std, fft_peak, _, fft_entropy = statistics(samples)
+
+        counts = self._pair_matrix()
+        pair_mean, pair_std, _ = pair_frequency_stats(counts)
+        markov_mean, markov_std, _ = markov_stats(counts)
+        consonants = self._letters - self._vowels
+
+        values = [
+            self.length,
+            compressed_size / self._raw_size,
+            self._runs,
+            serial_index(counts),
+            self._bit_flips,
+            fft_mean,
+            fft_std,
+            fft_peak,
+            self.length * self._square_sum,
+            haar_energy,
+            perplexity(counts),
+            markov_mean,
+            markov_std,
+            pair_mean,
+            pair_std,
+            self._vowels / consonants if consonants else 0,
+            self._uppercase / self._lowercase if self._lowercase else 0,
+            max(self._longest_run, self._current_run),
+            fft_entropy,
+        ]
+        if with_repeats:
+            values += repeat_features(samples[:self.max_repeat_length], ciphertext_bytes(np.concatenate(self._raw_samples)))
+        return np.array(values, dtype=np.float64)
+
+
+def base64_chunks(chunks):
+    """Base64 text of a sequence of byte chunks, encoded as they arrive.
+
+    The result is the same as encoding their concatenation at once; this is
+    how undecoded binary ciphertext is put into the form models are trained on.
+    """
+    carry = b''
+    for chunk in chunks:
+        data = carry + bytes(chunk)
+        usable = len(data) - len(data) % 3
+        carry = data[usable:]
+        if usable:
+            yield base64.b64encode(data[:usable])
+    if carry:
+        yield base64.b64encode(carry)
+
+
+def extract_features_from_chunks(chunks, with_repeats=False, **kwargs):
+    """Extract features from an iterable of bytes-like chunks."""
+    accumulator = StreamingFeatures(**kwargs)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.finalize(with_repeats)
+
+
+def extract_features_from_stream(stream, chunk_size=DEFAULT_CHUNK_SIZE, with_repeats=False, **kwargs):
+    """Extract features from a binary file-like object (file, socket file, request body)."""
+    return extract_features_from_chunks(iter(lambda: stream.read(chunk_size), b''), with_repeats, **kwargs)
+
+
+def extract_features_from_buffer(buffer, chunk_size=DEFAULT_CHUNK_SIZE, with_repeats=False, **kwargs):
+    """Extract features from a bytes-like object such as an mmap, without copying it whole."""
+    view = memoryview(buffer)
+    accumulator = StreamingFeatures(**kwargs)
+    for start in range(0, len(view), chunk_size):
+        accumulator.update(view[start:start + chunk_size])
+    return accumulator.finalize(with_repeats)
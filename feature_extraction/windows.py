@@ -0,0 +1,261 @@
+import zlib
+import numpy as np
+
+from .bigrams import BYTE_ALPHABET
+from .features import _ASCII_CLASSES, _INTRA_BYTE_TRANSITIONS, PROFILES, as_buffers, compute_features, spectrum_statistics
+
+# Features kept up to date as the window slides; any other requested
+# feature is computed from scratch on each window's bytes.
+INCREMENTAL_FEATURES = {
+    'text_length',
+    'compression_ratio',
+    'runs_index',
+    'serial_index',
+    'bit_transition_frequency',
+    'fourier_transform_mean',
+    'fourier_transform_std',
+    'fourier_transform_peak',
+    'fourier_transform_energy',
+    'wavelet_transform_energy',
+    'perplexity',
+    'markov_chain_mean',
+    'markov_chain_std',
+    'character_pair_frequency_mean',
+    'character_pair_frequency_std',
+    'vowel_to_consonant_ratio',
+    'uppercase_to_lowercase_ratio',
+    'longest_run_of_identical_bytes',
+    'entropy_of_fft_components',
+}
+
+_FFT_FEATURES = {
+    'fourier_transform_mean',
+    'fourier_transform_std',
+    'fourier_transform_peak',
+    'fourier_transform_energy',
+    'entropy_of_fft_components',
+}
+
+
+def _square_log(counts):
+    # c^2 * log2(c), with 0 for c == 0
+    counts = counts.astype(np.float64)
+    return counts * counts * np.log2(np.maximum(counts, 1))
+
+
+class SlidingWindowFeatures:
+    """Feature rows for windows of `window` bytes every `stride` bytes of an ASCII stream.
+
+    Each slide adds the incoming bytes to, and removes the outgoing bytes
+    from, running state: the byte histogram (character classes), the
+    bigram matrix with the sums its statistics are derived from, bit
+    transitions, the number of run boundaries and the Haar pair energies.
+    A slide therefore costs O(stride) plus O(alphabet) instead of a full
+    recompute. The FFT statistics, compression ratio and longest run have
+    no removable state and are computed on each window's bytes, so
+    segmenting n bytes with stride proportional to the window costs about
+    O(n log window).
+
+    Feed bytes-like chunks with feed(), which returns the (start, row)
+    pairs of windows completed so far, and call finish() at the end.
+    Under a non-exact `profile` the compression and FFT features go through
+    compute_features with that profile.
+    """
+
+    def __init__(self, names, window, stride, profile='exact'):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown feature profile {profile!r}")
+        if window < 2:
+            raise ValueError('Window must be at least two bytes')
+        if not 1 <= stride <= window:
+            raise ValueError('Stride must be between 1 and the window size')
+        self.names = list(names)
+        self.window = window
+        self.stride = stride
+        self.profile = profile
+        incremental = INCREMENTAL_FEATURES
+        if profile != 'exact':
+            incremental = incremental - _FFT_FEATURES - {'compression_ratio'}
+        self._fallback = [name for name in self.names if name not in incremental]
+        self._needs_fft = any(name in _FFT_FEATURES for name in self.names) and profile == 'exact'
+        self._needs_compression = 'compression_ratio' in self.names and profile == 'exact'
+
+        # Bytes from global offset self._offset up to everything fed so far
+        self._buffer = np.empty(0, dtype=np.uint8)
+        self._offset = 0
+        # The current window is [self._start, self._end) while it fills up
+        self._start = 0
+        self._end = 0
+        self._last_emitted = None
+
+        self._histogram = np.zeros(BYTE_ALPHABET, dtype=np.int64)
+        self._bit_flips = 0
+        self._changes = 0
+        self._haar = np.zeros(2, dtype=np.int64)
+
+        self._counts = np.zeros(BYTE_ALPHABET * BYTE_ALPHABET, dtype=np.int64)
+        self._distinct_pairs = 0
+        self._pair_square_sum = 0
+        self._pair_square_log_sum = 0.0
+        self._row_totals = np.zeros(BYTE_ALPHABET, dtype=np.int64)
+        # Per row, sums of counts and squared counts over columns that are
+        # themselves pair sources, as markov_transitions restricts them
+        self._source_sums = np.zeros(BYTE_ALPHABET, dtype=np.int64)
+        self._source_square_sums = np.zeros(BYTE_ALPHABET, dtype=np.int64)
+
+    def _bytes(self, lo, hi):
+        return self._buffer[lo - self._offset:hi - self._offset]
+
+    def _update_pairs(self, first, second, sign):
+        keys, occurrences = np.unique(first.astype(np.int64) * BYTE_ALPHABET + second, return_counts=True)
+        delta = sign * occurrences
+        old = self._counts[keys]
+        new = old + delta
+        self._counts[keys] = new
+        self._distinct_pairs += int(np.count_nonzero(new) - np.count_nonzero(old))
+        square_delta = new * new - old * old
+        self._pair_square_sum += int(square_delta.sum())
+        self._pair_square_log_sum += float(_square_log(new).sum() - _square_log(old).sum())
+
+        rows, columns = np.divmod(keys, BYTE_ALPHABET)
+        was_source = self._row_totals > 0
+        into_source = was_source[columns]
+        np.add.at(self._source_sums, rows[into_source], delta[into_source])
+        np.add.at(self._source_square_sums, rows[into_source], square_delta[into_source])
+        np.add.at(self._row_totals, rows, delta)
+
+        # Symbols that became or stopped being sources add or drop a whole column
+        flipped = np.flatnonzero(was_source != (self._row_totals > 0))
+        if len(flipped):
+            signs = np.where(was_source[flipped], -1, 1)
+            columns = self._counts.reshape(BYTE_ALPHABET, BYTE_ALPHABET)[:, flipped]
+            self._source_sums += columns @ signs
+            self._source_square_sums += (columns * columns) @ signs
+
+    def _update(self, data, pairs, pair_start, sign):
+        # `data` enters or leaves the window together with the adjacent pairs
+        # in `pairs`, the first of which starts at global index `pair_start`
+        self._histogram += sign * np.bincount(data, minlength=BYTE_ALPHABET)
+        self._bit_flips += sign * int(_INTRA_BYTE_TRANSITIONS[data].sum())
+        if len(pairs) < 2:
+            return
+        first, second = pairs[:-1], pairs[1:]
+        self._changes += sign * int(np.count_nonzero(first != second))
+        self._bit_flips += sign * int(np.count_nonzero((first & 1) != (second >> 7)))
+        sums = first.astype(np.int64) + second
+        squares = sums * sums
+        self._haar[pair_start % 2] += sign * int(squares[0::2].sum())
+        self._haar[(pair_start + 1) % 2] += sign * int(squares[1::2].sum())
+        self._update_pairs(first, second, sign)
+
+    def _add(self, hi):
+        lo = self._end
+        pair_lo = lo - 1 if lo > self._start else lo
+        self._update(self._bytes(lo, hi), self._bytes(pair_lo, hi), pair_lo, 1)
+        self._end = hi
+
+    def _remove(self, hi):
+        lo = self._start
+        # Pairs that start in [lo, hi) and end inside the window
+        pair_hi = min(hi + 1, self._end)
+        self._update(self._bytes(lo, hi), self._bytes(lo, pair_hi), lo, -1)
+        self._start = hi
+
+    def _row(self):
+        data = self._bytes(self._start, self._end)
+        n = len(data)
+        pairs = n - 1
+        values = {'text_length': n, 'runs_index': self._changes + 1, 'bit_transition_frequency': self._bit_flips}
+
+        if self._needs_compression:
+            values['compression_ratio'] = len(zlib.compress(data)) / n
+        if 'longest_run_of_identical_bytes' in self.names:
+            boundaries = np.flatnonzero(data[1:] != data[:-1]) + 1
+            values['longest_run_of_identical_bytes'] = np.max(np.diff(np.concatenate(([0], boundaries, [n]))))
+        if self._needs_fft:
+            (values['fourier_transform_mean'], values['fourier_transform_std'], values['fourier_transform_peak'],
+             values['fourier_transform_energy'], values['entropy_of_fft_components']) = spectrum_statistics(data)
+
+        # pywt's symmetric extension pairs an odd last sample with itself
+        haar = self._haar[self._start % 2] / 2
+        if n % 2:
+            haar += 2 * float(data[-1]) ** 2
+        values['wavelet_transform_energy'] = haar
+
+        distinct = self._distinct_pairs
+        pair_mean = pairs / distinct
+        values['serial_index'] = distinct
+        values['character_pair_frequency_mean'] = pair_mean
+        values['character_pair_frequency_std'] = np.sqrt(max(self._pair_square_sum / distinct - pair_mean ** 2, 0.0))
+        values['perplexity'] = np.exp(-(self._pair_square_log_sum - np.log2(pairs) * self._pair_square_sum) / pairs ** 2)
+
+        sources = self._row_totals > 0
+        totals = self._row_totals[sources].astype(np.float64)
+        cells = np.count_nonzero(sources) ** 2
+        markov_mean = np.sum(self._source_sums[sources] / totals) / cells
+        markov_square_mean = np.sum(self._source_square_sums[sources] / totals ** 2) / cells
+        values['markov_chain_mean'] = markov_mean
+        values['markov_chain_std'] = np.sqrt(max(markov_square_mean - markov_mean ** 2, 0.0))
+
+        vowels, letters, uppercase, lowercase = (int(count) for count in self._histogram @ _ASCII_CLASSES)
+        consonants = letters - vowels
+        values['vowel_to_consonant_ratio'] = vowels / consonants if consonants else 0
+        values['uppercase_to_lowercase_ratio'] = uppercase / lowercase if lowercase else 0
+
+        if self._fallback:
+            values.update(zip(self._fallback, compute_features(data, self._fallback, profile=self.profile)))
+        return np.array([values[name] for name in self.names], dtype=np.float64)
+
+    def feed(self, chunk):
+        """Consume ASCII bytes; return (start, row) for each window completed by them."""
+        data = np.frombuffer(chunk, dtype=np.uint8) if not isinstance(chunk, np.ndarray) else chunk
+        if len(data) and data.max() >= 128:
+            raise ValueError('Windowed features need ASCII input such as base64 or hex ciphertext')
+        self._buffer = np.concatenate((self._buffer, data)) if len(self._buffer) else data
+        available = self._offset + len(self._buffer)
+
+        windows = []
+        while True:
+            target = self._start + self.window
+            if self._end < target:
+                if available > self._end:
+                    self._add(min(target, available))
+                if self._end < target:
+                    break
+            windows.append((self._start, self._row()))
+            self._last_emitted = self._start
+            self._remove(self._start + self.stride)
+
+        # Keep the current window's bytes and the last full window for finish()
+        keep_from = max(self._offset, min(self._start, available - self.window))
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+        return windows
+
+    def finish(self):
+        """Window aligned to the end of the input, if the last stride left bytes uncovered.
+
+        Inputs shorter than one window give a single window over all of them.
+        """
+        available = self._offset + len(self._buffer)
+        if self._last_emitted is not None and self._last_emitted + self.window >= available:
+            return []
+        start = max(0, available - self.window)
+        return [(start, compute_features(self._bytes(start, available), self.names, profile=self.profile))]
+
+
+def window_features(text, names, window, stride, profile='exact'):
+    """Start offsets and feature rows (in `names` order) of the sliding windows over `text`.
+
+    The windows cover the whole input: the last one is aligned to the end
+    when the stride does not land there.
+    """
+    codes, _, decoded = as_buffers(text)
+    if decoded is not None:
+        raise ValueError('Windowed features need ASCII input such as base64 or hex ciphertext')
+    if len(codes) < 2:
+        raise ValueError('At least two characters are needed to extract features')
+    windows = SlidingWindowFeatures(names, window, stride, profile)
+    results = windows.feed(codes) + windows.finish()
+    starts = np.array([start for start, _ in results], dtype=np.int64)
+    return starts, np.vstack([row for _, row in results])
@@ -0,0 +1,63 @@
+import argparse
+import numpy as np
+
+
+def fold_network(model, scaler):
+    """Reduce a trained Sequential model and its StandardScaler to plain dense layers.
+
+    The scaler is folded into the first Dense layer and each BatchNormalization
+    (an affine map at inference time) into the Dense layer that follows it.
+    Dropout is a no-op at inference and is dropped. Returns a list of
+    (kernel, bias, activation) tuples.
+    """
+    # Pending affine map x -> x * scale + shift applied before the next Dense
+    scale = 1.0 / scaler.scale_
+    shift = -scaler.mean_ / scaler.scale_
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == 'Dense':
+            kernel = np.asarray(layer.kernel, dtype=np.float64)
+            bias = np.asarray(layer.bias, dtype=np.float64) if layer.use_bias else np.zeros(kernel.shape[1])
+            layers.append((scale[:, None] * kernel, shift @ kernel + bias, layer.activation.__name__))
+            scale = np.ones(kernel.shape[1])
+            shift = np.zeros(kernel.shape[1])
+        elif kind == 'BatchNormalization':
+            gamma = np.asarray(layer.gamma, dtype=np.float64) if layer.scale else 1.0
+            beta = np.asarray(layer.beta, dtype=np.float64) if layer.center else 0.0
+            mean = np.asarray(layer.moving_mean, dtype=np.float64)
+            variance = np.asarray(layer.moving_variance, dtype=np.float64)
+            bn_scale = gamma / np.sqrt(variance + layer.epsilon)
+            scale = scale * bn_scale
+            shift = shift * bn_scale + beta - mean * bn_scale
+        elif kind in ('Dropout', 'InputLayer'):
+            continue
+        else:
+            raise ValueError(f"Cannot export layer of type {kind}")
+    if not layers or np.any(scale != 1.0) or np.any(shift != 0.0):
+        raise ValueError('Model must end with a Dense layer')
+    return layers
+
+
+def export_npz(model, scaler, path):
+    """Write the folded network to a compact float32 .npz file."""
+    layers = fold_network(model, scaler)
+    arrays = {'activations': np.array([activation for _, _, activation in layers])}
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays[f'kernel_{i}'] = kernel.astype(np.float32)
+        arrays[f'bias_{i}'] = bias.astype(np.float32)
+    np.savez(path, **arrays)
+
+
+if __name__ == '__main__':
+    import joblib
+    from tensorflow.keras.models import load_model
+
+    parser = argparse.ArgumentParser(description='Export a trained Keras model and scaler to a NumPy .npz file.')
+    parser.add_argument('--model', default='best_model.h5')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--output', default='model.npz')
+    args = parser.parse_args()
+
+    export_npz(load_model(args.model), joblib.load(args.scaler), args.output)
+    print(f"Wrote {args.output}")
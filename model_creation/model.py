@@ -1,107 +1,640 @@
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout, BatchNormalization
-from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
-from sklearn.model_selection import train_test_split, StratifiedKFold
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+import argparse
+import copy
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import joblib
+from sklearn.model_selection import train_test_split, StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+from export import export_npz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from feature_extraction import (CLASSES_FILENAME, FeatureSchema, SchemaMismatchError, cheap_feature_names, dataset_schema_path,
+                                full_feature_names, save_classes)
+from feature_extraction.bytevector import BYTE_CLASSES_FILENAME, BYTE_LAYOUT_FILENAME, ByteVectorLayout
+from feature_extraction.schema import SCHEMA_FILENAME
+from feature_extraction.store import FeatureStore, is_feature_store
+
+LABEL_COLUMN = 'algorithm'
+
+# Hidden layer widths of the production network
+HIDDEN_LAYERS = (256, 128, 64)
+
+# What a fold's checkpoint and result depend on; fold directories written under other values are discarded
+FOLD_KEYS = ['paths', 'n_rows', 'classes', 'scaler_mean', 'scaler_scale', 'seed', 'folds', 'test_size', 'batch_size',
+             'learning_rate', 'epochs', 'hidden']
+
+# Confidence thresholds evaluated for the cascade's early exit
+CASCADE_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.98, 0.99, 0.995, 0.999]
+
+
+def expand_paths(patterns):
+    """Resolve dataset arguments (files or globs of CSV/Parquet shards, or feature store directories) in sorted order."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(f"No dataset files match {pattern}")
+        paths.extend(matches)
+    return paths
+
+
+def iter_chunks(paths, chunk_rows=65536):
+    """Yield (features, labels) DataFrame/Series chunks from CSV, Parquet or feature store shards."""
+    for path in paths:
+        if is_feature_store(path):
+            store = FeatureStore(path)
+            for features, labels in store.iter_chunks(chunk_rows):
+                yield pd.DataFrame(features, columns=store.columns, copy=False), pd.Series(labels)
+        elif path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+                chunk = batch.to_pandas()
+                yield chunk.drop(columns=[LABEL_COLUMN]), chunk[LABEL_COLUMN]
+        else:
+            for chunk in pd.read_csv(path, chunksize=chunk_rows):
+                yield chunk.drop(columns=[LABEL_COLUMN]), chunk[LABEL_COLUMN]
+
+
+def scan_dataset(paths, chunk_rows):
+    """One streaming pass: fit the scaler, collect the label set and encode labels.
+
+    Only the label codes (one byte per row) are kept in memory; features are
+    read again shard by shard during training.
+    """
+    scaler = StandardScaler()
+    labels = []
+    columns = None
+    for X, y in iter_chunks(paths, chunk_rows):
+        if columns is None:
+            columns = list(X.columns)
+        elif list(X.columns) != columns:
+            raise ValueError('Dataset shards have different feature columns')
+        scaler.partial_fit(X.to_numpy(dtype=np.float64))
+        labels.append(y.to_numpy())
+    labels = np.concatenate(labels)
+    # Sorted, to match the LabelEncoder class order the server expects
+    classes, y_encoded = np.unique(labels, return_inverse=True)
+    return scaler, columns, classes, y_encoded.astype(np.int8)
+
+
+def dataset_schema(paths, columns):
+    """Feature schema of the dataset, checked against the current feature code.
+
+    Shards written by dataset_creation/create_data.py have a schema file
+    beside them; older datasets are assumed to use the current versions
+    and the exact profile. Shards extracted under different feature
+    profiles cannot be mixed.
+    """
+    schema = FeatureSchema.current(columns)
+    profiles = set()
+    for path in paths:
+        schema_path = dataset_schema_path(path)
+        if os.path.exists(schema_path):
+            saved = FeatureSchema.load(schema_path).check()
+            if saved.names != columns:
+                raise SchemaMismatchError(f"{schema_path} does not match the columns of {path}")
+            profiles.add(saved.profile)
+            schema = saved
+    if len(profiles) > 1:
+        raise SchemaMismatchError(f"Dataset shards use different feature profiles: {', '.join(sorted(profiles))}")
+    return schema
+
+
+def full_model_schema(schema):
+    """Schema of the full model trained on a dataset with `schema`.
+
+    Columns from create_data.py --cascade-features are left out: they only
+    feed the cascade's cheap tier, and the server's streaming extractor
+    does not compute them.
+    """
+    return FeatureSchema.current(full_feature_names(schema.names), schema.profile)
+
+
+def dataset_layout(paths, columns):
+    """Byte-vector layout of a dataset from create_data.py --byte-vectors, checked against its columns."""
+    layout = None
+    for path in paths:
+        layout_path = dataset_schema_path(path)
+        if os.path.exists(layout_path):
+            try:
+                saved = ByteVectorLayout.load(layout_path)
+            except ValueError as e:
+                raise SchemaMismatchError(f"{layout_path}: {e}; --input bytes needs create_data.py --byte-vectors data")
+            if layout is not None and saved != layout:
+                raise SchemaMismatchError('Dataset shards use different byte-vector layouts')
+            layout = saved
+    if layout is None and len(columns) > 257:
+        layout = ByteVectorLayout(len(columns) - 257)
+    if layout is None or layout.columns != columns:
+        raise SchemaMismatchError('Dataset columns are not a byte-vector layout; generate it with create_data.py --byte-vectors')
+    return layout
+
+
+def make_store_dataset(config, mask, shuffle):
+    """tf.data pipeline that gathers the rows selected by `mask` from a memory-mapped feature store.
 
-# Load dataset
-df = pd.read_csv("dataset.csv")
+    Only the selected row indices are held in memory. Each batch is
+    read from the mapped shards in ascending index order, so a fold
+    never copies the dataset, and shuffling is a full permutation of the
+    fold rather than a bounded buffer.
+    """
+    import tensorflow as tf
 
-# Features and target variable
-X = df.drop(columns=['algorithm'])
-y = df['algorithm']
+    store = FeatureStore(config['paths'][0])
+    columns = config.get('columns')
+    positions = [store.columns.index(name) for name in columns] if columns else None
+    mean = np.asarray(config['scaler_mean'], dtype=np.float32)
+    scale = np.asarray(config['scaler_scale'], dtype=np.float32)
+    # Store label codes are in first-seen order; the model uses sorted classes
+    remap = np.array([config['classes'].index(name) for name in store.classes], dtype=np.int32)
+    indices = np.flatnonzero(mask)
+    rng = np.random.default_rng(config['seed'])
+    batch_size = config['batch_size']
 
-# Encoding target labels
-label_encoder = LabelEncoder()
-y_encoded = label_encoder.fit_transform(y)
+    def generate():
+        order = rng.permutation(indices) if shuffle else indices
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            if shuffle:
+                batch = np.sort(batch)
+            features = (store.rows(batch, positions) - mean) / scale
+            yield features, remap[store.labels[batch]]
 
-# Normalizing features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec(shape=(None, len(mean)), dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.int32),
+    ))
+    return dataset.prefetch(tf.data.AUTOTUNE)
 
-# Splitting data into train and test sets before cross-validation
-X_train_all, X_test, y_train_all, y_test = train_test_split(X_scaled, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded)
 
-# Stratified K-Fold Cross-Validation
-kfold = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-fold_no = 1
-accuracy_per_fold = []
-best_model = None
-best_val_acc = 0.0
+def make_dataset(config, mask, shuffle):
+    """tf.data pipeline over the rows selected by the boolean `mask`.
+
+    If config has 'columns', only those feature columns are fed.
+    """
+    import tensorflow as tf
+
+    if len(config['paths']) == 1 and is_feature_store(config['paths'][0]):
+        return make_store_dataset(config, mask, shuffle)
+
+    mean = np.asarray(config['scaler_mean'], dtype=np.float32)
+    scale = np.asarray(config['scaler_scale'], dtype=np.float32)
+    class_index = {label: i for i, label in enumerate(config['classes'])}
+    n_features = len(mean)
+    columns = config.get('columns')
+
+    def generate():
+        offset = 0
+        for X, y in iter_chunks(config['paths'], config['chunk_rows']):
+            selected = mask[offset:offset + len(X)]
+            offset += len(X)
+            if not selected.any():
+                continue
+            if columns:
+                X = X[columns]
+            features = (X.to_numpy(dtype=np.float32)[selected] - mean) / scale
+            targets = y.map(class_index).to_numpy(dtype=np.int32)[selected]
+            yield features, targets
+
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.int32),
+    )).unbatch()
+    if shuffle:
+        dataset = dataset.shuffle(config['shuffle_buffer'], seed=config['seed'], reshuffle_each_iteration=True)
+    return dataset.batch(config['batch_size']).prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(n_features, n_classes, learning_rate, hidden=HIDDEN_LAYERS, dropout=0.5, l2=0.001):
+    """Dense-BatchNorm-Dropout stack with one block per entry of `hidden`; the defaults are the production network."""
+    import tensorflow as tf
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Dropout, BatchNormalization
+
+    model = Sequential()
+    for i, units in enumerate(hidden):
+        shape = {'input_shape': (n_features,)} if i == 0 else {}
+        model.add(Dense(units, activation='relu', kernel_regularizer=tf.keras.regularizers.l2(l2), **shape))
+        model.add(BatchNormalization())
+        if dropout:
+            model.add(Dropout(dropout))
+    model.add(Dense(n_classes, activation='softmax'))
+
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate), loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def build_cascade_model(n_features, n_classes, learning_rate):
+    """Small network for the cascade's cheap tier; its cost is dominated by the features."""
+    import tensorflow as tf
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense
 
-for train, val in kfold.split(X_train_all, y_train_all):
-    X_train, X_val = X_train_all[train], X_train_all[val]
-    y_train, y_val = y_train_all[train], y_train_all[val]
-    
-    # Model Architecture with increased complexity
     model = Sequential([
-        Dense(256, activation='relu', input_shape=(X_train.shape[1],), kernel_regularizer=tf.keras.regularizers.l2(0.001)),
-        BatchNormalization(),
-        Dropout(0.5),
-        Dense(128, activation='relu', kernel_regularizer=tf.keras.regularizers.l2(0.001)),
-        BatchNormalization(),
-        Dropout(0.5),
-        Dense(64, activation='relu', kernel_regularizer=tf.keras.regularizers.l2(0.001)),
-        BatchNormalization(),
-        Dropout(0.5),
-        Dense(len(label_encoder.classes_), activation='softmax')
+        Dense(32, activation='relu', input_shape=(n_features,)),
+        Dense(n_classes, activation='softmax')
     ])
-    
-    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
 
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate), loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def plot_history(history, path):
+    plt.figure(figsize=(12, 6))
+
+    plt.subplot(1, 2, 1)
+    plt.plot(history['accuracy'], label='Training Accuracy')
+    plt.plot(history['val_accuracy'], label='Validation Accuracy')
+    plt.title('Accuracy')
+    plt.xlabel('Epoch')
+    plt.ylabel('Accuracy')
+    plt.legend()
+
+    plt.subplot(1, 2, 2)
+    plt.plot(history['loss'], label='Training Loss')
+    plt.plot(history['val_loss'], label='Validation Loss')
+    plt.title('Loss')
+    plt.xlabel('Epoch')
+    plt.ylabel('Loss')
+    plt.legend()
+
+    plt.savefig(path)
+    plt.close()
+
+
+def fold_dir(config, fold_no):
+    return os.path.join(config['checkpoint_dir'], f'fold_{fold_no}')
+
+
+def fold_signature(config):
+    return {key: config[key] for key in FOLD_KEYS}
+
+
+def train_fold(config, fold_no, train_mask, val_mask):
+    """Train one fold, resuming from its checkpoint if a previous run was interrupted."""
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, BackupAndRestore
+
+    tf.config.threading.set_intra_op_parallelism_threads(config['threads_per_fold'])
+    tf.config.threading.set_inter_op_parallelism_threads(config['threads_per_fold'])
+    tf.keras.utils.set_random_seed(config['seed'] + fold_no)
+
+    directory = fold_dir(config, fold_no)
+    os.makedirs(directory, exist_ok=True)
+    # Lets a later run tell whether this directory's backup and result are its own
+    with open(os.path.join(directory, 'fold.json'), 'w') as f:
+        json.dump(fold_signature(config), f)
+
+    model = build_model(len(config['scaler_mean']), len(config['classes']), config['learning_rate'], config['hidden'])
     early_stopping = EarlyStopping(monitor='val_loss', patience=8, restore_best_weights=True)
     reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.1, patience=5)
+    backup = BackupAndRestore(os.path.join(directory, 'backup'))
 
     history = model.fit(
-        X_train, y_train,
-        epochs=150,
-        validation_data=(X_val, y_val),
-        batch_size=32,
-        callbacks=[early_stopping, reduce_lr],
-        verbose=1
+        make_dataset(config, train_mask, shuffle=True),
+        epochs=config['epochs'],
+        validation_data=make_dataset(config, val_mask, shuffle=False),
+        callbacks=[backup, early_stopping, reduce_lr],
+        verbose=config['verbose']
     )
 
-    val_loss, val_acc = model.evaluate(X_val, y_val, verbose=0)
-    accuracy_per_fold.append(val_acc * 100)
+    val_loss, val_acc = model.evaluate(make_dataset(config, val_mask, shuffle=False), verbose=0)
     print(f"Fold {fold_no} - Validation Accuracy: {val_acc * 100:.2f}%")
-    
-    if val_acc > best_val_acc:
-        best_val_acc = val_acc
-        best_model = model
-    
-    fold_no += 1
-
-avg_accuracy = np.mean(accuracy_per_fold)
-print(f"Average Cross-Validation Accuracy: {avg_accuracy:.2f}%")
-
-test_loss, test_acc = best_model.evaluate(X_test, y_test, verbose=2)
-print(f'Final Test Accuracy: {test_acc * 100:.2f}%')
-
-plt.figure(figsize=(12, 6))
-
-plt.subplot(1, 2, 1)
-plt.plot(history.history['accuracy'], label='Training Accuracy')
-plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
-plt.title('Accuracy')
-plt.xlabel('Epoch')
-plt.ylabel('Accuracy')
-plt.legend()
-
-plt.subplot(1, 2, 2)
-plt.plot(history.history['loss'], label='Training Loss')
-plt.plot(history.history['val_loss'], label='Validation Loss')
-plt.title('Loss')
-plt.xlabel('Epoch')
-plt.ylabel('Loss')
-plt.legend()
-
-plt.show()
-
-best_model.save('best_model.h5')
-
-joblib.dump(scaler, 'scaler.joblib')
+
+    model.save(os.path.join(directory, 'model.h5'))
+    history = {key: [float(v) for v in values] for key, values in history.history.items()}
+    plot_history(history, os.path.join(directory, 'training_history.png'))
+    result = {'fold': fold_no, 'val_loss': val_loss, 'val_acc': val_acc, 'history': history,
+              'config': fold_signature(config)}
+    # Written last: its presence marks the fold as finished
+    with open(os.path.join(directory, 'result.json'), 'w') as f:
+        json.dump(result, f)
+    return result
+
+
+def load_fold_result(config, fold_no):
+    """Result of a fold finished by an earlier run with the same data and settings, or None.
+
+    A fold directory from a run with other data paths, classes, seed,
+    batch size or architecture is removed, so neither its score nor its
+    backup is reused.
+    """
+    directory = fold_dir(config, fold_no)
+    if not os.path.isdir(directory):
+        return None
+    signature_path = os.path.join(directory, 'fold.json')
+    signature = None
+    if os.path.exists(signature_path):
+        with open(signature_path) as f:
+            signature = json.load(f)
+    if signature != fold_signature(config):
+        print(f"Discarding {directory}: it was trained with different data or settings")
+        shutil.rmtree(directory)
+        return None
+    path = os.path.join(directory, 'result.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        result = json.load(f)
+    return result if result.get('config') == signature else None
+
+
+def _train_fold_job(job):
+    return train_fold(*job)
+
+
+def subset_scaler(scaler, index):
+    """Copy of a fitted StandardScaler restricted to the feature positions `index`."""
+    subset = copy.deepcopy(scaler)
+    subset.mean_ = scaler.mean_[index]
+    subset.var_ = scaler.var_[index]
+    subset.scale_ = scaler.scale_[index]
+    subset.n_features_in_ = len(index)
+    return subset
+
+
+def train_cascade(config, train_mask, val_mask):
+    """Train the cheap tier on the columns in config['columns']."""
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    tf.keras.utils.set_random_seed(config['seed'])
+    model = build_cascade_model(len(config['columns']), len(config['classes']), config['learning_rate'])
+    early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+    model.fit(
+        make_dataset(config, train_mask, shuffle=True),
+        epochs=config['epochs'],
+        validation_data=make_dataset(config, val_mask, shuffle=False),
+        callbacks=[early_stopping],
+        verbose=config['verbose']
+    )
+    return model
+
+
+def cascade_tradeoff(cheap_probabilities, full_probabilities, labels, thresholds=CASCADE_THRESHOLDS):
+    """Early-exit rate and end-to-end accuracy of the cascade at each confidence threshold."""
+    cheap_predictions = cheap_probabilities.argmax(axis=1)
+    full_predictions = full_probabilities.argmax(axis=1)
+    confidence = cheap_probabilities.max(axis=1)
+    rows = []
+    for threshold in thresholds:
+        exits = confidence >= threshold
+        predictions = np.where(exits, cheap_predictions, full_predictions)
+        rows.append({
+            'threshold': threshold,
+            'exit_rate': float(exits.mean()),
+            'accuracy': float((predictions == labels).mean()),
+        })
+    return rows
+
+
+def choose_threshold(tradeoff, full_accuracy, tolerance):
+    """Lowest threshold (most early exits) whose accuracy is within `tolerance` of the full model."""
+    for row in tradeoff:
+        if row['accuracy'] >= full_accuracy - tolerance:
+            return row['threshold']
+    return None
+
+
+# Files of a trained model that Backend/registry.py serves as one version
+BUNDLE_FILES = ['best_model.h5', 'scaler.joblib', 'model.npz', SCHEMA_FILENAME, CLASSES_FILENAME]
+CASCADE_FILES = ['cascade_model.npz', 'cascade.json']
+BYTE_FILES = ['byte_model.h5', 'byte_scaler.joblib', 'byte_model.npz', BYTE_LAYOUT_FILENAME, BYTE_CLASSES_FILENAME]
+
+# What each --input mode writes to --output-dir; the byte-level model sits beside the feature model
+OUTPUTS = {
+    'features': {'keras': 'best_model.h5', 'scaler': 'scaler.joblib', 'npz': 'model.npz', 'classes': CLASSES_FILENAME,
+                 'history': 'training_history.png', 'checkpoints': 'checkpoints'},
+    'bytes': {'keras': 'byte_model.h5', 'scaler': 'byte_scaler.joblib', 'npz': 'byte_model.npz',
+              'classes': BYTE_CLASSES_FILENAME, 'history': 'byte_training_history.png', 'checkpoints': 'checkpoints_bytes'},
+}
+
+
+def publish_bundle(model_dir, registry, version, activate=True, files=BUNDLE_FILES):
+    """Copy the model in `model_dir` into `registry` as `version`, and make it current if `activate`.
+
+    The bundle is written under a hidden temporary name and renamed into
+    place, and CURRENT is replaced atomically, so a server polling the
+    registry never sees a partial version.
+    """
+    target = os.path.join(registry, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"Model version {version} already exists in {registry}")
+    staging = os.path.join(registry, f'.{version}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in files:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            shutil.copy2(path, staging)
+    os.replace(staging, target)
+    if activate:
+        current = os.path.join(registry, 'CURRENT')
+        with open(current + '.tmp', 'w') as f:
+            f.write(version + '\n')
+        os.replace(current + '.tmp', current)
+    print(f"Published {target}" + (' as the current version' if activate else ''))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the cipher classifier with stratified k-fold cross-validation.')
+    parser.add_argument('--data', nargs='+', default=['dataset.csv'], help='CSV/Parquet dataset files or globs, or a feature store directory (create_data.py --format npy)')
+    parser.add_argument('--output-dir', default='.',
+                        help='where best_model.h5, scaler.joblib, model.npz, feature_schema.json and classes.json are written')
+    parser.add_argument('--input', choices=sorted(OUTPUTS), default='features',
+                        help='features: the hand-crafted feature columns; bytes: byte histogram + bigram-hash rows '
+                             'from create_data.py --byte-vectors, written as byte_model.* beside the feature model')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='per-fold checkpoints; rerun to resume (default: checkpoints, or checkpoints_bytes with --input bytes)')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=1, help='folds trained in parallel processes')
+    parser.add_argument('--epochs', type=int, default=150)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--base-lr', type=float, default=0.001, help='Adam learning rate at batch size 32')
+    parser.add_argument('--no-lr-scaling', dest='lr_scaling', action='store_false',
+                        help='use --base-lr as is instead of scaling it linearly with the batch size')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=65536, help='rows read per chunk from each shard')
+    parser.add_argument('--shuffle-buffer', type=int, default=100000, help='CSV/Parquet only; feature stores shuffle fully')
+    parser.add_argument('--cascade', action='store_true',
+                        help='also train the cheap first tier (cascade_model.npz, cascade.json); '
+                             'datasets from create_data.py --cascade-features give it the block-alignment columns')
+    parser.add_argument('--cascade-tolerance', type=float, default=0.005,
+                        help='largest test accuracy loss accepted when choosing the early-exit threshold')
+    parser.add_argument('--registry', default=None,
+                        help='also publish the trained model as a new version in this model registry directory')
+    parser.add_argument('--version', default=None, help='registry version name (default: the current time)')
+    parser.add_argument('--no-activate', dest='activate', action='store_false',
+                        help='publish without making it the version served by default')
+    parser.add_argument('--verbose', type=int, default=1)
+    args = parser.parse_args()
+    if args.input == 'bytes' and args.cascade:
+        parser.error('--cascade needs --input features')
+    if args.checkpoint_dir is None:
+        args.checkpoint_dir = OUTPUTS[args.input]['checkpoints']
+    return args
+
+
+def main():
+    args = parse_args()
+    paths = expand_paths(args.data)
+    dataset_scaler, columns, classes, y_encoded = scan_dataset(paths, args.chunk_rows)
+    if args.input == 'bytes':
+        layout = dataset_layout(paths, columns)
+        model_columns = columns
+    else:
+        schema = dataset_schema(paths, columns)
+        model_schema = full_model_schema(schema)
+        model_columns = model_schema.names
+    scaler = subset_scaler(dataset_scaler, [columns.index(name) for name in model_columns])
+    outputs = OUTPUTS[args.input]
+    n_rows = len(y_encoded)
+    print(f"{n_rows} rows, {len(model_columns)} features, classes {list(classes)}")
+
+    # Splitting data into train and test sets before cross-validation
+    indices = np.arange(n_rows)
+    train_idx, test_idx = train_test_split(indices, test_size=args.test_size, random_state=args.seed, stratify=y_encoded)
+
+    learning_rate = args.base_lr * args.batch_size / 32 if args.lr_scaling else args.base_lr
+    config = {
+        'paths': paths,
+        'n_rows': n_rows,
+        'chunk_rows': args.chunk_rows,
+        'classes': [str(name) for name in classes],
+        'scaler_mean': scaler.mean_.tolist(),
+        'scaler_scale': scaler.scale_.tolist(),
+        'batch_size': args.batch_size,
+        'learning_rate': learning_rate,
+        'epochs': args.epochs,
+        'shuffle_buffer': args.shuffle_buffer,
+        'seed': args.seed,
+        'folds': args.folds,
+        'test_size': args.test_size,
+        'hidden': list(HIDDEN_LAYERS),
+        'checkpoint_dir': args.checkpoint_dir,
+        'threads_per_fold': max(1, (os.cpu_count() or 1) // args.jobs),
+        'verbose': args.verbose,
+    }
+    if model_columns != columns:
+        config['columns'] = model_columns
+
+    # Stratified K-Fold Cross-Validation
+    kfold = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=args.seed)
+    results = {}
+    jobs = []
+    for fold_no, (train, val) in enumerate(kfold.split(train_idx, y_encoded[train_idx]), start=1):
+        finished = load_fold_result(config, fold_no)
+        if finished:
+            print(f"Fold {fold_no} already trained - Validation Accuracy: {finished['val_acc'] * 100:.2f}%")
+            results[fold_no] = finished
+            continue
+        train_mask = np.zeros(n_rows, dtype=bool)
+        train_mask[train_idx[train]] = True
+        val_mask = np.zeros(n_rows, dtype=bool)
+        val_mask[train_idx[val]] = True
+        jobs.append((config, fold_no, train_mask, val_mask))
+
+    if args.jobs > 1 and len(jobs) > 1:
+        # Spawned processes so each fold gets a fresh TensorFlow runtime
+        with multiprocessing.get_context('spawn').Pool(min(args.jobs, len(jobs))) as pool:
+            for result in pool.imap_unordered(_train_fold_job, jobs):
+                results[result['fold']] = result
+    else:
+        for job in jobs:
+            result = train_fold(*job)
+            results[result['fold']] = result
+
+    accuracy_per_fold = [results[fold]['val_acc'] * 100 for fold in sorted(results)]
+    avg_accuracy = np.mean(accuracy_per_fold)
+    print(f"Average Cross-Validation Accuracy: {avg_accuracy:.2f}%")
+
+    from tensorflow.keras.models import load_model
+    best_fold = max(results, key=lambda fold: results[fold]['val_acc'])
+    best_model = load_model(os.path.join(fold_dir(config, best_fold), 'model.h5'))
+
+    test_mask = np.zeros(n_rows, dtype=bool)
+    test_mask[test_idx] = True
+    test_loss, test_acc = best_model.evaluate(make_dataset(config, test_mask, shuffle=False), verbose=2)
+    print(f'Final Test Accuracy: {test_acc * 100:.2f}%')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    plot_history(results[best_fold]['history'], os.path.join(args.output_dir, outputs['history']))
+
+    best_model.save(os.path.join(args.output_dir, outputs['keras']))
+
+    joblib.dump(scaler, os.path.join(args.output_dir, outputs['scaler']))
+
+    # Sorted class names, one per model output; the server labels its probabilities with them
+    save_classes(classes, os.path.join(args.output_dir, outputs['classes']))
+
+    # The server computes exactly these features (or byte-vector columns), in this order
+    if args.input == 'bytes':
+        layout.save(os.path.join(args.output_dir, BYTE_LAYOUT_FILENAME))
+    else:
+        model_schema.save(os.path.join(args.output_dir, SCHEMA_FILENAME))
+
+    # Folded weights for the NumPy serving runtime (Backend/inference.py)
+    export_npz(best_model, scaler, os.path.join(args.output_dir, outputs['npz']))
+
+    if args.cascade:
+        cheap_columns = cheap_feature_names(columns)
+        index = [columns.index(name) for name in cheap_columns]
+        cheap_scaler = subset_scaler(dataset_scaler, index)
+        cascade_config = dict(config, columns=cheap_columns,
+                              scaler_mean=cheap_scaler.mean_.tolist(), scaler_scale=cheap_scaler.scale_.tolist())
+        cheap_train, cheap_val = train_test_split(train_idx, test_size=0.1, random_state=args.seed, stratify=y_encoded[train_idx])
+        train_mask = np.zeros(n_rows, dtype=bool)
+        train_mask[cheap_train] = True
+        val_mask = np.zeros(n_rows, dtype=bool)
+        val_mask[cheap_val] = True
+        print(f"Training cascade tier on {', '.join(cheap_columns)}")
+        cheap_model = train_cascade(cascade_config, train_mask, val_mask)
+
+        # Masks keep dataset order, so both predictions line up with the labels
+        labels = y_encoded[test_mask]
+        cheap_probabilities = cheap_model.predict(make_dataset(cascade_config, test_mask, shuffle=False), verbose=0)
+        full_probabilities = best_model.predict(make_dataset(config, test_mask, shuffle=False), verbose=0)
+        full_accuracy = float((full_probabilities.argmax(axis=1) == labels).mean())
+        tradeoff = cascade_tradeoff(cheap_probabilities, full_probabilities, labels)
+        threshold = choose_threshold(tradeoff, full_accuracy, args.cascade_tolerance)
+
+        print(f"Cheap tier alone: {(cheap_probabilities.argmax(axis=1) == labels).mean() * 100:.2f}%, "
+              f"full model: {full_accuracy * 100:.2f}%")
+        for row in tradeoff:
+            print(f"  threshold {row['threshold']:.3f}: early exit {row['exit_rate'] * 100:5.1f}%, "
+                  f"accuracy {row['accuracy'] * 100:.2f}%")
+        print(f"Chosen threshold: {threshold}" if threshold is not None
+              else 'No threshold within tolerance; the cascade will never exit early')
+
+        export_npz(cheap_model, cheap_scaler, os.path.join(args.output_dir, 'cascade_model.npz'))
+        with open(os.path.join(args.output_dir, 'cascade.json'), 'w') as f:
+            json.dump({
+                'threshold': threshold,
+                'tolerance': args.cascade_tolerance,
+                'schema': FeatureSchema.current(cheap_columns, schema.profile).to_dict(),
+                'full_accuracy': full_accuracy,
+                'tradeoff': tradeoff,
+            }, f, indent=2)
+
+    if args.registry:
+        os.makedirs(args.registry, exist_ok=True)
+        # A version holds the feature model and, if one was trained into the same
+        # directory, the byte-level model. Cascade files are only this run's, or
+        # the feature model's when this run trained the byte-level model.
+        files = BUNDLE_FILES + BYTE_FILES + (CASCADE_FILES if args.cascade or args.input == 'bytes' else [])
+        publish_bundle(args.output_dir, args.registry, args.version or time.strftime('%Y%m%d-%H%M%S'), args.activate, files)
+
+
+if __name__ == '__main__':
+    main()
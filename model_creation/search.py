@@ -0,0 +1,374 @@
+import argparse
+import base64
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import numpy as np
+from sklearn.model_selection import train_test_split
+from export import export_npz
+from model import build_model, dataset_schema, expand_paths, make_dataset, scan_dataset, subset_scaler
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'Backend'))
+from feature_extraction import FEATURE_NAMES, cheap_feature_names, compute_features, full_feature_names
+from inference import NumpyModel
+
+# The network in model.py, always trained as the reference point
+BASELINE = {'width': 256, 'depth': 3, 'dropout': 0.5, 'batch_size': 32, 'features': 'all'}
+
+# Search settings that change what a trial learns; a finished trial is reused only if they all match
+SEARCH_KEYS = ['data', 'n_rows', 'columns', 'profile', 'val_size', 'epochs', 'patience', 'prune_after',
+               'prune_min_trials', 'base_lr', 'seed']
+
+
+def feature_subsets(columns):
+    """Named feature subsets of the dataset's columns that trials can train on."""
+    subsets = {
+        'all': full_feature_names(columns),
+        'base': [name for name in columns if name in FEATURE_NAMES],
+        'cheap': cheap_feature_names(columns),
+    }
+    return {name: subset for name, subset in subsets.items() if subset}
+
+
+def hidden_layers(width, depth):
+    # Halving widths, as in the production 256-128-64 network
+    return [max(8, width >> i) for i in range(depth)]
+
+
+def make_trials(args, subsets):
+    """Trial configurations: the grid of the search options, sampled down to --trials, plus the baseline."""
+    grid = [dict(zip(BASELINE, values)) for values in itertools.product(
+        args.widths, args.depths, args.dropouts, args.batch_sizes, [name for name in args.feature_sets if name in subsets])]
+    if args.trials and args.trials < len(grid):
+        rng = np.random.default_rng(args.seed)
+        grid = [grid[i] for i in sorted(rng.choice(len(grid), args.trials, replace=False))]
+    if BASELINE not in grid:
+        grid.insert(0, dict(BASELINE))
+    return [dict(trial, id=i) for i, trial in enumerate(grid)]
+
+
+def trial_dir(config, trial):
+    return os.path.join(config['search_dir'], f"trial_{trial['id']:03d}")
+
+
+def trial_signature(config, trial):
+    signature = dict(trial, scaler_mean=config['scaler'].mean_.tolist(), scaler_scale=config['scaler'].scale_.tolist(),
+                     **{key: config[key] for key in SEARCH_KEYS})
+    # Round-tripped so it compares equal to the copy read back from trial.json
+    return json.loads(json.dumps(signature))
+
+
+def clear_stale_trials(config, trials):
+    """Remove trial directories that are not finished trials of the current search.
+
+    A directory from a run with other data or settings, from a trial id no
+    longer in the grid, or from an interrupted trial is deleted, so its
+    result is not reused and its curve.json does not take part in pruning.
+    """
+    signatures = {os.path.basename(trial_dir(config, trial)): trial_signature(config, trial) for trial in trials}
+    for name in os.listdir(config['search_dir']):
+        directory = os.path.join(config['search_dir'], name)
+        if not name.startswith('trial_') or not os.path.isdir(directory):
+            continue
+        signature = None
+        signature_path = os.path.join(directory, 'trial.json')
+        if os.path.exists(signature_path):
+            with open(signature_path) as f:
+                signature = json.load(f)
+        if signature != signatures.get(name) or not os.path.exists(os.path.join(directory, 'result.json')):
+            shutil.rmtree(directory)
+
+
+def read_curves(config, exclude):
+    """Validation accuracy per epoch reported so far by every other trial.
+
+    clear_stale_trials runs before any trial starts, so every curve read here
+    belongs to a trial of the current search.
+    """
+    curves = []
+    for name in os.listdir(config['search_dir']):
+        path = os.path.join(config['search_dir'], name, 'curve.json')
+        if name != exclude and os.path.exists(path):
+            with open(path) as f:
+                curves.append(json.load(f))
+    return curves
+
+
+def median_pruning(config, trial):
+    """Keras callback that stops a trial whose validation accuracy falls below the median of its peers.
+
+    Each trial writes its per-epoch accuracy to curve.json in its
+    directory. From epoch `prune_after` on, a trial is stopped when at
+    least `prune_min_trials` other trials reached the same epoch and its
+    accuracy is below their median. Trials in other processes are seen
+    through those files, so pruning works across the pool.
+    """
+    from tensorflow.keras.callbacks import Callback
+
+    directory = trial_dir(config, trial)
+
+    class MedianPruning(Callback):
+        def __init__(self):
+            super().__init__()
+            self.curve = []
+            self.pruned_at = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.curve.append(float(logs['val_accuracy']))
+            path = os.path.join(directory, 'curve.json')
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.curve, f)
+            os.replace(path + '.tmp', path)
+            if epoch + 1 < config['prune_after']:
+                return
+            peers = [curve[epoch] for curve in read_curves(config, os.path.basename(directory)) if len(curve) > epoch]
+            if len(peers) >= config['prune_min_trials'] and self.curve[-1] < np.median(peers):
+                self.pruned_at = epoch + 1
+                self.model.stop_training = True
+
+    return MedianPruning()
+
+
+def measure_latency(fn, min_time=0.2, max_repeats=200):
+    """Median seconds per call of `fn`, after one warm-up call."""
+    fn()
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < max_repeats and (len(timings) < 5 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings))
+
+
+def sample_ciphertexts(n, length, seed=0):
+    rng = np.random.default_rng(seed)
+    return [base64.b64encode(rng.bytes(length * 3 // 4 + 3)).decode()[:length] for _ in range(n)]
+
+
+def run_trial(config, trial, train_mask, val_mask):
+    """Train one trial; returns its accuracy and parameter count.
+
+    The folded network is written to model.npz in the trial directory so
+    measure_trial_latency can time it once training is over.
+    """
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    tf.config.threading.set_intra_op_parallelism_threads(config['threads_per_trial'])
+    tf.config.threading.set_inter_op_parallelism_threads(config['threads_per_trial'])
+    tf.keras.utils.set_random_seed(config['seed'])
+    directory = trial_dir(config, trial)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'trial.json'), 'w') as f:
+        json.dump(trial_signature(config, trial), f, indent=2)
+
+    columns = config['subsets'][trial['features']]
+    scaler = subset_scaler(config['scaler'], [config['columns'].index(name) for name in columns])
+    learning_rate = config['base_lr'] * trial['batch_size'] / 32
+    data_config = dict(config['data'], columns=columns, batch_size=trial['batch_size'],
+                       scaler_mean=scaler.mean_.tolist(), scaler_scale=scaler.scale_.tolist())
+
+    hidden = hidden_layers(trial['width'], trial['depth'])
+    model = build_model(len(columns), len(config['data']['classes']), learning_rate, hidden, trial['dropout'])
+    pruning = median_pruning(config, trial)
+    start = time.perf_counter()
+    history = model.fit(
+        make_dataset(data_config, train_mask, shuffle=True),
+        epochs=config['epochs'],
+        validation_data=make_dataset(data_config, val_mask, shuffle=False),
+        callbacks=[EarlyStopping(monitor='val_loss', patience=config['patience'], restore_best_weights=True), pruning],
+        verbose=0
+    )
+    train_seconds = time.perf_counter() - start
+    _, val_acc = model.evaluate(make_dataset(data_config, val_mask, shuffle=False), verbose=0)
+    export_npz(model, scaler, os.path.join(directory, 'model.npz'))
+
+    result = dict(
+        trial,
+        hidden=hidden,
+        val_accuracy=float(val_acc),
+        params=int(model.count_params()),
+        epochs=len(history.history['loss']),
+        pruned_at=pruning.pruned_at,
+        train_seconds=train_seconds,
+    )
+    # Written last: its presence marks the trial as finished
+    with open(os.path.join(directory, 'result.json'), 'w') as f:
+        json.dump(result, f, indent=2)
+    status = f"pruned at epoch {pruning.pruned_at}" if pruning.pruned_at else f"{result['epochs']} epochs"
+    print(f"Trial {trial['id']:3d} {hidden} dropout {trial['dropout']} batch {trial['batch_size']} "
+          f"{trial['features']}: {val_acc * 100:.2f}%, {result['params']} params ({status})")
+    return result
+
+
+def measure_trial_latency(config, result):
+    """Add the per-batch inference latency of a finished trial to its result.
+
+    Called in the parent process, one trial at a time and after all
+    training has finished, so the timings are not skewed by trials still
+    training in the pool. What is timed is what a server does for a batch:
+    features, then the forward pass of model.npz.
+    """
+    directory = trial_dir(config, result)
+    columns = config['subsets'][result['features']]
+    texts = sample_ciphertexts(config['latency_batch'], config['latency_text_length'])
+    served = NumpyModel.load(os.path.join(directory, 'model.npz'))
+    rows = np.vstack([compute_features(text, columns, profile=config['profile']) for text in texts])
+    model_latency = measure_latency(lambda: served.predict(rows))
+    feature_latency = measure_latency(lambda: [compute_features(text, columns, profile=config['profile']) for text in texts],
+                                      max_repeats=20)
+    result.update(
+        latency_batch=config['latency_batch'],
+        latency_text_length=config['latency_text_length'],
+        model_latency_ms=model_latency * 1e3,
+        feature_latency_ms=feature_latency * 1e3,
+        latency_ms=(model_latency + feature_latency) * 1e3,
+    )
+    path = os.path.join(directory, 'result.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(path + '.tmp', path)
+    print(f"Trial {result['id']:3d}: {result['latency_ms']:.2f} ms/batch "
+          f"(model {result['model_latency_ms']:.3f} ms)")
+    return result
+
+
+def load_trial_result(config, trial):
+    path = os.path.join(trial_dir(config, trial), 'result.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _run_trial_job(job):
+    return run_trial(*job)
+
+
+def pareto_front(results):
+    """Trials not beaten on both validation accuracy and latency by another, fastest first; pruned trials excluded."""
+    candidates = sorted((r for r in results if not r['pruned_at']), key=lambda r: (r['latency_ms'], -r['val_accuracy']))
+    front, best = [], -1.0
+    for result in candidates:
+        if result['val_accuracy'] > best:
+            front.append(result)
+            best = result['val_accuracy']
+    return front
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Search MLP architectures, batch sizes and feature subsets for '
+                                                 'the accuracy / inference latency trade-off.')
+    parser.add_argument('--data', nargs='+', default=['dataset.csv'], help='same as model.py --data')
+    parser.add_argument('--output', default='search_results.json', help='all trials and the Pareto front')
+    parser.add_argument('--search-dir', default='search', help='per-trial results and curves; rerun to resume')
+    parser.add_argument('--widths', type=int, nargs='+', default=[32, 64, 128, 256], help='first hidden layer width')
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 2, 3], help='hidden layers, each half as wide')
+    parser.add_argument('--dropouts', type=float, nargs='+', default=[0.0, 0.2, 0.5])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 128])
+    parser.add_argument('--feature-sets', nargs='+', choices=['all', 'base', 'cheap'], default=['all', 'base', 'cheap'],
+                        help='all dataset columns but the cascade-only ones, the 19 base features, or only the linear-time ones')
+    parser.add_argument('--trials', type=int, default=0, help='random sample of the grid (default: the whole grid)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='trials trained in parallel processes')
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--patience', type=int, default=8, help='early stopping patience in epochs')
+    parser.add_argument('--prune-after', type=int, default=5, help='first epoch at which a trial can be pruned')
+    parser.add_argument('--prune-min-trials', type=int, default=3, help='peers needed at an epoch before pruning')
+    parser.add_argument('--base-lr', type=float, default=0.001, help='Adam learning rate at batch size 32, scaled linearly')
+    parser.add_argument('--val-size', type=float, default=0.2)
+    parser.add_argument('--chunk-rows', type=int, default=65536)
+    parser.add_argument('--shuffle-buffer', type=int, default=100000)
+    parser.add_argument('--latency-batch', type=int, default=64, help='rows per batch when measuring latency')
+    parser.add_argument('--latency-text-length', type=int, default=152, help='ciphertext characters per latency row')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = expand_paths(args.data)
+    scaler, columns, classes, y_encoded = scan_dataset(paths, args.chunk_rows)
+    schema = dataset_schema(paths, columns)
+    n_rows = len(y_encoded)
+    subsets = feature_subsets(columns)
+
+    indices = np.arange(n_rows)
+    train_idx, val_idx = train_test_split(indices, test_size=args.val_size, random_state=args.seed, stratify=y_encoded)
+    train_mask = np.zeros(n_rows, dtype=bool)
+    train_mask[train_idx] = True
+    val_mask = np.zeros(n_rows, dtype=bool)
+    val_mask[val_idx] = True
+
+    os.makedirs(args.search_dir, exist_ok=True)
+    config = {
+        'data': {
+            'paths': paths,
+            'chunk_rows': args.chunk_rows,
+            'classes': [str(name) for name in classes],
+            'shuffle_buffer': args.shuffle_buffer,
+            'seed': args.seed,
+        },
+        'scaler': scaler,
+        'columns': columns,
+        'subsets': subsets,
+        'n_rows': n_rows,
+        'profile': schema.profile,
+        'val_size': args.val_size,
+        'search_dir': args.search_dir,
+        'epochs': args.epochs,
+        'patience': args.patience,
+        'prune_after': args.prune_after,
+        'prune_min_trials': args.prune_min_trials,
+        'base_lr': args.base_lr,
+        'latency_batch': args.latency_batch,
+        'latency_text_length': args.latency_text_length,
+        'seed': args.seed,
+        'threads_per_trial': max(1, (os.cpu_count() or 1) // max(1, args.workers)),
+    }
+
+    trials = make_trials(args, subsets)
+    print(f"{n_rows} rows, {len(trials)} trials, {args.workers} workers")
+    clear_stale_trials(config, trials)
+    results, jobs = [], []
+    for trial in trials:
+        finished = load_trial_result(config, trial)
+        if finished:
+            results.append(finished)
+        else:
+            jobs.append((config, trial, train_mask, val_mask))
+    if results:
+        print(f"{len(results)} trials already finished")
+
+    if args.workers > 1 and len(jobs) > 1:
+        # Spawned processes so each trial gets a fresh TensorFlow runtime
+        with multiprocessing.get_context('spawn').Pool(min(args.workers, len(jobs))) as pool:
+            results.extend(pool.imap_unordered(_run_trial_job, jobs))
+    else:
+        results.extend(run_trial(*job) for job in jobs)
+
+    for result in results:
+        if (result.get('latency_batch'), result.get('latency_text_length')) != \
+                (config['latency_batch'], config['latency_text_length']):
+            measure_trial_latency(config, result)
+
+    results.sort(key=lambda r: r['id'])
+    front = pareto_front(results)
+    print('Pareto front (validation accuracy vs. latency per batch of '
+          f'{args.latency_batch} rows, features + model):')
+    for result in front:
+        print(f"  trial {result['id']:3d} {result['hidden']} dropout {result['dropout']} batch {result['batch_size']} "
+              f"{result['features']}: {result['val_accuracy'] * 100:.2f}%, {result['params']} params, "
+              f"{result['latency_ms']:.2f} ms (model {result['model_latency_ms']:.3f} ms)")
+    with open(args.output, 'w') as f:
+        json.dump({'trials': results, 'pareto': [result['id'] for result in front]}, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+# The scripts in these directories import their neighbours by bare name, as when run from there
+for directory in ('Backend', 'model_creation', 'dataset_creation'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
@@ -0,0 +1,168 @@
+"""compute_features against the feature functions the shipped model was trained with.
+
+The reference functions below are the original per-feature definitions from
+dataset_creation/create_data.py, kept verbatim apart from their names. The
+model in model_creation/ stays valid only while the shared extractor
+reproduces them.
+"""
+import base64
+import binascii
+import math
+import zlib
+from collections import Counter, defaultdict
+from itertools import groupby
+import numpy as np
+import pytest
+import pywt
+from Crypto.Cipher import AES, DES, Blowfish
+from Crypto.Util.Padding import pad
+from scipy.fftpack import fft
+from scipy.stats import entropy
+from feature_extraction import FEATURE_NAMES, compute_features
+
+
+def compression_ratio(text):
+    compressed = zlib.compress(text.encode('utf-8'))
+    return len(compressed) / len(text.encode('utf-8'))
+
+
+def runs_index(text):
+    return len([sum(1 for _ in group) for _, group in groupby(text)])
+
+
+def serial_index(text):
+    bigrams = [text[i:i+2] for i in range(len(text)-1)]
+    return len(set(bigrams))
+
+
+def bit_transition_frequency(text):
+    bits = ''.join(format(byte, '08b') for byte in text.encode('utf-8'))
+    return sum(bits[i] != bits[i-1] for i in range(1, len(bits)))
+
+
+def fourier_transform_mean(text):
+    return np.mean(np.abs(fft([ord(c) for c in text])))
+
+
+def fourier_transform_std(text):
+    return np.std(np.abs(fft([ord(c) for c in text])))
+
+
+def fourier_transform_peak(text):
+    return np.max(np.abs(fft([ord(c) for c in text])))
+
+
+def fourier_transform_energy(text):
+    return np.sum(np.square(np.abs(fft([ord(c) for c in text]))))
+
+
+def wavelet_transform_energy(text):
+    coeffs = pywt.dwt(np.array([ord(c) for c in text]), 'haar')
+    return np.sum(np.square(coeffs[0]))
+
+
+def perplexity(text):
+    bigrams = [text[i:i+2] for i in range(len(text)-1)]
+    bigram_counts = Counter(bigrams)
+    total_bigrams = sum(bigram_counts.values())
+    probs = [bigram_counts[bg] / total_bigrams for bg in bigrams]
+    return math.exp(-sum(p * math.log(p, 2) for p in probs if p > 0) / len(probs))
+
+
+def markov_probabilities(text):
+    transitions = defaultdict(lambda: defaultdict(int))
+    for i in range(len(text) - 1):
+        transitions[text[i]][text[i+1]] += 1
+    for current_char, next_chars in transitions.items():
+        total = sum(next_chars.values())
+        for char in next_chars:
+            transitions[current_char][char] /= total
+    return [transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)]
+
+
+def character_pair_counts(text):
+    pairs = [text[i:i+2] for i in range(len(text)-1)]
+    return [pairs.count(pair) for pair in set(pairs)]
+
+
+def vowel_to_consonant_ratio(text):
+    vowels = 'aeiou'
+    vowel_count = sum(1 for c in text.lower() if c in vowels)
+    consonant_count = sum(1 for c in text.lower() if c.isalpha() and c not in vowels)
+    return vowel_count / consonant_count if consonant_count else 0
+
+
+def uppercase_to_lowercase_ratio(text):
+    uppercase_count = sum(1 for c in text if c.isupper())
+    lowercase_count = sum(1 for c in text if c.islower())
+    return uppercase_count / lowercase_count if lowercase_count else 0
+
+
+def longest_run_of_identical_bytes(text):
+    longest_run = 0
+    current_run = 1
+    for i in range(1, len(text)):
+        if text[i] == text[i-1]:
+            current_run += 1
+        else:
+            longest_run = max(longest_run, current_run)
+            current_run = 1
+    return max(longest_run, current_run)
+
+
+def entropy_of_fft_components(text):
+    return entropy(np.abs(fft([ord(c) for c in text])))
+
+
+def baseline_features(text):
+    return [
+        len(text),
+        compression_ratio(text),
+        runs_index(text),
+        serial_index(text),
+        bit_transition_frequency(text),
+        fourier_transform_mean(text),
+        fourier_transform_std(text),
+        fourier_transform_peak(text),
+        fourier_transform_energy(text),
+        wavelet_transform_energy(text),
+        perplexity(text),
+        np.mean(markov_probabilities(text)),
+        np.std(markov_probabilities(text)),
+        np.mean(character_pair_counts(text)),
+        np.std(character_pair_counts(text)),
+        vowel_to_consonant_ratio(text),
+        uppercase_to_lowercase_ratio(text),
+        longest_run_of_identical_bytes(text),
+        entropy_of_fft_components(text),
+    ]
+
+
+def ciphertexts():
+    plaintext = b'The quick brown fox jumps over the lazy dog, 0123456789 times. ' * 2
+    encrypted = [
+        AES.new(bytes(range(16)), AES.MODE_ECB).encrypt(pad(plaintext, 16)),
+        DES.new(bytes(range(8)), DES.MODE_ECB).encrypt(pad(plaintext, 8)),
+        Blowfish.new(bytes(range(16)), Blowfish.MODE_ECB).encrypt(pad(plaintext, 8)),
+        AES.new(bytes(16), AES.MODE_ECB).encrypt(bytes(48)),
+    ]
+    texts = [base64.b64encode(data).decode() for data in encrypted]
+    texts += [binascii.hexlify(encrypted[0]).decode(), 'ab', 'aaaa', 'Ünïcödé ciphertext? ñ€ 日本']
+    return texts
+
+
+def test_names_match_baseline_order():
+    assert FEATURE_NAMES == [
+        'text_length', 'compression_ratio', 'runs_index', 'serial_index', 'bit_transition_frequency',
+        'fourier_transform_mean', 'fourier_transform_std', 'fourier_transform_peak', 'fourier_transform_energy',
+        'wavelet_transform_energy', 'perplexity', 'markov_chain_mean', 'markov_chain_std',
+        'character_pair_frequency_mean', 'character_pair_frequency_std', 'vowel_to_consonant_ratio',
+        'uppercase_to_lowercase_ratio', 'longest_run_of_identical_bytes', 'entropy_of_fft_components',
+    ]
+
+
+@pytest.mark.parametrize('text', ciphertexts())
+def test_features_match_baseline(text):
+    expected = baseline_features(text)
+    for data in (text, text.encode('utf-8')):
+        assert np.allclose(compute_features(data, FEATURE_NAMES), expected, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,34 @@
+import asyncio
+import numpy as np
+import pytest
+from batching import AsyncBatcher, MicroBatcher
+
+
+def double(rows):
+    return rows * 2
+
+
+def test_micro_batcher_survives_a_malformed_row():
+    batcher = MicroBatcher(double, max_wait_ms=50)
+    good, bad = batcher.submit(np.ones(3)), batcher.submit(np.ones(4))
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    with pytest.raises(ValueError):
+        good.result(timeout=5)
+    # The worker thread is still running
+    assert batcher.predict(np.ones(3), timeout=5).tolist() == [2, 2, 2]
+    batcher.close()
+
+
+def test_async_batcher_survives_a_malformed_row():
+    async def run():
+        batcher = AsyncBatcher(double, max_wait_ms=50)
+        batcher.start()
+        results = await asyncio.gather(batcher.predict(np.ones(3)), batcher.predict(np.ones(4)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        output = await asyncio.wait_for(batcher.predict(np.ones(3)), 5)
+        await batcher.stop()
+        return output
+
+    assert asyncio.run(run()).tolist() == [2, 2, 2]
@@ -0,0 +1,60 @@
+import math
+from collections import Counter, defaultdict
+import numpy as np
+import pytest
+from feature_extraction.bigrams import (bigram_counts, markov_stats, pair_frequency_stats, perplexity,
+                                        repeated_pair_count, serial_index)
+from feature_extraction.features import char_codes
+
+
+def reference_pair_counts(text):
+    pairs = [text[i:i+2] for i in range(len(text)-1)]
+    return [pairs.count(pair) for pair in set(pairs)]
+
+
+def reference_perplexity(text):
+    bigrams = [text[i:i+2] for i in range(len(text)-1)]
+    counts = Counter(bigrams)
+    probs = [counts[bg] / len(bigrams) for bg in bigrams]
+    return math.exp(-sum(p * math.log(p, 2) for p in probs if p > 0) / len(probs))
+
+
+def reference_markov(text):
+    transitions = defaultdict(lambda: defaultdict(int))
+    for i in range(len(text) - 1):
+        transitions[text[i]][text[i+1]] += 1
+    for next_chars in transitions.values():
+        total = sum(next_chars.values())
+        for char in next_chars:
+            next_chars[char] /= total
+    return [transitions[c1].get(c2, 0) for c1 in sorted(transitions) for c2 in sorted(transitions)]
+
+
+def random_texts():
+    rng = np.random.default_rng(7)
+    texts = []
+    for alphabet, size in [('ab', 50), ('ACGT', 200), ('0123456789abcdef', 300),
+                           ('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/', 500),
+                           ('aé日€', 120), ('xyz', 2)]:
+        texts.append(''.join(rng.choice(list(alphabet), size=size)))
+    # A symbol that only appears last adds no Markov row or column
+    texts.append('abababab' + 'z')
+    return texts
+
+
+@pytest.mark.parametrize('text', random_texts())
+def test_matches_quadratic_reference(text):
+    counts = bigram_counts(char_codes(text))
+    pair_counts = reference_pair_counts(text)
+    assert np.allclose(pair_frequency_stats(counts), (np.mean(pair_counts), np.std(pair_counts), np.max(pair_counts)))
+    assert serial_index(counts) == len(pair_counts)
+    assert repeated_pair_count(counts) == sum(count > 1 for count in pair_counts)
+    assert np.isclose(perplexity(counts), reference_perplexity(text))
+    probabilities = reference_markov(text)
+    assert np.allclose(markov_stats(counts), (np.mean(probabilities), np.std(probabilities), np.max(probabilities)))
+
+
+def test_wide_code_points_use_an_alphabet_sized_matrix():
+    counts = bigram_counts(char_codes('日本日本語'))
+    assert counts.shape == (3, 3)
+    assert counts.sum() == 4
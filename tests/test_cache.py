@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import numpy as np
+import pytest
+import cache
+from cache import PredictionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+def put(store, text, value):
+    store.put(PredictionCache.key(text), [value, value], [value])
+
+
+def test_key_is_shared_by_str_and_bytes():
+    assert PredictionCache.key('abc') == PredictionCache.key(b'abc')
+    assert PredictionCache.key('abc') != PredictionCache.key('abd')
+
+
+def test_hit_returns_stored_arrays(clock):
+    store = PredictionCache()
+    put(store, 'a', 0.5)
+    features, prediction, tier = store.get(PredictionCache.key('a'))
+    assert features.tolist() == [0.5, 0.5]
+    assert prediction.dtype == np.float32
+    assert tier == 'full'
+    assert store.get(PredictionCache.key('b')) is None
+    assert store.stats()['hits'] == 1
+    assert store.stats()['misses'] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    store = PredictionCache(ttl=10)
+    put(store, 'a', 1.0)
+    clock.now += 10
+    assert store.get(PredictionCache.key('a')) is not None
+    clock.now += 1
+    assert store.get(PredictionCache.key('a')) is None
+    stats = store.stats()
+    assert stats['expirations'] == 1
+    assert stats['size'] == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    store = PredictionCache(max_size=2)
+    put(store, 'a', 1.0)
+    put(store, 'b', 2.0)
+    store.get(PredictionCache.key('a'))
+    put(store, 'c', 3.0)
+    assert store.get(PredictionCache.key('b')) is None
+    assert store.get(PredictionCache.key('a')) is not None
+    assert store.get(PredictionCache.key('c')) is not None
+    assert store.stats()['evictions'] == 1
+
+
+def test_shared_store_between_processes(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    writer = PredictionCache(db_path=path, ttl=10)
+    reader = PredictionCache(db_path=path, ttl=10)
+    put(writer, 'a', 1.0)
+    features, _, _ = reader.get(PredictionCache.key('a'))
+    assert features.tolist() == [1.0, 1.0]
+    assert reader.stats()['shared_hits'] == 1
+    # Now in the reader's own LRU
+    reader.get(PredictionCache.key('a'))
+    assert reader.stats()['hits'] == 1
+
+    put(writer, 'b', 2.0)
+    clock.now += 11
+    assert reader.get(PredictionCache.key('b')) is None
+
+
+def test_tier_is_stored_with_the_entry(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    writer = PredictionCache(db_path=path)
+    reader = PredictionCache(db_path=path)
+    writer.put(PredictionCache.key('a'), [1.0], [0.9, 0.1], 'cheap')
+    assert writer.get(PredictionCache.key('a'))[2] == 'cheap'
+    assert reader.get(PredictionCache.key('a'))[2] == 'cheap'
+
+
+def test_store_without_tier_column_is_migrated(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE predictions (key TEXT PRIMARY KEY, features BLOB, prediction BLOB, created REAL)')
+    db.execute('INSERT INTO predictions VALUES (?, ?, ?, ?)',
+               (PredictionCache.key('a'), np.ones(2).tobytes(), np.ones(1, np.float32).tobytes(), clock.now))
+    db.commit()
+    db.close()
+    store = PredictionCache(db_path=path)
+    assert store.get(PredictionCache.key('a'))[2] == 'full'
+    put(store, 'b', 2.0)
+    assert store.get(PredictionCache.key('b'))[2] == 'full'
+
+
+def test_local_hits_do_not_wait_on_the_shared_store(clock, tmp_path):
+    store = PredictionCache(db_path=str(tmp_path / 'cache.db'))
+    put(store, 'a', 1.0)
+    result = []
+    with store._db_lock:
+        # A database call in progress on another thread
+        thread = threading.Thread(target=lambda: result.append(store.get(PredictionCache.key('a'))))
+        thread.start()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    assert result[0] is not None
+
+
+def test_expired_rows_are_pruned_periodically(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    store = PredictionCache(db_path=path, ttl=10, prune_seconds=60)
+
+    def rows():
+        return store._db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    put(store, 'a', 1.0)
+    clock.now += 30
+    put(store, 'b', 2.0)
+    # Expired, but the last prune was under prune_seconds ago
+    assert rows() == 2
+    clock.now += 30
+    put(store, 'c', 3.0)
+    assert rows() == 1
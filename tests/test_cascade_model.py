@@ -0,0 +1,61 @@
+import random
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+import create_data
+import model
+from feature_extraction import CASCADE_FEATURE_NAMES, feature_names, save_classes
+from feature_extraction.schema import CLASSES_FILENAME, SCHEMA_FILENAME
+from feature_extraction.streaming import extract_features_from_buffer
+from registry import ModelRegistry
+
+
+def train_tiny_model(data, model_dir):
+    """Fit a softmax regression on the columns model.py trains the full model on, saved as model.py saves it.
+
+    It stands in for the Keras network, so the test needs no TensorFlow:
+    model.npz has the same layout as export.export_npz writes.
+    """
+    scaler, columns, classes, _ = model.scan_dataset([data], 1000)
+    schema = model.full_model_schema(model.dataset_schema([data], columns))
+    index = [columns.index(name) for name in schema.names]
+    frame = pd.read_csv(data)
+    features = (frame[schema.names].to_numpy(dtype=np.float64) - scaler.mean_[index]) / scaler.scale_[index]
+    fitted = LogisticRegression(max_iter=2000).fit(features, frame['algorithm'])
+    assert list(fitted.classes_) == list(classes)
+
+    # Fold the scaler into the single softmax layer
+    kernel = fitted.coef_.T / scaler.scale_[index][:, None]
+    bias = fitted.intercept_ - (scaler.mean_[index] / scaler.scale_[index]) @ fitted.coef_.T
+    np.savez(model_dir / 'model.npz', activations=np.array(['softmax']),
+             kernel_0=kernel.astype(np.float32), bias_0=bias.astype(np.float32))
+    schema.save(model_dir / SCHEMA_FILENAME)
+    save_classes(classes, model_dir / CLASSES_FILENAME)
+    return schema, classes
+
+
+def test_model_trained_on_cascade_dataset_is_served(tmp_path):
+    data = str(tmp_path / 'dataset.csv')
+    options = dict(create_data.DEFAULT_OPTIONS, features=feature_names() + CASCADE_FEATURE_NAMES)
+    create_data.generate_dataset(data, 60, 0, 1, 60, 'csv', options)
+    assert set(CASCADE_FEATURE_NAMES) <= set(pd.read_csv(data, nrows=1).columns)
+
+    model_dir = tmp_path / 'model'
+    model_dir.mkdir()
+    schema, classes = train_tiny_model(data, model_dir)
+    assert schema.names == feature_names()
+
+    registry = ModelRegistry(str(model_dir), fixed=True).start()
+    with registry.acquire() as bundle:
+        assert bundle.classes == list(classes)
+        text = create_data.encrypt_batch([b'attack at dawn' * 4], 'AES', 'ECB', random.Random(1))[0]
+        row = bundle.schema.extract(text)
+        probabilities = bundle.batcher.predict(row)
+        assert probabilities.shape == (len(classes),)
+        assert np.isclose(probabilities.sum(), 1, atol=1e-5)
+        # The upload path computes the same row through the streaming extractor
+        streamed = extract_features_from_buffer(text.encode(), with_repeats=bundle.stream_with_repeats,
+                                                profile=bundle.schema.profile)
+        assert np.allclose(streamed[bundle.stream_columns], row)
+    registry.stop()
+    bundle.close()
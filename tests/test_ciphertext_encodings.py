@@ -0,0 +1,53 @@
+import base64
+import binascii
+import numpy as np
+import pytest
+from Crypto.Cipher import AES
+from feature_extraction import CASCADE_FEATURE_NAMES, compute_features
+from feature_extraction.features import as_buffers
+from feature_extraction.repeats import REPEAT_FEATURE_NAMES, ciphertext_bytes
+
+# Counted on the decoded bytes, so the same whichever text encoding carries them
+BYTE_FEATURES = ['decoded_length_mod_16', 'repeated_block_count_8', 'repeated_block_count_16']
+
+
+def ecb_ciphertext(n_blocks=5):
+    # A repeated plaintext block repeats in ECB output
+    plaintext = (b'sixteen byte blk' * 3 + bytes(range(16)) * 2)[:16 * n_blocks]
+    return AES.new(bytes(16), AES.MODE_ECB).encrypt(plaintext)
+
+
+def encodings(data):
+    return {
+        'base64': base64.b64encode(data).decode(),
+        'hex': binascii.hexlify(data).decode(),
+        'HEX': binascii.hexlify(data).decode().upper(),
+    }
+
+
+@pytest.mark.parametrize('n_blocks', [1, 2, 5, 8])
+def test_decoded_bytes_match(n_blocks):
+    data = ecb_ciphertext(n_blocks)
+    for text in encodings(data).values():
+        assert ciphertext_bytes(as_buffers(text)[1]).tobytes() == data
+
+
+def test_byte_features_match_across_encodings():
+    data = ecb_ciphertext()
+    rows = {name: compute_features(text, BYTE_FEATURES) for name, text in encodings(data).items()}
+    assert rows['base64'].tolist() == rows['hex'].tolist() == rows['HEX'].tolist() == [0, 6, 3]
+
+
+def test_other_text_is_not_decoded():
+    for text in ['not base64 or hex!', 'abc', 'abcdefg?']:
+        raw = as_buffers(text)[1]
+        assert ciphertext_bytes(raw) is raw
+
+
+def test_ciphertext_is_decoded_once_per_context():
+    context = {}
+    text = encodings(ecb_ciphertext())['hex']
+    compute_features(text, CASCADE_FEATURE_NAMES, context=context)
+    decoded = context['ciphertext']
+    compute_features(text, REPEAT_FEATURE_NAMES, context=context)
+    assert context['ciphertext'] is decoded
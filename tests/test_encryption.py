@@ -0,0 +1,72 @@
+import base64
+import binascii
+import random
+import pytest
+from Crypto.Util.Padding import unpad
+from encryption import ALGORITHMS, BLOCK_MODES, _new_cipher, _random_key, encrypt_batch, label
+
+DECODERS = {'raw': bytes, 'base64': base64.b64decode, 'hex': binascii.unhexlify}
+
+CONFIGURATIONS = [(algorithm, mode) for algorithm in ALGORITHMS for mode in BLOCK_MODES
+                  if algorithm != 'ChaCha20' or mode == 'CTR']
+
+PLAINTEXTS = [b'', b'x', b'sixteen byte msg', b'A longer plaintext spanning several cipher blocks.' * 3]
+
+
+def decrypt_batch(ciphertexts, algorithm, mode, seed, key_reuse, encoding):
+    # Replays the seeded RNG to recover each group's key and IV or nonce
+    rng = random.Random(seed)
+    padded = algorithm != 'ChaCha20' and mode in ('ECB', 'CBC')
+    block_size = getattr(ALGORITHMS[algorithm][0], 'block_size', 1)
+    plaintexts = []
+    for start in range(0, len(ciphertexts), key_reuse):
+        cipher = _new_cipher(algorithm, mode, _random_key(algorithm, rng), rng)
+        for ciphertext in ciphertexts[start:start + key_reuse]:
+            plaintext = cipher.decrypt(DECODERS[encoding](ciphertext))
+            plaintexts.append(unpad(plaintext, block_size) if padded else plaintext)
+    return plaintexts
+
+
+@pytest.mark.parametrize('algorithm, mode', CONFIGURATIONS)
+@pytest.mark.parametrize('encoding', sorted(DECODERS))
+def test_round_trip(algorithm, mode, encoding):
+    ciphertexts = encrypt_batch(PLAINTEXTS, algorithm, mode, random.Random(1), encoding=encoding)
+    assert decrypt_batch(ciphertexts, algorithm, mode, 1, 1, encoding) == PLAINTEXTS
+
+
+@pytest.mark.parametrize('algorithm, mode', CONFIGURATIONS)
+def test_round_trip_with_shared_keys(algorithm, mode):
+    plaintexts = PLAINTEXTS * 2
+    ciphertexts = encrypt_batch(plaintexts, algorithm, mode, random.Random(2), key_reuse=3)
+    assert decrypt_batch(ciphertexts, algorithm, mode, 2, 3, 'base64') == plaintexts
+
+
+@pytest.mark.parametrize('algorithm, mode', CONFIGURATIONS)
+def test_each_row_gets_its_own_key_and_iv(algorithm, mode):
+    rng = random.Random(3)
+    ciphertexts = encrypt_batch([b'the same plaintext, block aligned'] * 20, algorithm, mode, rng)
+    assert len(set(ciphertexts)) == len(ciphertexts)
+
+    replay = random.Random(3)
+    keys, ivs = set(), set()
+    for _ in ciphertexts:
+        key = _random_key(algorithm, replay)
+        cipher = _new_cipher(algorithm, mode, key, replay)
+        keys.add(key)
+        ivs.add(getattr(cipher, 'iv', None) or getattr(cipher, 'nonce', None))
+    assert len(keys) == len(ciphertexts)
+    if mode != 'ECB' or algorithm == 'ChaCha20':
+        assert len(ivs) == len(ciphertexts)
+
+
+def test_labels():
+    assert label('AES', 'ECB') == 'AES'
+    assert label('3DES', 'CBC') == '3DES-CBC'
+    assert label('ChaCha20', 'CTR') == 'ChaCha20'
+
+
+def test_unknown_configuration():
+    with pytest.raises(ValueError):
+        encrypt_batch([b'x'], 'RC4')
+    with pytest.raises(ValueError):
+        encrypt_batch([b'x'], 'AES', 'OFB')
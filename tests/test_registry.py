@@ -0,0 +1,154 @@
+import pytest
+from registry import CURRENT, FIXED_VERSION, ModelRegistry, UnknownVersionError, list_versions
+
+
+class FakeBundle:
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        self.in_use = 0
+        self.last_used = 0.0
+        self.warmed = False
+        self.closed = False
+
+    def warm_up(self):
+        self.warmed = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeLoader:
+    """load_bundle stand-in that records each load and fails for versions in `broken`."""
+
+    def __init__(self, broken=()):
+        self.loads = []
+        self.broken = set(broken)
+
+    def __call__(self, version, path):
+        self.loads.append(version)
+        if version in self.broken:
+            raise ValueError(f"{version} is broken")
+        return FakeBundle(version, path)
+
+
+def make_registry(root, versions, current):
+    for version in versions:
+        (root / version).mkdir()
+        (root / version / 'model.npz').write_bytes(b'')
+    set_current(root, current)
+
+
+def set_current(root, version):
+    (root / CURRENT).write_text(version + '\n')
+
+
+@pytest.fixture
+def root(tmp_path):
+    make_registry(tmp_path, ['v1', 'v2', 'v3', 'v10'], 'v1')
+    return tmp_path
+
+
+def loaded(registry):
+    return sorted(entry['version'] for entry in registry.stats()['loaded'])
+
+
+def test_versions_in_natural_order(root):
+    (root / '.v4.tmp').mkdir()
+    (root / 'empty').mkdir()
+    assert list_versions(root) == ['v1', 'v2', 'v3', 'v10']
+
+
+def test_start_loads_current(root):
+    loader = FakeLoader()
+    registry = ModelRegistry(root, loader, poll_seconds=0).start()
+    with registry.acquire() as bundle:
+        assert bundle.version == 'v1'
+        assert bundle.warmed
+    assert loader.loads == ['v1']
+
+
+def test_swap_keeps_old_version_for_requests_in_flight(root):
+    registry = ModelRegistry(root, FakeLoader(), idle_seconds=0, poll_seconds=0).start()
+    with registry.acquire() as old:
+        set_current(root, 'v2')
+        assert registry.refresh() == 'v2'
+        # Idle eviction skips a bundle that is still in use
+        assert registry.evict_idle() == []
+        assert not old.closed
+    with registry.acquire() as new:
+        assert new.version == 'v2'
+    assert registry.evict_idle() == ['v1']
+    assert old.closed
+    assert loaded(registry) == ['v2']
+    assert registry.stats()['swaps'] == 1
+
+
+def test_refresh_without_change_does_not_reload(root):
+    loader = FakeLoader()
+    registry = ModelRegistry(root, loader, poll_seconds=0).start()
+    assert registry.refresh() == 'v1'
+    assert loader.loads == ['v1']
+
+
+def test_failed_version_is_not_retried(root):
+    loader = FakeLoader(broken={'v2'})
+    registry = ModelRegistry(root, loader, poll_seconds=0).start()
+    set_current(root, 'v2')
+    with pytest.raises(ValueError):
+        registry.refresh()
+    assert registry.refresh() == 'v1'
+    assert loader.loads == ['v1', 'v2']
+    assert registry.stats()['last_error'] == 'v2: v2 is broken'
+    set_current(root, 'v3')
+    assert registry.refresh() == 'v3'
+
+
+def test_named_versions_load_once_and_evict_least_recently_used(root):
+    loader = FakeLoader()
+    registry = ModelRegistry(root, loader, max_loaded=3, poll_seconds=0).start()
+    for version in ['v2', 'v3', 'v2']:
+        with registry.acquire(version) as bundle:
+            assert bundle.version == version
+    assert loader.loads == ['v1', 'v2', 'v3']
+    # Over capacity: v3 was used less recently than v2, and v1 is active
+    with registry.acquire('v10'):
+        pass
+    assert loaded(registry) == ['v1', 'v10', 'v2']
+
+
+def test_idle_eviction_keeps_active_version(root):
+    registry = ModelRegistry(root, FakeLoader(), idle_seconds=0, poll_seconds=0).start()
+    with registry.acquire('v2'):
+        pass
+    assert registry.evict_idle() == ['v2']
+    assert loaded(registry) == ['v1']
+
+
+def test_unknown_version(root):
+    registry = ModelRegistry(root, FakeLoader(), poll_seconds=0).start()
+    with pytest.raises(UnknownVersionError):
+        with registry.acquire('v9'):
+            pass
+
+
+def test_fixed_directory(root):
+    registry = ModelRegistry(root / 'v2', FakeLoader(), fixed=True).start()
+    with registry.acquire() as bundle:
+        assert bundle.version == FIXED_VERSION
+        assert bundle.path == root / 'v2'
+    assert registry.versions() == [FIXED_VERSION]
+    set_current(root, 'v3')
+    assert registry.refresh() == FIXED_VERSION
+
+
+def test_from_env(root, monkeypatch):
+    for name in ['MODEL_DIR', 'MODEL_IDLE_SECONDS', 'MODEL_MAX_LOADED', 'MODEL_POLL_SECONDS']:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('MODEL_REGISTRY', str(root))
+    monkeypatch.setenv('MODEL_MAX_LOADED', '2')
+    registry = ModelRegistry.from_env(FakeLoader())
+    assert not registry.fixed
+    assert registry.max_loaded == 2
+    monkeypatch.setenv('MODEL_DIR', str(root / 'v3'))
+    assert ModelRegistry.from_env(FakeLoader()).fixed
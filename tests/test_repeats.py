@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from feature_extraction.features import char_codes
+from feature_extraction.repeats import distinct_substring_count, longest_repeated_sequence, suffix_array
+
+
+def brute_suffix_array(codes):
+    suffixes = [tuple(codes[i:]) for i in range(len(codes))]
+    sa = sorted(range(len(codes)), key=lambda i: suffixes[i])
+    lcp = []
+    for a, b in zip(sa, sa[1:]):
+        common = 0
+        while a + common < len(codes) and b + common < len(codes) and codes[a + common] == codes[b + common]:
+            common += 1
+        lcp.append(common)
+    return sa, lcp
+
+
+def brute_longest_repeat(codes):
+    n = len(codes)
+    for length in range(n // 2, 0, -1):
+        first = {}
+        for i in range(n - length + 1):
+            window = tuple(codes[i:i + length])
+            first.setdefault(window, i)
+            if i - first[window] >= length:
+                return length
+    return 0
+
+
+def brute_distinct_substrings(codes):
+    return len({tuple(codes[i:j]) for i in range(len(codes)) for j in range(i + 1, len(codes) + 1)})
+
+
+def samples():
+    rng = np.random.default_rng(0)
+    texts = ['ab', 'aa', 'banana', 'mississippi', 'abcabcabcabc', 'a' * 40, 'ab' * 25 + 'b', 'abracadabra' * 3]
+    texts += [''.join(rng.choice(list('ab'), size=size)) for size in (7, 31, 64, 100)]
+    texts += [''.join(rng.choice(list('ACGT'), size=size)) for size in (50, 129)]
+    # Code points beyond one byte take the int64 path
+    texts += ['日本日本語日本', 'ß' * 9 + 'x' + 'ß' * 9]
+    # Periodic, as ECB ciphertext of a repeated plaintext block
+    block = ''.join(rng.choice(list('0123456789abcdef'), size=16))
+    texts.append(block * 6 + block[:5])
+    return texts
+
+
+@pytest.mark.parametrize('text', samples())
+def test_suffix_array_matches_brute_force(text):
+    codes = char_codes(text)
+    sa, lcp = suffix_array(codes)
+    expected_sa, expected_lcp = brute_suffix_array(codes.tolist())
+    assert sa.tolist() == expected_sa
+    assert lcp.tolist() == expected_lcp
+
+
+@pytest.mark.parametrize('text', samples())
+def test_repeat_statistics_match_brute_force(text):
+    codes = char_codes(text)
+    sa, lcp = suffix_array(codes)
+    assert longest_repeated_sequence(sa, lcp) == brute_longest_repeat(codes.tolist())
+    assert distinct_substring_count(sa, lcp) == brute_distinct_substrings(codes.tolist())
+
+
+def test_single_character():
+    sa, lcp = suffix_array(char_codes('x'))
+    assert sa.tolist() == [0]
+    assert longest_repeated_sequence(sa, lcp) == 0
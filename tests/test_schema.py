@@ -0,0 +1,63 @@
+import json
+import pytest
+from feature_extraction import (FEATURE_NAMES, CLASSES_FILENAME, FeatureSchema, SchemaMismatchError, feature_names,
+                                model_classes, model_schema, save_classes)
+from feature_extraction.schema import LEGACY_CLASSES, SCHEMA_FILENAME
+
+
+def test_round_trip(tmp_path):
+    schema = FeatureSchema.current(FEATURE_NAMES[:5], profile='fast')
+    schema.save(tmp_path / SCHEMA_FILENAME)
+    assert FeatureSchema.load(tmp_path / SCHEMA_FILENAME) == schema
+
+
+def test_unknown_feature_is_refused():
+    with pytest.raises(SchemaMismatchError):
+        FeatureSchema.current(['length', 'not_a_feature'])
+
+
+def test_check_refuses_other_versions():
+    name, version = FeatureSchema.default().features[0]
+    with pytest.raises(SchemaMismatchError, match=name):
+        FeatureSchema([(name, version + 1)]).check()
+    with pytest.raises(SchemaMismatchError, match='profile'):
+        FeatureSchema([(name, version)], profile='approximate').check()
+
+
+def test_positions():
+    schema = FeatureSchema.current(FEATURE_NAMES[2:4])
+    assert schema.positions(FEATURE_NAMES) == [2, 3]
+    with pytest.raises(SchemaMismatchError):
+        FeatureSchema.current(FEATURE_NAMES[:2]).positions(FEATURE_NAMES[1:])
+
+
+def test_model_schema_saved(tmp_path):
+    schema = FeatureSchema.current(FEATURE_NAMES[:4])
+    schema.save(tmp_path / SCHEMA_FILENAME)
+    assert model_schema(tmp_path, 4) == schema
+    with pytest.raises(SchemaMismatchError):
+        model_schema(tmp_path, 5)
+
+
+def test_model_schema_legacy_layouts(tmp_path):
+    for with_repeats in (False, True):
+        names = feature_names(with_repeats)
+        assert model_schema(tmp_path, len(names)).names == names
+    with pytest.raises(SchemaMismatchError):
+        model_schema(tmp_path, 7)
+
+
+def test_model_schema_refuses_unknown_format(tmp_path):
+    (tmp_path / SCHEMA_FILENAME).write_text(json.dumps({'format': 99, 'features': []}))
+    with pytest.raises(SchemaMismatchError):
+        model_schema(tmp_path, 0)
+
+
+def test_model_classes(tmp_path):
+    assert model_classes(tmp_path, 3) == LEGACY_CLASSES
+    with pytest.raises(SchemaMismatchError):
+        model_classes(tmp_path, 5)
+    save_classes(['3DES', 'AES-CBC', 'ChaCha20'], tmp_path / CLASSES_FILENAME)
+    assert model_classes(tmp_path, 3) == ['3DES', 'AES-CBC', 'ChaCha20']
+    with pytest.raises(SchemaMismatchError):
+        model_classes(tmp_path, 4)
@@ -0,0 +1,99 @@
+import base64
+import io
+import numpy as np
+import pytest
+from feature_extraction import compute_features, feature_names
+from feature_extraction.streaming import (StreamingFeatures, base64_chunks, extract_features_from_buffer,
+                                          extract_features_from_stream)
+
+
+def texts():
+    rng = np.random.default_rng(3)
+    return [
+        base64.b64encode(rng.bytes(3000)).decode(),
+        # ECB-like repeats, so the repeat features are not trivial
+        base64.b64encode(rng.bytes(48) * 20 + rng.bytes(100)).decode(),
+        'Plain text with UPPER and lower case, vowels and 12345. ' * 30,
+        # Multi-byte characters split across chunk boundaries
+        'Ünïcödé ñ€ 日本語 text ' * 40,
+        'ab',
+    ]
+
+
+@pytest.mark.parametrize('text', texts())
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000, 1 << 20])
+@pytest.mark.parametrize('with_repeats', [False, True])
+def test_buffer_matches_compute_features(text, chunk_size, with_repeats):
+    expected = compute_features(text, feature_names(with_repeats))
+    streamed = extract_features_from_buffer(text.encode('utf-8'), chunk_size, with_repeats)
+    assert np.allclose(streamed, expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize('text', texts())
+def test_stream_matches_compute_features(text):
+    expected = compute_features(text, feature_names(True), profile='fast')
+    streamed = extract_features_from_stream(io.BytesIO(text.encode('utf-8')), 333, True, profile='fast')
+    assert np.allclose(streamed, expected, rtol=1e-9)
+
+
+def binary_inputs():
+    rng = np.random.default_rng(7)
+    return [
+        rng.bytes(2000),
+        b'ASCII prefix before the binary part ' + rng.bytes(500),
+        # A multi-byte sequence cut off at the end of the input
+        b'ascii then ' + 'é'.encode('utf-8')[:1],
+    ]
+
+
+@pytest.mark.parametrize('data', binary_inputs())
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_binary_matches_compute_features(data, chunk_size):
+    expected = compute_features(data, feature_names(True))
+    streamed = extract_features_from_buffer(data, chunk_size, True)
+    assert np.allclose(streamed, expected, rtol=1e-9)
+
+
+def test_utf8_text_followed_by_binary_is_rejected():
+    features = StreamingFeatures()
+    features.update('é'.encode('utf-8'))
+    with pytest.raises(ValueError):
+        features.update(b'\xff\xfe')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4, 1000])
+def test_base64_chunks_matches_one_shot_encoding(chunk_size):
+    data = np.random.default_rng(9).bytes(1001)
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    assert b''.join(base64_chunks(chunks)) == base64.b64encode(data)
+
+
+def test_long_inputs_use_leading_windows():
+    text = base64.b64encode(np.random.default_rng(5).bytes(6000)).decode()
+    names = feature_names(True)
+    streamed = extract_features_from_buffer(text.encode(), 500, True, max_fft_length=2000, max_repeat_length=1000)
+    exact = compute_features(text, names)
+    fft_prefix = compute_features(text[:2000], names)
+    repeat_prefix = compute_features(text[:1000], names)
+    for i, name in enumerate(names):
+        if name in ('fourier_transform_mean', 'fourier_transform_std', 'fourier_transform_peak',
+                    'entropy_of_fft_components'):
+            expected = fft_prefix[i]
+        elif name in ('longest_repeated_sequence', 'repeated_block_count_8', 'repeated_block_count_16',
+                      'distinct_substring_count'):
+            expected = repeat_prefix[i]
+        else:
+            # Everything else, the FFT energy included, stays exact
+            expected = exact[i]
+        assert np.isclose(streamed[i], expected, rtol=1e-9), name
+
+
+def test_truncation_flags():
+    features = StreamingFeatures(max_fft_length=10, max_repeat_length=4)
+    features.update(b'abcdefgh')
+    assert features.repeats_truncated and not features.spectral_truncated
+
+
+def test_too_short_input():
+    with pytest.raises(ValueError):
+        extract_features_from_buffer(b'a')
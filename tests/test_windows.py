@@ -0,0 +1,50 @@
+import base64
+import numpy as np
+import pytest
+from feature_extraction import FEATURE_NAMES, compute_features, feature_names
+from feature_extraction.windows import SlidingWindowFeatures, window_features
+
+
+def sample_text():
+    rng = np.random.default_rng(11)
+    # Two segments with different statistics, as a capture that changes cipher
+    return base64.b64encode(rng.bytes(600)).decode() + (rng.bytes(16).hex() * 30)
+
+
+@pytest.mark.parametrize('window, stride', [(64, 64), (100, 30), (256, 1), (2000, 50)])
+@pytest.mark.parametrize('profile', ['exact', 'fast'])
+def test_windows_match_compute_features(window, stride, profile):
+    text = sample_text()
+    starts, rows = window_features(text, FEATURE_NAMES, window, stride, profile)
+    assert starts[0] == 0
+    assert min(starts[-1] + window, len(text)) == len(text)
+    for start, row in zip(starts, rows):
+        expected = compute_features(text[start:start + window], FEATURE_NAMES, profile=profile)
+        assert np.allclose(row, expected, rtol=1e-7, atol=1e-9), start
+
+
+def test_features_without_incremental_state():
+    # Repeat features are computed per window from scratch
+    text = sample_text()
+    names = feature_names(True)[::-1]
+    starts, rows = window_features(text, names, 200, 150)
+    for start, row in zip(starts, rows):
+        assert np.allclose(row, compute_features(text[start:start + 200], names), rtol=1e-9)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 13, 500])
+def test_chunked_feed_matches_one_shot(chunk_size):
+    text = sample_text().encode()
+    starts, rows = window_features(text, FEATURE_NAMES, 128, 40)
+    windows = SlidingWindowFeatures(FEATURE_NAMES, 128, 40)
+    results = []
+    for offset in range(0, len(text), chunk_size):
+        results += windows.feed(text[offset:offset + chunk_size])
+    results += windows.finish()
+    assert [start for start, _ in results] == starts.tolist()
+    assert np.allclose(np.vstack([row for _, row in results]), rows, rtol=1e-12)
+
+
+def test_non_ascii_is_refused():
+    with pytest.raises(ValueError):
+        window_features('日本語 text', FEATURE_NAMES, 4, 2)